@@ -4,6 +4,7 @@ import numpy as np
 import networks
 import lora_patches
 from modules import extra_networks, shared
+from modules.timer import trace
 
 
 # from https://github.com/cheald/sd-webui-loractl/blob/master/loractl/lib/utils.py
@@ -124,6 +125,8 @@ class ExtraNetworkLora(extra_networks.ExtraNetwork):
         names, te_multipliers, unet_multipliers, dyn_dims = self.parse(p, params_list, step)
         networks.load_networks(names, te_multipliers, unet_multipliers, dyn_dims)
         t1 = time.time()
+        if len(names) > 0:
+            trace.add('network_activate', t0, t1, networks=names, step=step)
         if len(networks.loaded_networks) > 0 and step == 0:
             self.infotext(p)
             self.prompt(p)
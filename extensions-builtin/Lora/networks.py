@@ -18,6 +18,8 @@ import lora_convert
 import torch
 import diffusers.models.lora
 from modules import shared, devices, sd_models, sd_models_compile, errors, scripts, files_cache, model_quant
+from modules.timer import trace
+from modules import metrics
 
 
 debug = os.environ.get('SD_LORA_DEBUG', None) is not None
@@ -131,6 +133,7 @@ def load_network(name, network_on_disk) -> network.Network:
     cached = lora_cache.get(name, None)
     if debug:
         shared.log.debug(f'Load network: type=LoRA name="{name}" file="{network_on_disk.filename}" type=lora {"cached" if cached else ""}')
+    metrics.cache_access('lora', cached is not None)
     if cached is not None:
         return cached
     net = network.Network(name, network_on_disk)
@@ -433,6 +436,7 @@ def network_apply_weights(self: Union[torch.nn.Conv2d, torch.nn.Linear, torch.nn
             shared.log.warning(f'LoRA network="{net.name}" layer="{network_layer_name}" unsupported operation')
             extra_network_lora.errors[net.name] = extra_network_lora.errors.get(net.name, 0) + 1
         self.network_current_names = wanted_names
+        trace.add('network_apply_weights', t0, time.time(), layer=network_layer_name) # only when weights actually change
     t1 = time.time()
     timer['apply'] += t1 - t0
 
@@ -563,7 +567,7 @@ def list_available_networks():
         except OSError as e:  # should catch FileNotFoundError and PermissionError etc.
             shared.log.error(f'LoRA: filename="{filename}" {e}')
 
-    candidates = list(files_cache.list_files(*directories, ext_filter=[".pt", ".ckpt", ".safetensors"]))
+    candidates = list(files_cache.indexed_files(*directories, ext_filter=[".pt", ".ckpt", ".safetensors"]))
     with concurrent.futures.ThreadPoolExecutor(max_workers=shared.max_workers) as executor:
         for fn in candidates:
             executor.submit(add_network, fn)
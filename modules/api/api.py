@@ -38,9 +38,13 @@ class Api:
         self.add_api_route("/sdapi/v1/version", server.get_version, methods=["GET"])
         self.add_api_route("/sdapi/v1/platform", server.get_platform, methods=["GET"])
         self.add_api_route("/sdapi/v1/progress", server.get_progress, methods=["GET"], response_model=models.ResProgress)
+        self.add_api_route("/sdapi/v1/progress/stream", server.get_progress_stream, methods=["GET"])
+        self.app.add_api_websocket_route("/sdapi/v1/progress/ws", server.ws_progress)
         self.add_api_route("/sdapi/v1/interrupt", server.post_interrupt, methods=["POST"])
         self.add_api_route("/sdapi/v1/skip", server.post_skip, methods=["POST"])
         self.add_api_route("/sdapi/v1/shutdown", server.post_shutdown, methods=["POST"])
+        self.add_api_route("/sdapi/v1/trace", server.get_trace, methods=["GET"])
+        self.add_api_route("/metrics", server.get_metrics, methods=["GET"])
         self.add_api_route("/sdapi/v1/memory", server.get_memory, methods=["GET"], response_model=models.ResMemory)
         self.add_api_route("/sdapi/v1/options", server.get_config, methods=["GET"], response_model=models.OptionsModel)
         self.add_api_route("/sdapi/v1/options", server.set_config, methods=["POST"])
@@ -51,6 +55,8 @@ class Api:
         self.add_api_route("/sdapi/v1/txt2img", self.generate.post_text2img, methods=["POST"], response_model=models.ResTxt2Img)
         self.add_api_route("/sdapi/v1/img2img", self.generate.post_img2img, methods=["POST"], response_model=models.ResImg2Img)
         self.add_api_route("/sdapi/v1/control", self.control.post_control, methods=["POST"], response_model=control.ResControl)
+        self.add_api_route("/sdapi/v1/img2img/multipart", self.generate.post_img2img_multipart, methods=["POST"])
+        self.add_api_route("/sdapi/v1/control/multipart", self.control.post_control_multipart, methods=["POST"], response_model=control.ResControl)
         self.add_api_route("/sdapi/v1/extra-single-image", self.extras_single_image_api, methods=["POST"], response_model=models.ResProcessImage)
         self.add_api_route("/sdapi/v1/extra-batch-images", self.extras_batch_images_api, methods=["POST"], response_model=models.ResProcessBatch)
         self.add_api_route("/sdapi/v1/preprocess", self.process.post_preprocess, methods=["POST"])
@@ -80,6 +86,9 @@ class Api:
         self.add_api_route("/sdapi/v1/png-info", endpoints.post_pnginfo, methods=["POST"], response_model=models.ResImageInfo)
         self.add_api_route("/sdapi/v1/interrogate", endpoints.post_interrogate, methods=["POST"])
         self.add_api_route("/sdapi/v1/vqa", endpoints.post_vqa, methods=["POST"])
+        self.add_api_route("/sdapi/v1/ip-adapter/register", endpoints.post_ipadapter_register, methods=["POST"], response_model=models.ResIPAdapterRegister)
+        self.add_api_route("/sdapi/v1/face/identity", endpoints.post_face_identity, methods=["POST"], response_model=models.ResFaceIdentity)
+        self.add_api_route("/sdapi/v1/tokens", endpoints.post_tokens, methods=["POST"], response_model=models.ResTokens)
         self.add_api_route("/sdapi/v1/refresh-checkpoints", endpoints.post_refresh_checkpoints, methods=["POST"])
         self.add_api_route("/sdapi/v1/unload-checkpoint", endpoints.post_unload_checkpoint, methods=["POST"])
         self.add_api_route("/sdapi/v1/reload-checkpoint", endpoints.post_reload_checkpoint, methods=["POST"])
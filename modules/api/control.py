@@ -1,6 +1,9 @@
 from typing import Optional, List
 from threading import Lock
-from pydantic import BaseModel, Field # pylint: disable=no-name-in-module
+from fastapi import Request
+from fastapi.exceptions import HTTPException
+from pydantic import BaseModel, Field, ValidationError # pylint: disable=no-name-in-module
+from starlette.concurrency import run_in_threadpool
 from modules import errors, shared, processing_helpers
 from modules.api import models, helpers
 from modules.control import run
@@ -31,6 +34,8 @@ ReqControl = models.create_model_from_signature(
         {"key": "ip_adapter", "type": Optional[List[models.ItemIPAdapter]], "default": None, "exclude": True},
         {"key": "face", "type": Optional[models.ItemFace], "default": None, "exclude": True},
         {"key": "control", "type": Optional[List[ItemControl]], "default": [], "exclude": True},
+        {"key": "output_format", "type": Optional[models.OutputFormatBase64], "default": None},
+        {"key": "output_quality", "type": Optional[int], "default": None},
     ]
 )
 
@@ -57,6 +62,8 @@ class APIControl():
         args.pop('face_id', None)
         args.pop('ip_adapter', None)
         args.pop('save_images', None)
+        args.pop('output_format', None)
+        args.pop('output_quality', None)
         return args
 
     def sanitize_b64(self, request):
@@ -77,7 +84,7 @@ class APIControl():
             req.script_name = "face"
             req.script_args = [
                 req.face.mode,
-                req.face.source_images,
+                helpers.get_face_images(req.face),
                 req.face.ip_model,
                 req.face.ip_override_sampler,
                 req.face.ip_cache_model,
@@ -97,14 +104,15 @@ class APIControl():
         if hasattr(request, "ip_adapter") and request.ip_adapter:
             args = { 'ip_adapter_names': [], 'ip_adapter_scales': [], 'ip_adapter_crops': [], 'ip_adapter_starts': [], 'ip_adapter_ends': [], 'ip_adapter_images': [], 'ip_adapter_masks': [] }
             for ipadapter in request.ip_adapter:
-                if not ipadapter.images or len(ipadapter.images) == 0:
+                images = helpers.get_ipadapter_images(ipadapter)
+                if images is None:
                     continue
                 args['ip_adapter_names'].append(ipadapter.adapter)
                 args['ip_adapter_scales'].append(ipadapter.scale)
                 args['ip_adapter_starts'].append(ipadapter.start)
                 args['ip_adapter_ends'].append(ipadapter.end)
                 args['ip_adapter_crops'].append(ipadapter.end)
-                args['ip_adapter_images'].append([helpers.decode_base64_to_image(x) for x in ipadapter.images])
+                args['ip_adapter_images'].append(images)
                 if ipadapter.masks:
                     args['ip_adapter_masks'].append([helpers.decode_base64_to_image(x) for x in ipadapter.masks])
 
@@ -172,8 +180,29 @@ class APIControl():
             shared.state.end(api=False)
 
         # return
-        b64images = list(map(helpers.encode_pil_to_base64, output_images)) if send_images else []
-        b64processed = list(map(helpers.encode_pil_to_base64, output_processed)) if send_images else []
+        b64images = helpers.encode_images_to_base64(output_images, fmt=req.output_format, quality=req.output_quality) if send_images else []
+        b64processed = helpers.encode_images_to_base64(output_processed, fmt=req.output_format, quality=req.output_quality) if send_images else []
         self.sanitize_b64(req)
         req.units = orig_control
         return ResControl(images=b64images, processed=b64processed, params=vars(req), info=output_info)
+
+    async def post_control_multipart(self, request: Request):
+        """
+        Multipart variant of control: json request in `payload` field with binary `inputs`, `inits` and `mask` fields
+        """
+        payload, files = await helpers.parse_multipart(request)
+        try:
+            req = ReqControl(**payload)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors()) from e
+        if 'inputs' in files:
+            req.inputs = files['inputs']
+        if 'inits' in files:
+            req.inits = files['inits']
+        if 'mask' in files:
+            req.mask = files['mask'][0]
+        res = await run_in_threadpool(self.post_control, req)
+        res.params.pop('inputs', None) # decoded images cannot be serialized back
+        res.params.pop('inits', None)
+        res.params.pop('mask', None)
+        return res
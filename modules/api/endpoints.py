@@ -40,6 +40,13 @@ def get_embeddings():
 
     return {"loaded": convert_embeddings(db.word_embeddings), "skipped": convert_embeddings(db.skipped_embeddings)}
 
+def post_tokens(req: models.ReqTokens):
+    from modules import prompt_tokens, extra_networks
+    if not shared.native or not shared.sd_loaded:
+        raise HTTPException(status_code=404, detail="Model not loaded")
+    prompts, _ = extra_networks.parse_prompts(req.prompts)
+    return models.ResTokens(results=prompt_tokens.get_tokens(prompts, tokens=req.tokens))
+
 def get_extra_networks(page: Optional[str] = None, name: Optional[str] = None, filename: Optional[str] = None, title: Optional[str] = None, fullname: Optional[str] = None, hash: Optional[str] = None): # pylint: disable=redefined-builtin
     res = []
     for pg in shared.extra_networks:
@@ -109,6 +116,27 @@ def post_vqa(req: models.ReqVQA):
     answer = vqa.interrogate(req.question, image, req.model)
     return models.ResVQA(answer=answer)
 
+def post_ipadapter_register(req: models.ReqIPAdapterRegister):
+    if req.images is None or len(req.images) == 0:
+        raise HTTPException(status_code=404, detail="Image not found")
+    from modules import ipadapter_cache
+    images = [helpers.decode_base64_to_image(x) for x in req.images]
+    embed_id, images = ipadapter_cache.registry.register(images)
+    return models.ResIPAdapterRegister(id=embed_id, images=len(images))
+
+def post_face_identity(req: models.ReqFaceIdentity):
+    if req.images is None or len(req.images) == 0:
+        raise HTTPException(status_code=404, detail="Image not found")
+    from modules.face import identity
+    from modules.face.insightface import get_app
+    identity_id, images = identity.identities.register([helpers.decode_base64_to_image(x) for x in req.images])
+    app = get_app(req.model)
+    faces = []
+    for image in images: # analyze on registration so first generation with identity is a cache hit
+        detected = identity.analyze(app, image) or []
+        faces.append([models.ItemFaceInfo(score=float(f.det_score), gender=('female' if f.gender == 0 else 'male') if f.get('gender', None) is not None else None, age=f.get('age', None), bbox=[float(x) for x in f.bbox]) for f in detected])
+    return models.ResFaceIdentity(id=identity_id, faces=faces)
+
 def post_unload_checkpoint():
     from modules import sd_models
     sd_models.unload_model_weights(op='model')
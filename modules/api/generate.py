@@ -1,7 +1,11 @@
 from threading import Lock
+from fastapi import Request
+from fastapi.exceptions import HTTPException
+from pydantic import ValidationError # pylint: disable=no-name-in-module
 from fastapi.responses import JSONResponse
-from modules import errors, shared, scripts, ui
-from modules.api import models, script, helpers
+from starlette.concurrency import run_in_threadpool
+from modules import errors, shared, scripts
+from modules.api import models, script, helpers, result_cache
 from modules.processing import StableDiffusionProcessingTxt2Img, StableDiffusionProcessingImg2Img, process_images
 
 
@@ -23,8 +27,25 @@ class APIGenerate():
         args.pop('face', None)
         args.pop('face_id', None)
         args.pop('save_images', None)
+        args.pop('output_format', None)
+        args.pop('output_quality', None)
+        args.pop('output_multipart', None)
         return args
 
+    def prepare_response(self, request, processed, send_images: bool, response_model):
+        images = processed.images if send_images else []
+        if getattr(request, 'output_multipart', False):
+            return helpers.multipart_response(images, info=processed.js(), parameters=vars(request), fmt=request.output_format, quality=request.output_quality)
+        b64images = helpers.encode_images_to_base64(images, fmt=getattr(request, 'output_format', None), quality=getattr(request, 'output_quality', None))
+        return response_model(images=b64images, parameters=vars(request), info=processed.js())
+
+    def cached_response(self, request, cached, response_model):
+        if not getattr(request, 'include_init_images', True):
+            request.init_images = None
+            request.mask = None
+        self.sanitize_b64(request)
+        return self.prepare_response(request, cached, getattr(request, 'send_images', True), response_model)
+
     def sanitize_b64(self, request):
         def sanitize_str(args: list):
             for idx in range(0, len(args)):
@@ -44,7 +65,7 @@ class APIGenerate():
             request.script_name = "face"
             request.script_args = [
                 request.face.mode,
-                request.face.source_images,
+                helpers.get_face_images(request.face),
                 request.face.ip_model,
                 request.face.ip_override_sampler,
                 request.face.ip_cache_model,
@@ -69,25 +90,31 @@ class APIGenerate():
             p.ip_adapter_ends = []
             p.ip_adapter_images = []
             for ipadapter in request.ip_adapter:
-                if not ipadapter.images or len(ipadapter.images) == 0:
+                images = helpers.get_ipadapter_images(ipadapter)
+                if images is None:
                     continue
                 p.ip_adapter_names.append(ipadapter.adapter)
                 p.ip_adapter_scales.append(ipadapter.scale)
                 p.ip_adapter_crops.append(ipadapter.crop)
                 p.ip_adapter_starts.append(ipadapter.start)
                 p.ip_adapter_ends.append(ipadapter.end)
-                p.ip_adapter_images.append([helpers.decode_base64_to_image(x) for x in ipadapter.images])
+                p.ip_adapter_images.append(images)
                 p.ip_adapter_masks = []
                 if ipadapter.masks:
                     p.ip_adapter_masks.append([helpers.decode_base64_to_image(x) for x in ipadapter.masks])
             del request.ip_adapter
 
     def post_text2img(self, txt2imgreq: models.ReqTxt2Img):
+        helpers.validate_output_format(txt2imgreq)
+        key = result_cache.fingerprint(txt2imgreq, 'txt2img')
+        cached = result_cache.get(key)
+        if cached is not None:
+            return self.cached_response(txt2imgreq, cached, models.ResTxt2Img)
         self.prepare_face_module(txt2imgreq)
         script_runner = scripts.scripts_txt2img
         if not script_runner.scripts:
             script_runner.initialize_scripts(False)
-            ui.create_ui(None)
+            script_runner.setup_api('txt2img')
         if not self.default_script_arg_txt2img:
             self.default_script_arg_txt2img = script.init_default_script_args(script_runner)
         selectable_scripts, selectable_script_idx = script.get_selectable_script(txt2imgreq.script_name, script_runner)
@@ -113,23 +140,30 @@ class APIGenerate():
             else:
                 p.script_args = tuple(script_args) # Need to pass args as tuple here
                 processed = process_images(p)
+            if shared.state.interrupted or shared.state.skipped: # never cache partial results
+                key = None
             shared.state.end(api=False)
-        b64images = list(map(helpers.encode_pil_to_base64, processed.images)) if send_images else []
+        result_cache.put(key, processed)
         self.sanitize_b64(txt2imgreq)
-        return models.ResTxt2Img(images=b64images, parameters=vars(txt2imgreq), info=processed.js())
+        return self.prepare_response(txt2imgreq, processed, send_images, models.ResTxt2Img)
 
     def post_img2img(self, img2imgreq: models.ReqImg2Img):
+        helpers.validate_output_format(img2imgreq)
         self.prepare_face_module(img2imgreq)
         init_images = img2imgreq.init_images
         if init_images is None:
             return JSONResponse(status_code=400, content={"error": "Init image is none"})
+        key = result_cache.fingerprint(img2imgreq, 'img2img')
+        cached = result_cache.get(key)
+        if cached is not None:
+            return self.cached_response(img2imgreq, cached, models.ResImg2Img)
         mask = img2imgreq.mask
         if mask:
             mask = helpers.decode_base64_to_image(mask)
         script_runner = scripts.scripts_img2img
         if not script_runner.scripts:
             script_runner.initialize_scripts(True)
-            ui.create_ui(None)
+            script_runner.setup_api('img2img')
         if not self.default_script_arg_img2img:
             self.default_script_arg_img2img = script.init_default_script_args(script_runner)
         selectable_scripts, selectable_script_idx = script.get_selectable_script(img2imgreq.script_name, script_runner)
@@ -157,10 +191,28 @@ class APIGenerate():
             else:
                 p.script_args = tuple(script_args) # Need to pass args as tuple here
                 processed = process_images(p)
+            if shared.state.interrupted or shared.state.skipped: # never cache partial results
+                key = None
             shared.state.end(api=False)
-        b64images = list(map(helpers.encode_pil_to_base64, processed.images)) if send_images else []
+        result_cache.put(key, processed)
         if not img2imgreq.include_init_images:
             img2imgreq.init_images = None
             img2imgreq.mask = None
         self.sanitize_b64(img2imgreq)
-        return models.ResImg2Img(images=b64images, parameters=vars(img2imgreq), info=processed.js())
+        return self.prepare_response(img2imgreq, processed, send_images, models.ResImg2Img)
+
+    async def post_img2img_multipart(self, request: Request):
+        """
+        Multipart variant of img2img: json request in `payload` field with binary `init_images` and `mask` fields
+        """
+        payload, files = await helpers.parse_multipart(request)
+        try:
+            img2imgreq = models.ReqImg2Img(**payload)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors()) from e
+        if 'init_images' in files:
+            img2imgreq.init_images = files['init_images']
+        if 'mask' in files:
+            img2imgreq.mask = files['mask'][0]
+        img2imgreq.include_init_images = False # decoded images cannot be serialized back
+        return await run_in_threadpool(self.post_img2img, img2imgreq)
@@ -1,5 +1,9 @@
 import io
+import os
+import json
+import uuid
 import base64
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, PngImagePlugin
 import piexif
 import piexif.helper
@@ -7,6 +11,10 @@ from fastapi.exceptions import HTTPException
 from modules import shared, sd_samplers
 
 
+encode_pool = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix='api-encode') # image encoding releases gil so it can run in parallel
+image_mimetypes = { 'png': 'image/png', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'webp': 'image/webp', 'raw': 'application/octet-stream' }
+
+
 def validate_sampler_name(name):
     config = sd_samplers.all_samplers_map.get(name, None)
     if config is None:
@@ -15,6 +23,14 @@ def validate_sampler_name(name):
 
 
 def decode_base64_to_image(encoding):
+    if isinstance(encoding, Image.Image): # already decoded, e.g. multipart upload
+        return encoding
+    if isinstance(encoding, (bytes, bytearray)): # raw binary upload
+        try:
+            return Image.open(io.BytesIO(encoding))
+        except Exception as e:
+            shared.log.warning(f'API cannot decode image: {e}')
+            raise HTTPException(status_code=422, detail="Invalid image") from e
     if encoding.startswith("data:image/"):
         encoding = encoding.split(";")[1].split(",")[1]
     try:
@@ -25,6 +41,30 @@ def decode_base64_to_image(encoding):
         raise HTTPException(status_code=500, detail="Invalid encoded image") from e
 
 
+def get_ipadapter_images(ipadapter):
+    """images of ip adapter request item from registered embed id or base64 images, none if item has neither"""
+    if getattr(ipadapter, 'embed', None):
+        from modules import ipadapter_cache
+        images = ipadapter_cache.registry.get(ipadapter.embed)
+        if images is None:
+            raise HTTPException(status_code=404, detail=f"IP adapter embed not found: {ipadapter.embed}")
+        return images
+    if not ipadapter.images or len(ipadapter.images) == 0:
+        return None
+    return [decode_base64_to_image(x) for x in ipadapter.images]
+
+
+def get_face_images(face):
+    """source images of face request from registered identity id or base64 images"""
+    if getattr(face, 'identity', None):
+        from modules.face import identity
+        images = identity.identities.get(face.identity)
+        if images is None:
+            raise HTTPException(status_code=404, detail=f"Face identity not found: {face.identity}")
+        return images
+    return face.source_images
+
+
 def encode_pil_to_base64(image):
     """
     with io.BytesIO() as output_bytes:
@@ -35,10 +75,87 @@ def encode_pil_to_base64(image):
     if not isinstance(image, Image.Image):
         shared.log.error('API cannot encode image: not a PIL image')
         return ''
+    return base64.b64encode(encode_image(image))
+
+
+def encode_image(image, fmt: str = None, quality: int = None) -> bytes:
+    """
+    Encode image to bytes in requested format, raw format returns uncompressed pixel data
+    """
+    fmt = (fmt or shared.opts.samples_format).lower()
+    if fmt == 'raw':
+        if image.mode not in ['RGB', 'RGBA', 'L']:
+            image = image.convert('RGB')
+        return image.tobytes()
     buffered = io.BytesIO()
-    save_image(image, fn=buffered, ext=shared.opts.samples_format)
-    b64 = base64.b64encode(buffered.getvalue())
-    return b64
+    save_image(image, fn=buffered, ext=fmt, quality=quality)
+    return buffered.getvalue()
+
+
+def encode_images_to_base64(images: list, fmt: str = None, quality: int = None) -> list:
+    """
+    Encode images in parallel, entries which are not images are returned as empty strings so indices match input
+    """
+    def encode(image):
+        if not isinstance(image, Image.Image):
+            return ''
+        return base64.b64encode(encode_image(image, fmt, quality))
+    return list(encode_pool.map(encode, images))
+
+
+def validate_output_format(request):
+    if getattr(request, 'output_format', None) == 'raw' and not getattr(request, 'output_multipart', False):
+        raise HTTPException(status_code=422, detail="Output format raw requires output_multipart")
+
+
+def multipart_response(images: list, info: str = '', parameters: dict = None, fmt: str = None, quality: int = None):
+    """
+    Stream images as multipart/mixed response, each part is sent as soon as its encoding completes
+    First part is json with info and parameters, image parts include size and mode headers which are required to interpret raw format
+    """
+    from fastapi.responses import StreamingResponse
+    fmt = (fmt or shared.opts.samples_format).lower()
+    boundary = uuid.uuid4().hex
+    images = [(i, image) for i, image in enumerate(images) if isinstance(image, Image.Image)] # keep original index in part filename
+
+    def generate():
+        futures = [encode_pool.submit(encode_image, image, fmt, quality) for _i, image in images]
+        data = json.dumps({ 'info': info, 'parameters': parameters or {}, 'images': len(images) }, default=str).encode()
+        yield f'--{boundary}\r\nContent-Type: application/json\r\nContent-Disposition: form-data; name="info"\r\nContent-Length: {len(data)}\r\n\r\n'.encode() + data + b'\r\n'
+        for (i, image), future in zip(images, futures):
+            data = future.result()
+            headers = [
+                f'Content-Type: {image_mimetypes.get(fmt, "application/octet-stream")}',
+                f'Content-Disposition: form-data; name="image"; filename="{i:05}.{fmt}"',
+                f'Content-Length: {len(data)}',
+                f'X-Image-Width: {image.width}',
+                f'X-Image-Height: {image.height}',
+                f'X-Image-Mode: {image.mode if image.mode in ["RGB", "RGBA", "L"] else "RGB"}',
+            ]
+            yield f'--{boundary}\r\n'.encode() + '\r\n'.join(headers).encode() + b'\r\n\r\n' + data + b'\r\n'
+        yield f'--{boundary}--\r\n'.encode()
+
+    return StreamingResponse(generate(), media_type=f'multipart/mixed; boundary={boundary}')
+
+
+async def parse_multipart(request) -> tuple[dict, dict]:
+    """
+    Parse multipart form upload with json payload in `payload` field and any number of binary image fields
+    Returns payload and dict of field name to list of decoded images
+    """
+    form = await request.form()
+    payload = {}
+    files = {}
+    for key, value in form.multi_items():
+        if key == 'payload':
+            try:
+                payload = json.loads(value if isinstance(value, str) else await value.read())
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=f"Invalid payload: {e}") from e
+        elif hasattr(value, 'read'):
+            data = await value.read()
+            files.setdefault(key, []).append(decode_base64_to_image(data))
+    return payload, files
 
 
 def upscaler_to_index(name: str):
@@ -47,15 +164,16 @@ def upscaler_to_index(name: str):
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid upscaler, needs to be one of these: {' , '.join([x.name for x in shared.sd_upscalers])}") from e
 
-def save_image(image, fn, ext):
+def save_image(image, fn, ext, quality: int = None):
     # actual save
+    quality = quality or shared.opts.jpeg_quality
     parameters = image.info.get('parameters', None)
     image_format = Image.registered_extensions()[f'.{ext}']
     if image_format == 'PNG':
         pnginfo_data = PngImagePlugin.PngInfo()
         for k, v in image.info.items():
             pnginfo_data.add_text(k, str(v))
-        image.save(fn, format=image_format, quality=shared.opts.jpeg_quality, pnginfo=pnginfo_data)
+        image.save(fn, format=image_format, quality=quality, pnginfo=pnginfo_data)
     elif image_format == 'JPEG':
         if image.mode == 'RGBA':
             shared.log.warning('Save: RGBA image as JPEG - removed alpha channel')
@@ -63,12 +181,12 @@ def save_image(image, fn, ext):
         elif image.mode == 'I;16':
             image = image.point(lambda p: p * 0.0038910505836576).convert("L")
         exif_bytes = piexif.dump({ "Exif": { piexif.ExifIFD.UserComment: piexif.helper.UserComment.dump(parameters or "", encoding="unicode") } })
-        image.save(fn, format=image_format, quality=shared.opts.jpeg_quality, exif=exif_bytes)
+        image.save(fn, format=image_format, quality=quality, exif=exif_bytes)
     elif image_format == 'WEBP':
         if image.mode == 'I;16':
             image = image.point(lambda p: p * 0.0038910505836576).convert("RGB")
         exif_bytes = piexif.dump({ "Exif": { piexif.ExifIFD.UserComment: piexif.helper.UserComment.dump(parameters or "", encoding="unicode") } })
-        image.save(fn, format=image_format, quality=shared.opts.jpeg_quality, lossless=shared.opts.webp_lossless, exif=exif_bytes)
+        image.save(fn, format=image_format, quality=quality, lossless=shared.opts.webp_lossless, exif=exif_bytes)
     else:
         # shared.log.warning(f'Unrecognized image format: {extension} attempting save as {image_format}')
-        image.save(fn, format=image_format, quality=shared.opts.jpeg_quality)
+        image.save(fn, format=image_format, quality=quality)
@@ -12,6 +12,7 @@ from fastapi.exceptions import HTTPException
 from fastapi.encoders import jsonable_encoder
 from installer import log
 import modules.errors as errors
+from modules import metrics
 
 
 errors.install()
@@ -41,6 +42,9 @@ def setup_middleware(app: FastAPI, cmd_opts):
             duration = str(round(time.time() - ts, 4))
             res.headers["X-Process-Time"] = duration
             endpoint = req.scope.get('path', 'err')
+            route = getattr(req.scope.get('route', None), 'path', None) or 'unmatched' # route template only so request paths cannot grow label cardinality
+            method = req.scope.get('method', 'err')
+            metrics.http_requests.observe(time.time() - ts, endpoint=route, method=method if method in ['GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'] else 'other', code=res.status_code)
             token = req.cookies.get("access-token") or req.cookies.get("access-token-unsecure")
             if (cmd_opts.api_log or cmd_opts.api_only) and endpoint.startswith('/sdapi'):
                 if '/sdapi/v1/log' in endpoint or '/sdapi/v1/browser' in endpoint:
@@ -1,10 +1,13 @@
 import inspect
-from typing import Any, Optional, Dict, List, Type, Callable
+from typing import Any, Optional, Dict, List, Type, Callable, Literal
 from pydantic import BaseModel, Field, create_model # pylint: disable=no-name-in-module
 from inflection import underscore
 from modules.processing import StableDiffusionProcessingTxt2Img, StableDiffusionProcessingImg2Img
 import modules.shared as shared
 
+OutputFormat = Literal['png', 'jpg', 'jpeg', 'webp', 'raw'] # raw is only valid for multipart responses
+OutputFormatBase64 = Literal['png', 'jpg', 'jpeg', 'webp']
+
 API_NOT_ALLOWED = [
     "self",
     "kwargs",
@@ -151,6 +154,7 @@ class ItemEmbedding(BaseModel):
 class ItemIPAdapter(BaseModel):
     adapter: str = Field(title="Adapter", default="Base", description="IP adapter name")
     images: List[str] = Field(title="Image", default=[], description="IP adapter input images")
+    embed: Optional[str] = Field(title="Embed", default=None, regex=r"^[0-9a-f]{32}$", description="Id of registered reference images used instead of images")
     masks: Optional[List[str]] = Field(title="Mask", default=[], description="IP adapter mask images")
     scale: float = Field(title="Scale", default=0.5, ge=0, le=1, description="IP adapter scale")
     start: float = Field(title="Start", default=0.0, ge=0, le=1, description="IP adapter start step")
@@ -159,7 +163,8 @@ class ItemIPAdapter(BaseModel):
 
 class ItemFace(BaseModel):
     mode: str = Field(title="Mode", default="FaceID", description="The mode to use (available values: FaceID, FaceSwap, PhotoMaker, InstantID).")
-    source_images: list[str] = Field(title="Source Images", description="Source face images, must be base64 encoded containing the image's data.")
+    source_images: list[str] = Field(title="Source Images", default=[], description="Source face images, must be base64 encoded containing the image's data.")
+    identity: Optional[str] = Field(title="Identity", default=None, regex=r"^[0-9a-f]{32}$", description="Id of registered face identity used instead of source images")
     ip_model: str = Field(title="IPAdapter Model", default="FaceID Base", description="The IPAdapter model to use.")
     ip_override_sampler: bool = Field(title="IPAdapter Override Sampler", default=True, description="Should the sampler be overriden?")
     ip_cache_model: bool = Field(title="IPAdapter Cache", default=True, description="Should the IPAdapter model be cached?")
@@ -210,6 +215,9 @@ ReqTxt2Img = PydanticModelGenerator(
         {"key": "alwayson_scripts", "type": dict, "default": {}},
         {"key": "ip_adapter", "type": Optional[List[ItemIPAdapter]], "default": None, "exclude": True},
         {"key": "face", "type": Optional[ItemFace], "default": None, "exclude": True},
+        {"key": "output_format", "type": Optional[OutputFormat], "default": None},
+        {"key": "output_quality", "type": Optional[int], "default": None},
+        {"key": "output_multipart", "type": bool, "default": False},
     ]
 ).generate_model()
 StableDiffusionTxt2ImgProcessingAPI = ReqTxt2Img
@@ -235,6 +243,9 @@ ReqImg2Img = PydanticModelGenerator(
         {"key": "alwayson_scripts", "type": dict, "default": {}},
         {"key": "ip_adapter", "type": Optional[List[ItemIPAdapter]], "default": None, "exclude": True},
         {"key": "face_id", "type": Optional[ItemFace], "default": None, "exclude": True},
+        {"key": "output_format", "type": Optional[OutputFormat], "default": None},
+        {"key": "output_quality", "type": Optional[int], "default": None},
+        {"key": "output_multipart", "type": bool, "default": False},
     ]
 ).generate_model()
 StableDiffusionImg2ImgProcessingAPI = ReqImg2Img
@@ -318,9 +329,43 @@ class ReqVQA(BaseModel):
     model: str = Field(default="MS Florence 2 Base", title="Model", description="The interrogate model used.")
     question: str = Field(default="describe the image", title="Question", description="Question to ask the model.")
 
+class ReqTokens(BaseModel):
+    prompts: List[str] = Field(title="Prompts", description="List of prompts to tokenize")
+    tokens: bool = Field(default=False, title="Tokens", description="Return tokens for each prompt in addition to counts")
+
+class ItemTokens(BaseModel):
+    count: int = Field(title="Count", description="Number of tokens in prompt excluding start and end tokens")
+    max_length: int = Field(title="Max length", description="Number of tokens tokenizer accepts in single chunk, 0 if unlimited")
+    chunks: int = Field(title="Chunks", description="Number of chunks prompt is split into")
+    tokens: Optional[List[str]] = Field(default=None, title="Tokens", description="Tokens of prompt if requested")
+
+class ResTokens(BaseModel):
+    results: List[Dict[str, ItemTokens]] = Field(title="Results", description="Token count, max length, number of chunks and optionally tokens for each prompt keyed by tokenizer name")
+
 class ReqHistory(BaseModel):
     name: str = Field(title="Name", description="Name of the history item to select")
 
+class ReqIPAdapterRegister(BaseModel):
+    images: List[str] = Field(title="Images", description="Reference images, must be Base64 strings containing the image's data.")
+
+class ResIPAdapterRegister(BaseModel):
+    id: str = Field(title="Id", description="Id of registered reference images which can be used as embed in IP adapter requests")
+    images: int = Field(title="Images", description="Number of registered images")
+
+class ReqFaceIdentity(BaseModel):
+    images: List[str] = Field(title="Images", description="Identity source images, must be Base64 strings containing the image's data.")
+    model: str = Field(title="Model", default="buffalo_l", description="Face analyzer model used to analyze images on registration (available values: buffalo_l, antelopev2).")
+
+class ItemFaceInfo(BaseModel):
+    score: float = Field(title="Score", description="Face detection score")
+    gender: Optional[str] = Field(title="Gender", default=None, description="Detected gender")
+    age: Optional[int] = Field(title="Age", default=None, description="Detected age")
+    bbox: List[float] = Field(title="Box", default=[], description="Face bounding box")
+
+class ResFaceIdentity(BaseModel):
+    id: str = Field(title="Id", description="Id of registered face identity which can be used as identity in face requests")
+    faces: List[List[ItemFaceInfo]] = Field(title="Faces", default=[], description="Detected faces for each source image")
+
 class ResVQA(BaseModel):
     answer: Optional[str] = Field(default=None, title="Answer", description="The generated answer for the image.")
 
@@ -0,0 +1,183 @@
+"""
+Opt-in cache of complete generate results for identical api requests
+- key is fingerprint of all request params plus loaded model, vae, referenced networks and server settings
+- requests with random seed or which save images are never cached
+- results are stored on disk as png images and info json and evicted least recently used
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import threading
+from PIL import Image, PngImagePlugin
+from modules import shared
+
+
+debug = shared.log.trace if os.environ.get('SD_API_DEBUG', None) is not None else lambda *args, **kwargs: None
+ignored = ['send_images', 'save_images', 'output_format', 'output_quality', 'output_multipart', 'include_init_images'] # only affect response encoding
+lock = threading.Lock()
+
+
+class Result():
+    """cached result exposing same fields as processed used to build response"""
+    def __init__(self, images: list, info: str):
+        self.images = images
+        self.info = info
+
+    def js(self):
+        return self.info
+
+
+def file_id(fn: str):
+    if fn is None or not os.path.isfile(fn):
+        return fn
+    stat = os.stat(fn)
+    return f'{fn}:{stat.st_size}:{stat.st_mtime}'
+
+
+def encode(obj):
+    if isinstance(obj, Image.Image):
+        h = hashlib.sha256()
+        h.update(f'{obj.size}:{obj.mode}'.encode())
+        h.update(obj.tobytes())
+        return f'image:{h.hexdigest()}'
+    if hasattr(obj, 'dict'): # nested pydantic items
+        return obj.dict()
+    return str(obj)
+
+
+def network_ids(prompts: list):
+    """referenced extra networks resolved to files so that replaced files invalidate results"""
+    from modules import extra_networks
+    networks = sys.modules.get('networks', None)
+    res = []
+    for prompt in prompts:
+        if not isinstance(prompt, str):
+            continue
+        _prompt, extra = extra_networks.parse_prompt(prompt)
+        for name, items in extra.items():
+            for params in items:
+                net = None
+                if networks is not None and len(params.items) > 0:
+                    net = networks.available_network_aliases.get(params.items[0], None) or networks.available_networks.get(params.items[0], None)
+                res.append(f'{name}:{":".join(params.items)}:{file_id(net.filename) if net is not None else None}')
+    return sorted(res)
+
+
+def embedding_ids():
+    """loaded and indexed textual inversion embeddings since prompt tokens resolve to them without explicit reference"""
+    try:
+        from modules import sd_hijack
+        db = sd_hijack.model_hijack.embedding_db
+    except Exception:
+        return []
+    res = [f'{name}:{file_id(embedding.filename)}' for name, embedding in list(db.word_embeddings.items())]
+    res += [f'{name}:{entry.get("size", None)}:{entry.get("mtime", None)}' for name, entry in list(getattr(db, 'index', {}).items())]
+    return sorted(res)
+
+
+def fingerprint(request, op: str):
+    """canonical hash of everything that affects generated images or none if request is not cacheable"""
+    if not shared.opts.api_result_cache:
+        return None
+    if getattr(request, 'save_images', False):
+        return None
+    seed = getattr(request, 'seed', -1)
+    if seed is None or seed == -1:
+        return None
+    if getattr(request, 'subseed_strength', 0) > 0 and getattr(request, 'subseed', -1) in [None, -1]:
+        return None
+    from modules import sd_vae
+    params = { k: v for k, v in vars(request).items() if k not in ignored }
+    checkpoint = getattr(shared.sd_model, 'sd_checkpoint_info', None) if shared.sd_model is not None else None
+    state = {
+        'op': op,
+        'params': params,
+        'model': file_id(checkpoint.filename) if checkpoint is not None else None,
+        'hash': getattr(checkpoint, 'hash', None),
+        'vae': file_id(sd_vae.loaded_vae_file),
+        'networks': network_ids([params.get('prompt', None), params.get('negative_prompt', None)]),
+        'embeddings': embedding_ids(),
+        'opts': shared.opts.data,
+    }
+    data = json.dumps(state, sort_keys=True, default=encode)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def entry_path(key: str):
+    return os.path.join(shared.opts.api_result_cache_dir, key)
+
+
+def get(key: str):
+    from modules import metrics
+    if key is None:
+        return None
+    folder = entry_path(key)
+    result = None
+    try:
+        with lock:
+            if os.path.isfile(os.path.join(folder, 'info.json')):
+                with open(os.path.join(folder, 'info.json'), 'r', encoding='utf8') as f:
+                    data = json.load(f)
+                images = []
+                for i in range(data['images']):
+                    image = Image.open(os.path.join(folder, f'{i:03d}.png'))
+                    image.load()
+                    images.append(image)
+                result = Result(images, data['info'])
+                os.utime(folder) # mark as recently used
+    except Exception as e:
+        shared.log.warning(f'API result cache: key={key} {e}')
+        result = None
+    metrics.cache_access('api_result', result is not None)
+    debug(f'API result cache: key={key} hit={result is not None}')
+    return result
+
+
+def put(key: str, processed):
+    if key is None or processed is None or len(processed.images) == 0:
+        return
+    folder = entry_path(key)
+    tmp = f'{folder}.tmp'
+    try:
+        with lock:
+            shutil.rmtree(tmp, ignore_errors=True)
+            os.makedirs(tmp, exist_ok=True)
+            for i, image in enumerate(processed.images):
+                pnginfo = PngImagePlugin.PngInfo() # keep embedded infotext so hit encodes same as miss
+                for k, v in image.info.items():
+                    pnginfo.add_text(k, str(v))
+                image.save(os.path.join(tmp, f'{i:03d}.png'), pnginfo=pnginfo)
+            with open(os.path.join(tmp, 'info.json'), 'w', encoding='utf8') as f:
+                json.dump({ 'images': len(processed.images), 'info': processed.js() }, f)
+            shutil.rmtree(folder, ignore_errors=True)
+            os.replace(tmp, folder)
+            evict()
+    except Exception as e:
+        shutil.rmtree(tmp, ignore_errors=True)
+        shared.log.warning(f'API result cache: key={key} {e}')
+
+
+def evict():
+    """remove least recently used results until within size limit, caller must hold lock"""
+    root = shared.opts.api_result_cache_dir
+    entries = []
+    for entry in os.scandir(root):
+        if entry.is_dir() and not entry.name.endswith('.tmp'):
+            size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+            entries.append((entry.stat().st_mtime, size, entry.path))
+    entries.sort()
+    total = sum(size for _mtime, size, _path in entries)
+    max_bytes = shared.opts.api_result_cache_mb * 1024 * 1024
+    while len(entries) > 0 and total > max_bytes:
+        _mtime, size, path = entries.pop(0)
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        debug(f'API result cache: evict folder="{path}"')
+
+
+def clear():
+    with lock:
+        shutil.rmtree(shared.opts.api_result_cache_dir, ignore_errors=True)
@@ -39,6 +39,8 @@ def get_script(script_name, script_runner):
     return script_runner.scripts[script_idx]
 
 def init_default_script_args(script_runner):
+    if getattr(script_runner, 'default_args', None): # headless runner already collected defaults
+        return list(script_runner.default_args)
     # find max idx from the scripts in runner and generate a none array to init script_args
     last_arg_index = 1
     for script in script_runner.scripts:
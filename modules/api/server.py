@@ -1,7 +1,11 @@
-from typing import Any, Dict
-from fastapi import Depends
+import asyncio
+from typing import Any, Dict, Optional
+from fastapi import Depends, Request
+from fastapi.exceptions import HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.websockets import WebSocket, WebSocketState, WebSocketDisconnect
 from modules import shared
-from modules.api import models, helpers
+from modules.api import models
 
 
 def post_shutdown():
@@ -66,25 +70,98 @@ def get_cmd_flags():
     return vars(shared.cmd_opts)
 
 def get_progress(req: models.ReqProgress = Depends()):
-    import time
+    from modules import progress
+    snapshot = progress.get_progress()
     if shared.state.job_count == 0:
-        return models.ResProgress(progress=0, eta_relative=0, state=shared.state.dict(), textinfo=shared.state.textinfo)
-    shared.state.do_set_current_image()
+        return models.ResProgress(progress=0, eta_relative=0, state=snapshot['state'], textinfo=snapshot['textinfo'])
     current_image = None
-    if shared.state.current_image and not req.skip_current_image:
-        current_image = helpers.encode_pil_to_base64(shared.state.current_image)
-    batch_x = max(shared.state.job_no, 0)
-    batch_y = max(shared.state.job_count, 1)
-    step_x = max(shared.state.sampling_step, 0)
-    step_y = max(shared.state.sampling_steps, 1)
-    current = step_y * batch_x + step_x
-    total = step_y * batch_y
-    progress = current / total if current > 0 and total > 0 else 0
-    time_since_start = time.time() - shared.state.time_start
-    eta_relative = (time_since_start / progress) - time_since_start if progress > 0 else 0
-    res = models.ResProgress(progress=progress, eta_relative=eta_relative, state=shared.state.dict(), current_image=current_image, textinfo=shared.state.textinfo)
+    if not req.skip_current_image:
+        progress.preview.refresh(steps=max(1, shared.opts.show_progress_every_n_steps)) # shared decoder so concurrent pollers do not decode same step again
+        fmt = shared.opts.samples_format.lower().replace('jpg', 'jpeg')
+        current_image = progress.preview.encoded(fmt)
+    return models.ResProgress(progress=snapshot['progress'], eta_relative=snapshot['eta'], state=snapshot['state'], current_image=current_image, textinfo=snapshot['textinfo'])
+
+async def get_progress_stream(request: Request):
+    """
+    Server-sent events stream of progress snapshots including live preview, pushed by shared preview worker
+    """
+    import json
+    from modules import progress
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=1)
+    sid = progress.preview.subscribe(lambda snapshot: loop.call_soon_threadsafe(put_latest, queue, snapshot))
+
+    async def generate():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    snapshot = await asyncio.wait_for(queue.get(), timeout=15)
+                    yield f'data: {json.dumps(snapshot)}\n\n'
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+        finally:
+            progress.preview.unsubscribe(sid)
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers={ 'Cache-Control': 'no-cache' })
+
+async def ws_progress(ws: WebSocket):
+    """
+    WebSocket stream of progress snapshots including live preview, pushed by shared preview worker
+    """
+    from modules import progress
+    await ws.accept()
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=1)
+    sid = progress.preview.subscribe(lambda snapshot: loop.call_soon_threadsafe(put_latest, queue, snapshot))
+    receiver = asyncio.ensure_future(ws.receive()) # completes when client disconnects even while idle
+    getter = None
+    try:
+        while ws.client_state == WebSocketState.CONNECTED:
+            getter = asyncio.ensure_future(queue.get())
+            done, _pending = await asyncio.wait([getter, receiver], timeout=15, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                if receiver.result().get('type') == 'websocket.disconnect':
+                    break
+                receiver = asyncio.ensure_future(ws.receive()) # client messages are ignored
+            if getter in done:
+                await ws.send_json(getter.result())
+            else:
+                getter.cancel()
+                if len(done) == 0: # idle, sending fails if client is gone
+                    await ws.send_json({ 'keepalive': True })
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        receiver.cancel()
+        if getter is not None:
+            getter.cancel()
+        progress.preview.unsubscribe(sid)
+
+def put_latest(queue: asyncio.Queue, item):
+    if queue.full(): # slow consumer only needs latest snapshot
+        queue.get_nowait()
+    queue.put_nowait(item)
+
+def get_trace(job: Optional[str] = None, chrome: bool = False):
+    """
+    List traced jobs or get spans of single job, chrome=true returns chrome trace event format for chrome://tracing or perfetto
+    Last job is used if job id is not specified
+    """
+    from modules import timer
+    if job is None and not chrome:
+        return timer.trace.summary()
+    if chrome:
+        return timer.trace.chrome(job)
+    res = timer.trace.get(job)
+    if res is None:
+        raise HTTPException(status_code=404, detail="Job not found")
     return res
 
+def get_metrics():
+    from fastapi.responses import PlainTextResponse
+    from modules import metrics
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
 def post_interrupt():
     shared.state.interrupt()
     return {}
@@ -8,10 +8,26 @@ class Detailer: # abstract class used for postprocessing
     def restore(self, np_image):
         return np_image
 
+    def restore_batch(self, np_images, p=None): # default batch implementation is sequential, detailers that support batched inference override it
+        return [self.restore(np_image, p) for np_image in np_images]
 
-def detail(np_image, p=None): # postprocesses the image
+
+def get_detailer():
     detailers = [x for x in shared.detailers if x.name() == shared.opts.detailer_model or shared.opts.detailer_model is None]
     if len(detailers) == 0:
+        return None
+    return detailers[0]
+
+
+def detail(np_image, p=None): # postprocesses the image
+    detailer = get_detailer()
+    if detailer is None:
         return np_image
-    detailer = detailers[0]
     return detailer.restore(np_image, p)
+
+
+def detail_batch(np_images, p=None): # postprocesses all images in the batch
+    detailer = get_detailer()
+    if detailer is None or len(np_images) == 0:
+        return np_images
+    return detailer.restore_batch(np_images, p)
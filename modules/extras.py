@@ -8,7 +8,7 @@ import torch
 import tqdm
 import gradio as gr
 import safetensors.torch
-from modules.merging.merge import merge_models
+from modules.merging.merge import merge_models, merge_models_streaming, can_stream
 from modules.merging.merge_utils import TRIPLE_METHODS
 
 from modules import shared, images, sd_models, sd_vae, sd_models_config, devices
@@ -127,32 +127,13 @@ def run_modelmerger(id_task, **kwargs):  # pylint: disable=unused-argument
     if kwargs.pop("unload", False):
         sd_models.unload_model_weights()
 
-    try:
-        theta_0 = merge_models(**kwargs)
-    except Exception as e:
-        return fail(f"{e}")
-
-    try:
-        theta_0 = theta_0.to_dict() #TensorDict -> Dict if necessary
-    except Exception:
-        pass
-
-    bake_in_vae_filename = sd_vae.vae_dict.get(kwargs.get("bake_in_vae", None), None)
-    if bake_in_vae_filename is not None:
-        shared.log.info(f"Merge VAE='{bake_in_vae_filename}'")
-        shared.state.textinfo = 'Merge VAE'
-        vae_dict = sd_vae.load_vae_dict(bake_in_vae_filename)
-        for key in vae_dict.keys():
-            theta_0_key = 'first_stage_model.' + key
-            if theta_0_key in theta_0:
-                theta_0[theta_0_key] = to_half(vae_dict[key], kwargs.get("precision", "fp16") == "fp16")
-        del vae_dict
-
     ckpt_dir = shared.opts.ckpt_dir or sd_models.model_path
     filename = kwargs.get("custom_name", "Unnamed_Merge")
     filename += "." + kwargs.get("checkpoint_format", None)
     output_modelname = os.path.join(ckpt_dir, filename)
-    shared.state.textinfo = "merge saving"
+    _, extension = os.path.splitext(output_modelname)
+    if os.path.exists(output_modelname) and not kwargs.get("overwrite", False):
+        return [*[gr.Dropdown.update(choices=sd_models.checkpoint_tiles()) for _ in range(4)], f"Model alredy exists: {output_modelname}"]
     metadata = None
     if kwargs.get("save_metadata", False):
         metadata = {"format": "pt", "sd_merge_models": {}}
@@ -185,14 +166,46 @@ def run_modelmerger(id_task, **kwargs):  # pylint: disable=unused-argument
             add_model_metadata(tertiary_model_info)
         metadata["sd_merge_models"] = json.dumps(metadata["sd_merge_models"])
 
-    _, extension = os.path.splitext(output_modelname)
+    vae_dict = None
+    bake_in_vae_filename = sd_vae.vae_dict.get(kwargs.get("bake_in_vae", None), None)
+    if bake_in_vae_filename is not None:
+        shared.log.info(f"Merge VAE='{bake_in_vae_filename}'")
+        shared.state.textinfo = 'Merge VAE'
+        vae_dict = sd_vae.load_vae_dict(bake_in_vae_filename)
 
-    if os.path.exists(output_modelname) and not kwargs.get("overwrite", False):
-        return [*[gr.Dropdown.update(choices=sd_models.checkpoint_tiles()) for _ in range(4)], f"Model alredy exists: {output_modelname}"]
-    if extension.lower() == ".safetensors":
-        safetensors.torch.save_file(theta_0, output_modelname, metadata=metadata)
+    streaming = kwargs.pop("streaming", False)
+    if streaming and extension.lower() == ".safetensors" and can_stream(kwargs["models"], kwargs.get("re_basin", False)):
+        shared.state.textinfo = "merge streaming"
+        overrides = {f'first_stage_model.{k}': to_half(v, kwargs.get("precision", "fp16") == "fp16") for k, v in vae_dict.items()} if vae_dict is not None else None
+        try:
+            merge_models_streaming(output_file=output_modelname, metadata=metadata, overrides=overrides, **kwargs)
+        except Exception as e:
+            return fail(f"{e}")
     else:
-        torch.save(theta_0, output_modelname)
+        if streaming:
+            shared.log.warning('Merge: streaming requires safetensors inputs and output and no rebasin, using in-memory merge')
+        try:
+            theta_0 = merge_models(**kwargs)
+        except Exception as e:
+            return fail(f"{e}")
+
+        try:
+            theta_0 = theta_0.to_dict() #TensorDict -> Dict if necessary
+        except Exception:
+            pass
+
+        if vae_dict is not None:
+            for key in vae_dict.keys():
+                theta_0_key = 'first_stage_model.' + key
+                if theta_0_key in theta_0:
+                    theta_0[theta_0_key] = to_half(vae_dict[key], kwargs.get("precision", "fp16") == "fp16")
+
+        shared.state.textinfo = "merge saving"
+        if extension.lower() == ".safetensors":
+            safetensors.torch.save_file(theta_0, output_modelname, metadata=metadata)
+        else:
+            torch.save(theta_0, output_modelname)
+    del vae_dict
 
     t1 = time.time()
     shared.log.info(f"Merge complete: saved='{output_modelname}' time={t1-t0:.2f}")
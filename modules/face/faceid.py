@@ -8,6 +8,7 @@ import huggingface_hub as hf
 from PIL import Image
 from modules import processing, shared, devices, extra_networks, sd_models, sd_hijack_freeu, script_callbacks, ipadapter
 from modules.sd_hijack_hypertile import context_hypertile_vae, context_hypertile_unet
+from modules.face import identity
 
 FACEID_MODELS = {
     "FaceID Base": "h94/IP-Adapter-FaceID/ip-adapter-faceid_sd15.bin",
@@ -169,7 +170,7 @@ def face_id(
 
             for i, source_image in enumerate(source_images):
                 np_image = cv2.cvtColor(np.array(source_image), cv2.COLOR_RGB2BGR)
-                faces = app.get(np_image)
+                faces = identity.analyze(app, source_image, bgr=np_image)
                 if len(faces) == 0:
                     shared.log.error("FaceID: no faces found")
                     break
@@ -5,6 +5,7 @@ import numpy as np
 import huggingface_hub as hf
 from PIL import Image
 from modules import processing, shared, devices
+from modules.face import identity
 
 
 debug = shared.log.trace if os.environ.get('SD_FACE_DEBUG', None) is not None else lambda *args, **kwargs: None
@@ -20,8 +21,7 @@ def face_swap(p: processing.StableDiffusionProcessing, app, input_images: List[I
         router: insightface.model_zoo.model_zoo.INSwapper = insightface.model_zoo.model_zoo.ModelRouter(model_path)
         swapper = router.get_model()
 
-    np_image = cv2.cvtColor(np.array(source_image), cv2.COLOR_RGB2BGR)
-    faces = app.get(np_image)
+    faces = identity.analyze(app, source_image) # source identity is cached, generated target images are always analyzed
     if faces is None or len(faces) == 0:
         shared.log.warning('FaceSwap: No faces detected')
         return None
@@ -0,0 +1,122 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+from modules import shared, image_store
+
+
+debug = shared.log.trace if os.environ.get('SD_FACE_DEBUG', None) is not None else lambda *args, **kwargs: None
+cache = OrderedDict() # analyzed faces per key in ram
+cache_bytes = 0
+identities = image_store.ImageStore('Face identity', lambda: os.path.join(shared.opts.face_cache_dir, 'identities') if shared.opts.face_cache_dir else None)
+lock = threading.Lock()
+
+
+def get_key(image: Image.Image, model: str):
+    """faces depend only on image content and analyzer model"""
+    return hashlib.sha256(f'{image_store.image_hash(image)}:{model}'.encode()).hexdigest()[:32]
+
+
+def faces_size(faces):
+    return sum(np.asarray(v).nbytes for face in faces for v in face.values())
+
+
+def disk_path(key: str):
+    if not shared.opts.face_cache_disk or not shared.opts.face_cache_dir:
+        return None
+    return os.path.join(shared.opts.face_cache_dir, 'faces', f'{key}.npz')
+
+
+def save(fn: str, faces):
+    data = { f'{i}.{k}': np.asarray(v) for i, face in enumerate(faces) for k, v in face.items() if v is not None }
+    data['count'] = np.asarray(len(faces))
+    os.makedirs(os.path.dirname(fn), exist_ok=True)
+    np.savez(fn, **data)
+
+
+def load(fn: str):
+    from insightface.app.common import Face
+    with np.load(fn) as data:
+        faces = [{} for _i in range(int(data['count']))]
+        for name in data.files:
+            if name == 'count':
+                continue
+            i, k = name.split('.', 1)
+            v = data[name]
+            faces[int(i)][k] = v.item() if v.ndim == 0 else v
+    return [Face(face) for face in faces]
+
+
+def put(key: str, faces, persist: bool = True):
+    global cache_bytes # pylint: disable=global-statement
+    size = faces_size(faces)
+    with lock:
+        if key in cache:
+            cache_bytes -= faces_size(cache[key])
+        cache[key] = faces
+        cache.move_to_end(key)
+        cache_bytes += size
+        max_bytes = shared.opts.face_cache_mb * 1024 * 1024
+        while len(cache) > 0 and (len(cache) > shared.opts.face_cache or (max_bytes > 0 and cache_bytes > max_bytes)):
+            _key, evicted = cache.popitem(last=False)
+            cache_bytes -= faces_size(evicted)
+    fn = disk_path(key) if persist else None
+    if fn is not None:
+        try:
+            save(fn, faces)
+        except Exception as e:
+            shared.log.warning(f'Face cache: file="{fn}" {e}')
+
+
+def get(key: str):
+    with lock:
+        faces = cache.get(key, None)
+        if faces is not None:
+            cache.move_to_end(key)
+            return faces
+    fn = disk_path(key)
+    if fn is not None and os.path.isfile(fn):
+        try:
+            faces = load(fn)
+            put(key, faces, persist=False)
+            debug(f'Face cache: load file="{fn}"')
+            return faces
+        except Exception as e:
+            shared.log.warning(f'Face cache: file="{fn}" {e}')
+    return None
+
+
+def analyze(app, image: Image.Image, bgr=None):
+    """
+    Detected faces with keypoints and embeddings for source image, analyzed once per image and analyzer model
+    Cached faces are shared between requests so callers must not modify them
+    """
+    from modules import metrics
+    if shared.opts.face_cache <= 0 and not shared.opts.face_cache_disk:
+        return app.get(bgr if bgr is not None else to_bgr(image))
+    model = getattr(app, 'model_name', None) or app.__class__.__name__
+    key = get_key(image, model)
+    faces = get(key)
+    metrics.cache_access('face', faces is not None)
+    if faces is not None:
+        debug(f'Face cache: hit key={key} model={model} faces={len(faces)}')
+        return faces
+    faces = app.get(bgr if bgr is not None else to_bgr(image))
+    if faces is not None and len(faces) > 0: # do not remember failed detections
+        put(key, faces)
+    debug(f'Face cache: miss key={key} model={model} faces={len(faces) if faces is not None else 0}')
+    return faces
+
+
+def to_bgr(image: Image.Image):
+    import cv2
+    return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+
+
+def clear():
+    global cache_bytes # pylint: disable=global-statement
+    with lock:
+        cache.clear()
+        cache_bytes = 0
@@ -46,6 +46,7 @@ def get_app(mp_name):
             'download_zip': False,
         }
         insightface_app = FaceAnalysis(name=mp_name, providers=devices.onnx, **kwargs)
+        insightface_app.model_name = mp_name # analyzer identity used by face cache
         instightface_mp = mp_name
         insightface_app.prepare(ctx_id=0, det_thresh=0.5, det_size=(640, 640))
     return insightface_app
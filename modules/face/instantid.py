@@ -4,6 +4,7 @@ import torch
 import numpy as np
 import huggingface_hub as hf
 from modules import shared, processing, sd_models, devices
+from modules.face import identity
 
 
 REPO_ID = "InstantX/InstantID"
@@ -30,7 +31,7 @@ def instant_id(p: processing.StableDiffusionProcessing, app, source_images, stre
     face_embeds = []
     face_images = []
     for i, source_image in enumerate(source_images):
-        faces = app.get(cv2.cvtColor(np.array(source_image), cv2.COLOR_RGB2BGR))
+        faces = identity.analyze(app, source_image)
         face = sorted(faces, key=lambda x:(x['bbox'][2]-x['bbox'][0])*x['bbox'][3]-x['bbox'][1])[-1]  # only use the maximum face
         face_embeds.append(torch.from_numpy(face['embedding']))
         face_images.append(draw_kps(source_image, face['kps']))
@@ -8,10 +8,103 @@ class FaceRestoration:
     def restore(self, np_image):
         return np_image
 
+    def restore_batch(self, np_images, p=None): # default batch implementation is sequential, restorers that support batched inference override it
+        return [self.restore(np_image, p) for np_image in np_images]
 
-def restore_faces(np_image, p=None):
+
+class LazyFaceRestorer(FaceRestoration):
+    """placeholder registered at startup which runs restorer setup on first use and is then replaced by real restorer"""
+    def __init__(self, title: str, setup):
+        self.title = title
+        self.setup = setup
+        self.restorer = None
+
+    def name(self):
+        return self.title
+
+    def load(self):
+        if self.restorer is None:
+            self.setup()
+            if self in shared.face_restorers:
+                shared.face_restorers.remove(self)
+            self.restorer = next((x for x in shared.face_restorers if x.name() == self.title), None)
+            if self.restorer is None:
+                shared.log.error(f'Face restorer: name="{self.title}" setup failed')
+        return self.restorer
+
+    def restore(self, np_image, p=None):
+        restorer = self.load()
+        return restorer.restore(np_image, p) if restorer is not None else np_image
+
+    def restore_batch(self, np_images, p=None):
+        restorer = self.load()
+        if restorer is None:
+            return np_images
+        if hasattr(restorer, 'restore_batch'):
+            return restorer.restore_batch(np_images, p)
+        return [restorer.restore(np_image, p) for np_image in np_images]
+
+
+def get_face_restorer():
     face_restorers = [x for x in shared.face_restorers if x.name() == shared.opts.face_restoration_model or shared.opts.face_restoration_model is None]
     if len(face_restorers) == 0:
+        return None
+    return face_restorers[0]
+
+
+def restore_faces(np_image, p=None):
+    face_restorer = get_face_restorer()
+    if face_restorer is None:
         return np_image
-    face_restorer = face_restorers[0]
     return face_restorer.restore(np_image, p)
+
+
+def restore_faces_batch(np_images, p=None):
+    face_restorer = get_face_restorer()
+    if face_restorer is None or len(np_images) == 0:
+        return np_images
+    if hasattr(face_restorer, 'restore_batch'):
+        return face_restorer.restore_batch(np_images, p)
+    return [face_restorer.restore(np_image, p) for np_image in np_images]
+
+
+helper_state_keys = ['input_img', 'is_gray', 'all_landmarks_5', 'det_faces', 'affine_matrices', 'cropped_faces', 'pad_input_imgs', 'upscale_factor']
+
+
+def save_helper_state(face_helper): # facexlib/facelib face helpers hold state of a single image, snapshot it so detection can run for whole batch before restoration
+    return { k: getattr(face_helper, k) for k in helper_state_keys if hasattr(face_helper, k) }
+
+
+def load_helper_state(face_helper, state):
+    face_helper.clean_all()
+    for k, v in state.items():
+        setattr(face_helper, k, v)
+
+
+def detect_faces_batch(face_helper, np_images_bgr, resize=640):
+    states = []
+    for np_image_bgr in np_images_bgr:
+        face_helper.clean_all()
+        face_helper.read_image(np_image_bgr)
+        face_helper.get_face_landmarks_5(only_center_face=False, resize=resize, eye_dist_threshold=5)
+        face_helper.align_warp_face()
+        states.append(save_helper_state(face_helper))
+    face_helper.clean_all()
+    return states
+
+
+def paste_faces_batch(face_helper, states, restored_faces):
+    results = []
+    i = 0
+    for state in states:
+        if len(state.get('cropped_faces', [])) == 0: # nothing detected so nothing to paste
+            results.append(state.get('input_img', None))
+            continue
+        load_helper_state(face_helper, state)
+        for _face in state['cropped_faces']:
+            face_helper.add_restored_face(restored_faces[i])
+            i += 1
+        face_helper.get_inverse_affine(None)
+        results.append(face_helper.paste_faces_to_input_image())
+    face_helper.clean_all()
+    return results
@@ -1,5 +1,7 @@
 import itertools
 import os
+import time
+import threading
 from collections import UserDict
 from dataclasses import dataclass, field
 from typing import Callable, Dict, Iterator, List, Optional, Union
@@ -102,6 +104,8 @@ def clean_directory(directory: Directory, /, recursive: RecursiveType=False) ->
     if not directory.is_directory:
         is_clean = False
         delete_cached_directory(directory.path)
+    elif is_watched_directory(directory.path): # cached entry is invalidated by file index events so no need to stat
+        is_clean = True
     else:
         is_clean = not directory.is_stale
         if not is_clean:
@@ -203,6 +207,10 @@ def delete_cached_directory(directory_path:str) -> bool:
         del cache_folders[directory_path]
 
 
+def is_watched_directory(directory_path:str) -> bool:
+    return file_index.live and file_index.is_watched(directory_path)
+
+
 def is_directory(dir_path:str) -> bool:
     return dir_path and os.path.exists(dir_path) and os.path.isdir(dir_path)
 
@@ -300,4 +308,241 @@ def list_files(*directory_paths:DirectoryPathList, ext_filter: Optional[Extensio
     ), ext_filter, ext_blacklist)
 
 
+@dataclass(frozen=True)
+class FileInfo:
+    path: str
+    size: int = 0
+    mtime: float = 0
+
+
+@dataclass(frozen=True)
+class FileEvent:
+    action: str # add, remove, modify
+    path: str
+    info: Optional[FileInfo] = None
+
+
+FileEventCallback = Callable[[FileEvent], None]
+
+
+class FileIndex:
+    '''
+    Shared index of files with stat info for watched directories
+    Changes are detected using filesystem notifications if `watchdog` is available with fallback to periodic polling
+    and published as add/remove/modify events to subscribers so listers do not need to rescan
+    '''
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.roots: Dict[str, bool] = {}
+        self.files: Dict[str, FileInfo] = {}
+        self.subscribers: List[FileEventCallback] = []
+        self.observer = None
+        self.handler = None
+        self.poller = None
+        self.poll_interval = 30.0
+        self.live = False # true if change notifications are active so cached entries can be trusted without stat
+
+    def is_watched(self, path:str) -> bool:
+        path = real_path(path)
+        if path is None:
+            return False
+        with self.lock:
+            roots = list(self.roots.items())
+        for root, recursive in roots:
+            if path == root or (recursive and path.startswith(os.path.join(root, ''))):
+                return True
+        return False
+
+    def watch(self, *directory_paths: DirectoryPathList, recursive: bool=True, poll_interval: float=None) -> None:
+        if poll_interval is not None:
+            self.poll_interval = poll_interval
+        roots = [path for path in unique_paths(directory_paths) if is_directory(path) and not self.is_watched(path)]
+        if len(roots) == 0:
+            return
+        t0 = time.time()
+        for root in roots:
+            with self.lock:
+                self.roots[root] = recursive
+            self.scan(root, publish=False)
+            if self.observer is not None:
+                self.schedule(root)
+        self.start()
+        log.debug(f'Files index: roots={len(self.roots)} files={len(self.files)} mode={"notify" if self.observer is not None else "poll"} time={time.time() - t0:.2f}')
+
+    def unwatch(self, directory_path:str) -> None:
+        root = real_path(directory_path)
+        with self.lock:
+            self.roots.pop(root, None)
+            for path in [path for path in self.files if path.startswith(os.path.join(root, ''))]:
+                del self.files[path]
+
+    def subscribe(self, callback: FileEventCallback) -> None:
+        if callback not in self.subscribers:
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback: FileEventCallback) -> None:
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def publish(self, events: List[FileEvent]) -> None:
+        for event in events:
+            for callback in self.subscribers[:]:
+                try:
+                    callback(event)
+                except Exception as e:
+                    log.error(f'Files index: callback={callback} event={event} {e}')
+
+    def stat(self, path:str) -> Union[FileInfo, None]:
+        return self.files.get(real_path(path), None)
+
+    def query(self, prefix: Optional[str]=None, ext_filter: Optional[ExtensionList]=None, ext_blacklist: Optional[ExtensionList]=None) -> FilePathIterator:
+        '''Query indexed files by path prefix and extension without walking the filesystem'''
+        prefix = os.path.join(real_path(prefix), '') if prefix else None
+        with self.lock:
+            paths = [path for path in self.files if prefix is None or path.startswith(prefix)]
+        return filter_files(paths, ext_filter, ext_blacklist)
+
+    def scan(self, root:str, publish:bool=True, recursive:bool=None) -> List[FileEvent]:
+        '''Rescan watched root or directory within it and update index, returns list of detected changes'''
+        if recursive is None:
+            with self.lock:
+                recursive = self.roots.get(root, True)
+        found: Dict[str, FileInfo] = {}
+        for directory in _walk(root, recurse=not_hidden if recursive else False):
+            for path in directory.files:
+                try:
+                    stat = os.stat(path)
+                    found[path] = FileInfo(path, stat.st_size, stat.st_mtime)
+                except OSError:
+                    pass
+        events = []
+        _root = os.path.join(root, '')
+        with self.lock:
+            for path in [path for path in self.files if path.startswith(_root) and path not in found]:
+                events.append(FileEvent('remove', path, self.files.pop(path)))
+            for path, info in found.items():
+                existing = self.files.get(path, None)
+                if existing is None:
+                    events.append(FileEvent('add', path, info))
+                elif existing != info:
+                    events.append(FileEvent('modify', path, info))
+                self.files[path] = info
+        if publish and len(events) > 0:
+            self.publish(events)
+        return events
+
+    def update(self, action:str, path:str) -> None:
+        '''Apply single change reported by filesystem notifications'''
+        path = real_path(path)
+        if path is None or not self.is_watched(path):
+            return
+        info = None
+        if action != 'remove' and os.path.isdir(path): # added or moved-in directory has no events for its contents
+            delete_cached_directory(os.path.dirname(path))
+            self.scan(path, recursive=True)
+            return
+        with self.lock:
+            if action == 'remove':
+                info = self.files.pop(path, None)
+                if info is None: # not a known file so possibly a directory, purge everything below it
+                    _prefix = os.path.join(path, '')
+                    events = [FileEvent('remove', child, self.files.pop(child)) for child in [child for child in self.files if child.startswith(_prefix)]]
+                    delete_cached_directory(path)
+                    delete_cached_directory(os.path.dirname(path))
+                    if len(events) > 0:
+                        self.publish(events)
+                    return
+            else:
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    return
+                info = FileInfo(path, stat.st_size, stat.st_mtime)
+                action = 'add' if path not in self.files else action
+                self.files[path] = info
+        self.publish([FileEvent(action, path, info)])
+
+    def schedule(self, root:str) -> None:
+        self.observer.schedule(self.handler, root, recursive=self.roots.get(root, True))
+
+    def start(self) -> None:
+        if self.observer is not None or self.poller is not None:
+            return
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+            index = self
+
+            class Handler(FileSystemEventHandler):
+                def on_created(self, event):
+                    index.update('add', event.src_path)
+
+                def on_deleted(self, event):
+                    index.update('remove', event.src_path)
+
+                def on_modified(self, event):
+                    if not event.is_directory:
+                        index.update('modify', event.src_path)
+
+                def on_moved(self, event):
+                    index.update('remove', event.src_path)
+                    index.update('add', event.dest_path)
+
+            self.handler = Handler()
+            self.observer = Observer()
+            self.observer.daemon = True
+            with self.lock:
+                roots = list(self.roots)
+            for root in roots:
+                self.schedule(root)
+            self.observer.start()
+            self.live = True
+        except Exception as e:
+            log.debug(f'Files index: notifications unavailable, using polling interval={self.poll_interval} {e}')
+            self.observer = None
+            self.live = False
+            self.poller = threading.Thread(target=self.poll, daemon=True, name='files-index')
+            self.poller.start()
+
+    def poll(self) -> None:
+        while True:
+            time.sleep(self.poll_interval)
+            with self.lock:
+                roots = list(self.roots)
+            for root in roots:
+                try:
+                    self.scan(root)
+                except Exception as e:
+                    log.error(f'Files index: scan="{root}" {e}')
+
+    def stop(self) -> None:
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer = None
+        self.live = False
+
+
+def indexed_files(*directory_paths:DirectoryPathList, ext_filter: Optional[ExtensionList]=None, ext_blacklist: Optional[ExtensionList]=None, recursive:RecursiveType=True) -> FilePathIterator:
+    '''Recursive file listing served from file index for watched directories, other directories are walked as in list_files'''
+    indexed = []
+    walked = []
+    for directory in unique_paths(directory_paths):
+        if is_watched_directory(directory):
+            indexed.append(directory)
+        else:
+            walked.append(directory)
+    files = [path for directory in indexed for path in file_index.query(directory, ext_filter=ext_filter, ext_blacklist=ext_blacklist)]
+    if len(walked) > 0:
+        files += list_files(*walked, ext_filter=ext_filter, ext_blacklist=ext_blacklist, recursive=recursive)
+    return iter(files)
+
+
+def invalidate_cached_directory(event: FileEvent) -> None:
+    # cached directory listings are trusted without stat for watched directories so parent must be refreshed on add/remove
+    if event.action in ['add', 'remove']:
+        delete_cached_directory(os.path.dirname(event.path))
+
+
 cache_folders = DirectoryCache({})
+file_index = FileIndex()
+file_index.subscribe(invalidate_cached_directory)
@@ -2,7 +2,7 @@ import copy
 import hashlib
 import os.path
 from rich import progress, errors
-from modules import shared
+from modules import shared, metrics
 from modules.paths import data_path
 
 cache_filename = os.path.join(data_path, "cache.json")
@@ -62,6 +62,7 @@ def sha256(filename, title, use_addnet_hash=False):
     global progress_ok # pylint: disable=global-statement
     hashes = cache("hashes-addnet") if use_addnet_hash else cache("hashes")
     sha256_value = sha256_from_cache(filename, title, use_addnet_hash)
+    metrics.cache_access('hash', sha256_value is not None)
     if sha256_value is not None:
         return sha256_value
     if shared.cmd_opts.no_hashing:
@@ -0,0 +1,91 @@
+"""
+Content-addressed store of registered reference image sets
+- id is hash of image contents so registering same images returns same id
+- recently used sets are kept in ram and all sets are persisted as png so ids remain valid after restart
+- shared by ip adapter reference registration and face identity store so both use same ids and validation
+"""
+
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from PIL import Image
+from modules import shared
+
+
+valid_id = re.compile(r'^[0-9a-f]{32}$')
+
+
+def flatten(images):
+    if isinstance(images, Image.Image):
+        return [images]
+    return [image for item in images for image in flatten(item)]
+
+
+def image_hash(images):
+    """content address of single image or nested list of images"""
+    h = hashlib.sha256()
+    for image in flatten(images):
+        h.update(f'{image.size}:{image.mode}'.encode())
+        h.update(image.tobytes())
+    return h.hexdigest()[:32]
+
+
+class ImageStore():
+    def __init__(self, name: str, root, size: int = 16):
+        self.name = name
+        self.root = root # callable returning folder for persisted sets or none
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def path(self, image_id: str):
+        root = self.root()
+        if not valid_id.match(image_id or '') or not root:
+            return None
+        return os.path.join(root, image_id)
+
+    def remember(self, image_id: str, images: list):
+        with self.lock:
+            self.items[image_id] = images
+            self.items.move_to_end(image_id)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def register(self, images: list):
+        """register images and return id which can be used instead of images in later requests"""
+        images = [image.convert('RGB') for image in images]
+        image_id = image_hash(images)
+        self.remember(image_id, images)
+        folder = self.path(image_id)
+        if folder is not None and not os.path.isdir(folder):
+            try:
+                os.makedirs(folder, exist_ok=True)
+                for i, image in enumerate(images):
+                    image.save(os.path.join(folder, f'{i:03d}.png'))
+            except Exception as e:
+                shared.log.warning(f'{self.name} register: folder="{folder}" {e}')
+        shared.log.debug(f'{self.name} register: id={image_id} images={len(images)}')
+        return image_id, images
+
+    def get(self, image_id: str):
+        """images of registered id or none if id is unknown or invalid"""
+        if not valid_id.match(image_id or ''):
+            return None
+        with self.lock:
+            images = self.items.get(image_id, None)
+            if images is not None:
+                self.items.move_to_end(image_id)
+        if images is not None:
+            return images
+        folder = self.path(image_id)
+        if folder is None or not os.path.isdir(folder):
+            return None
+        images = []
+        for fn in sorted(os.listdir(folder)):
+            image = Image.open(os.path.join(folder, fn))
+            image.load()
+            images.append(image)
+        self.remember(image_id, images)
+        return images
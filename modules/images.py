@@ -11,10 +11,11 @@ import numpy as np
 import piexif
 import piexif.helper
 from PIL import Image, PngImagePlugin, ExifTags
-from modules import sd_samplers, shared, script_callbacks, errors, paths
+from modules import sd_samplers, shared, script_callbacks, errors, paths, timer
 from modules.images_grid import image_grid, get_grid_size, split_grid, combine_grid, check_grid_size, get_font, draw_grid_annotations, draw_prompt_matrix, GridAnnotation, Grid # pylint: disable=unused-import
 from modules.images_resize import resize_image # pylint: disable=unused-import
-from modules.images_namegen import FilenameGenerator, get_next_sequence_number # pylint: disable=unused-import
+from modules.images_namegen import FilenameGenerator, get_next_sequence_number, release_filename # pylint: disable=unused-import
+from modules.images_video import VideoWriter, open_video, video_filename # pylint: disable=unused-import
 
 
 debug = errors.log.trace if os.environ.get('SD_PATH_DEBUG', None) is not None else lambda *args, **kwargs: None
@@ -79,6 +80,7 @@ def atomically_save_image():
         except Exception as e:
             shared.log.error(f'Save failed: file="{fn}" format={image_format} args={save_args} {e}')
             errors.display(e, 'Image save')
+            release_filename(fn)
         size = os.path.getsize(fn) if os.path.exists(fn) else 0
         shared.log.info(f'Save: image="{fn}" type={image_format} width={image.width} height={image.height} size={size}')
         if shared.opts.save_log_fn != '' and len(exifinfo) > 0:
@@ -101,6 +103,7 @@ save_thread = threading.Thread(target=atomically_save_image, daemon=True)
 save_thread.start()
 
 
+@timer.trace.traced()
 def save_image(image,
                path=None,
                basename='',
@@ -118,7 +121,7 @@ def save_image(image,
                suffix='',
                save_to_dirs=None,
             ): # pylint: disable=unused-argument
-    fn = f'{sys._getframe(2).f_code.co_name}:{sys._getframe(1).f_code.co_name}' # pylint: disable=protected-access
+    fn = f'{sys._getframe(3).f_code.co_name}:{sys._getframe(2).f_code.co_name}' # pylint: disable=protected-access # skip trace wrapper frame
     debug(f'Save: fn={fn}') # pylint: disable=protected-access
     if image is None:
         shared.log.warning('Image is none')
@@ -160,8 +163,11 @@ def save_image(image,
         os.makedirs(dirname, exist_ok=True)
     params.filename = namegen.sequence(params.filename, dirname, basename)
     params.filename = namegen.sanitize(params.filename)
+    reserved = params.filename
     # callbacks
     script_callbacks.before_image_saved_callback(params)
+    if params.filename != reserved: # callback changed target so reserved sequence placeholder is not used
+        release_filename(reserved)
     exifinfo = params.pnginfo.get('UserComment', '')
     exifinfo = exifinfo + ', ' if len(exifinfo) > 0 else ''
     exifinfo += params.pnginfo.get(pnginfo_section_name, '')
@@ -177,68 +183,16 @@ def save_image(image,
 
 
 def save_video_atomic(images, filename, video_type: str = 'none', duration: float = 2.0, loop: bool = False, interpolate: int = 0, scale: float = 1.0, pad: int = 1, change: float = 0.3):
-    try:
-        import cv2
-    except Exception as e:
-        shared.log.error(f'Save video: cv2: {e}')
-        return
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
-    if video_type.lower() == 'mp4':
-        frames = images
-        if interpolate > 0:
-            try:
-                import modules.rife
-                frames = modules.rife.interpolate(images, count=interpolate, scale=scale, pad=pad, change=change)
-            except Exception as e:
-                shared.log.error(f'RIFE interpolation: {e}')
-                errors.display(e, 'RIFE interpolation')
-        video_frames = [np.array(frame) for frame in frames]
-        fourcc = "mp4v"
-        h, w, _c = video_frames[0].shape
-        video_writer = cv2.VideoWriter(filename, fourcc=cv2.VideoWriter_fourcc(*fourcc), fps=len(frames)/duration, frameSize=(w, h))
-        for i in range(len(video_frames)):
-            img = cv2.cvtColor(video_frames[i], cv2.COLOR_RGB2BGR)
-            video_writer.write(img)
-        size = os.path.getsize(filename)
-        shared.log.info(f'Save video: file="{filename}" frames={len(frames)} duration={duration} fourcc={fourcc} size={size}')
-    if video_type.lower() == 'gif' or video_type.lower() == 'png':
-        append = images.copy()
-        image = append.pop(0)
-        if loop:
-            append += append[::-1]
-        frames=len(append) + 1
-        image.save(
-            filename,
-            save_all = True,
-            append_images = append,
-            optimize = False,
-            duration = 1000.0 * duration / frames,
-            loop = 0 if loop else 1,
-        )
-        size = os.path.getsize(filename)
-        shared.log.info(f'Save video: file="{filename}" frames={len(append) + 1} duration={duration} loop={loop} size={size}')
+    writer = VideoWriter(None, filename=filename, video_type=video_type, duration=duration, loop=loop, interpolate=interpolate, scale=scale, pad=pad, change=change, frames=len(images))
+    for image in images:
+        writer.append(image)
+    writer.close()
 
 
 def save_video(p, images, filename = None, video_type: str = 'none', duration: float = 2.0, loop: bool = False, interpolate: int = 0, scale: float = 1.0, pad: int = 1, change: float = 0.3, sync: bool = False):
     if images is None or len(images) < 2 or video_type is None or video_type.lower() == 'none':
         return None
-    image = images[0]
-    if p is not None:
-        seed = p.all_seeds[0] if getattr(p, 'all_seeds', None) is not None else p.seed
-        prompt = p.all_prompts[0] if getattr(p, 'all_prompts', None) is not None else p.prompt
-        namegen = FilenameGenerator(p, seed=seed, prompt=prompt, image=image)
-    else:
-        namegen = FilenameGenerator(None, seed=0, prompt='', image=image)
-    if filename is None and p is not None:
-        filename = namegen.apply(shared.opts.samples_filename_pattern if shared.opts.samples_filename_pattern and len(shared.opts.samples_filename_pattern) > 0 else "[seq]-[prompt_words]")
-        filename = os.path.join(shared.opts.outdir_video, filename)
-        filename = namegen.sequence(filename, shared.opts.outdir_video, '')
-    else:
-        if os.pathsep not in filename:
-            filename = os.path.join(shared.opts.outdir_video, filename)
-    if not filename.lower().endswith(video_type.lower()):
-        filename += f'.{video_type.lower()}'
-    filename = namegen.sanitize(filename)
+    filename = video_filename(p, images[0], filename, video_type)
     if not sync:
         threading.Thread(target=save_video_atomic, args=(images, filename, video_type, duration, loop, interpolate, scale, pad, change)).start()
     else:
@@ -4,6 +4,7 @@ import uuid
 import string
 import hashlib
 import datetime
+import threading
 from pathlib import Path
 from modules import shared, errors
 
@@ -177,16 +178,19 @@ class FilenameGenerator:
         return fn
 
     def sequence(self, fn, dirname, basename):
+        """final filename with [seq] resolved, candidate is sanitized before it is reserved so placeholder has exactly the name that is saved"""
         x = fn
         if shared.opts.save_images_add_number or '[seq]' in fn:
             if '[seq]' not in fn:
                 fn = os.path.join(os.path.dirname(fn), f"[seq]-{os.path.basename(fn)}")
-            basecount = get_next_sequence_number(dirname, basename)
+            basecount = sequence_index.next(dirname, basename)
             for i in range(9999):
                 seq = f"{basecount + i:05}"
-                filename = fn.replace('[seq]', seq)
-                if not os.path.exists(filename):
+                filename = self.sanitize(fn.replace('[seq]', seq))
+                if reserve_filename(filename): # guards against files created by other threads or processes since index was seeded
                     debug(f'Prompt sequence: input="{fn}" seq={seq} output="{filename}"')
+                    if i > 0:
+                        sequence_index.update(dirname, basename, basecount + i)
                     x = filename
                     break
         return x
@@ -223,6 +227,30 @@ class FilenameGenerator:
         return res
 
 
+def reserve_filename(filename):
+    """
+    Atomically create empty placeholder so no other thread or process sharing the folder can take the same name
+    Placeholder is overwritten by the actual save
+    """
+    try:
+        fd = os.open(filename, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        os.close(fd)
+        return True
+    except FileExistsError:
+        return False
+    except OSError: # filesystem does not support exclusive create
+        return not os.path.exists(filename)
+
+
+def release_filename(filename):
+    """remove placeholder if reserved name was not used"""
+    try:
+        if os.path.isfile(filename) and os.path.getsize(filename) == 0:
+            os.remove(filename)
+    except OSError:
+        pass
+
+
 def get_next_sequence_number(path, basename):
     """
     Determines and returns the next sequence number to use when saving an image in the specified directory.
@@ -241,3 +269,36 @@ def get_next_sequence_number(path, basename):
             except ValueError:
                 pass
     return result + 1
+
+
+class SequenceIndex:
+    """
+    In-memory index of next sequence number per directory and basename.
+    Index is seeded once per directory using get_next_sequence_number and then incremented on each reservation,
+    so concurrent saves within the process never receive the same number and directory is not listed on every save.
+    Names are reserved on disk with reserve_filename so other processes seeded from the same listing skip taken numbers.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = {}
+
+    def key(self, path, basename):
+        return (os.path.abspath(path or '.'), basename or '')
+
+    def next(self, path, basename):
+        key = self.key(path, basename)
+        with self.lock:
+            if key not in self.index:
+                self.index[key] = get_next_sequence_number(path, basename)
+                debug(f'Sequence index: path="{key[0]}" basename="{key[1]}" seed={self.index[key]}')
+            value = self.index[key]
+            self.index[key] = value + 1
+        return value
+
+    def update(self, path, basename, value): # advance index if a higher number was used
+        key = self.key(path, basename)
+        with self.lock:
+            self.index[key] = max(self.index.get(key, 0), value + 1)
+
+
+sequence_index = SequenceIndex()
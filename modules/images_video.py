@@ -0,0 +1,180 @@
+import os
+import time
+import queue
+import threading
+import numpy as np
+from PIL import Image
+from modules import shared, errors
+from modules.images_namegen import FilenameGenerator, release_filename
+
+
+def video_filename(p, image, filename: str = None, video_type: str = 'none'):
+    if p is not None:
+        seed = p.all_seeds[0] if getattr(p, 'all_seeds', None) is not None else p.seed
+        prompt = p.all_prompts[0] if getattr(p, 'all_prompts', None) is not None else p.prompt
+        namegen = FilenameGenerator(p, seed=seed, prompt=prompt, image=image)
+    else:
+        namegen = FilenameGenerator(None, seed=0, prompt='', image=image)
+    if filename is None and p is not None:
+        filename = namegen.apply(shared.opts.samples_filename_pattern if shared.opts.samples_filename_pattern and len(shared.opts.samples_filename_pattern) > 0 else "[seq]-[prompt_words]")
+        filename = os.path.join(shared.opts.outdir_video, f'{filename}.{video_type.lower()}')
+        filename = namegen.sequence(filename, shared.opts.outdir_video, '') # reserve final name including extension
+    else:
+        if os.pathsep not in filename:
+            filename = os.path.join(shared.opts.outdir_video, filename)
+        if not filename.lower().endswith(video_type.lower()):
+            filename += f'.{video_type.lower()}'
+    filename = namegen.sanitize(filename)
+    return filename
+
+
+class VideoWriter:
+    """
+    Streaming video sink: frames are appended as they are produced and interpolated and encoded on background worker
+    Only mp4 is encoded incrementally, gif and png animations are written by pillow in one call so their frames are collected until close
+    """
+    def __init__(self, p=None, filename: str = None, video_type: str = 'mp4', duration: float = 2.0, loop: bool = False, interpolate: int = 0, scale: float = 1.0, pad: int = 1, change: float = 0.3, frames: int = 0, fps: float = 0):
+        self.p = p
+        self.filename = filename
+        self.video_type = video_type.lower()
+        self.duration = duration
+        self.loop = loop
+        self.interpolate = interpolate
+        self.scale = scale
+        self.pad = pad
+        self.change = change
+        self.frames = frames # expected number of input frames used to determine mp4 frame rate
+        self.fps = fps
+        self.written = 0
+        self.collected = [] # gif/png frames or mp4 frames received before frame rate is known
+        self.writer = None
+        self.interpolator = None
+        self.error = None
+        self.started = False
+        self.ended = False # end marker was received so queue must not be read again
+        self.t0 = time.time()
+        self.queue = queue.Queue(maxsize=16) # bounded so producer waits instead of buffering whole video
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+
+    def append(self, image: Image.Image):
+        if self.error is None:
+            self.queue.put(image)
+
+    def close(self):
+        """flush remaining frames, wait for encoder and return filename or none if video could not be written, error is logged by worker"""
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            return None
+        return self.filename
+
+    def worker(self):
+        try:
+            import cv2 # pylint: disable=unused-import
+        except Exception as e:
+            self.error = e
+            shared.log.error(f'Save video: cv2: {e}')
+            self.drain()
+            return
+        try:
+            image = self.queue.get()
+            while image is not None:
+                self.process(image)
+                image = self.queue.get()
+            self.ended = True
+            if self.interpolator is not None:
+                for frame in self.interpolator.flush():
+                    self.write(frame)
+            self.finish()
+        except Exception as e:
+            self.error = e
+            shared.log.error(f'Save video: file="{self.filename}" {e}')
+            errors.display(e, 'Save video')
+            if self.writer is not None:
+                self.writer.release()
+                self.writer = None
+            if self.started:
+                release_filename(self.filename) # remove reserved placeholder if nothing was written
+            self.drain()
+
+    def drain(self): # consume remaining frames so producer is never blocked after error
+        if self.ended:
+            return
+        image = self.queue.get()
+        while image is not None:
+            image = self.queue.get()
+        self.ended = True
+
+    def process(self, image: Image.Image):
+        if not self.started: # first frame resolves filename and starts interpolator
+            self.started = True
+            self.filename = video_filename(self.p, image, self.filename, self.video_type)
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            if self.video_type == 'mp4' and self.interpolate > 0:
+                try:
+                    import modules.rife
+                    self.interpolator = modules.rife.Interpolator(count=self.interpolate, scale=self.scale, pad=self.pad, change=self.change)
+                except Exception as e:
+                    shared.log.error(f'RIFE interpolation: {e}')
+                    errors.display(e, 'RIFE interpolation')
+        if self.interpolator is not None:
+            for frame in self.interpolator.push(image):
+                self.write(frame)
+        else:
+            self.write(image)
+
+    def write(self, image: Image.Image):
+        if self.video_type != 'mp4' or (self.fps <= 0 and (self.frames <= 0 or self.interpolator is not None)): # frame rate depends on total output frames which is not known yet
+            self.collected.append(image) # interpolated count depends on scene changes in frames not yet received
+            return
+        if self.writer is None:
+            self.open(image, self.fps if self.fps > 0 else self.frames / self.duration)
+        self.encode(image)
+
+    def open(self, image: Image.Image, fps: float):
+        import cv2
+        self.fps = fps
+        self.writer = cv2.VideoWriter(self.filename, fourcc=cv2.VideoWriter_fourcc(*'mp4v'), fps=fps, frameSize=(image.width, image.height))
+
+    def encode(self, image: Image.Image):
+        import cv2
+        self.writer.write(cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR))
+        self.written += 1
+
+    def finish(self):
+        if self.video_type == 'mp4':
+            if self.writer is None and len(self.collected) > 0:
+                self.open(self.collected[0], len(self.collected) / self.duration)
+            for image in self.collected:
+                self.encode(image)
+            self.collected.clear()
+            if self.writer is None:
+                return
+            self.writer.release()
+            size = os.path.getsize(self.filename)
+            shared.log.info(f'Save video: file="{self.filename}" frames={self.written} fps={self.fps:.2f} duration={self.duration} fourcc=mp4v size={size} time={time.time()-self.t0:.2f}')
+        elif self.video_type in ['gif', 'png'] and len(self.collected) > 0:
+            append = self.collected.copy()
+            image = append.pop(0)
+            if self.loop:
+                append += append[::-1]
+            frames = len(append) + 1
+            image.save(
+                self.filename,
+                save_all = True,
+                append_images = append,
+                optimize = False,
+                duration = 1000.0 * self.duration / frames,
+                loop = 0 if self.loop else 1,
+            )
+            size = os.path.getsize(self.filename)
+            shared.log.info(f'Save video: file="{self.filename}" frames={frames} duration={self.duration} loop={self.loop} size={size}')
+            self.collected.clear()
+
+
+def open_video(p, filename: str = None, video_type: str = 'none', duration: float = 2.0, loop: bool = False, interpolate: int = 0, scale: float = 1.0, pad: int = 1, change: float = 0.3, frames: int = 0, fps: float = 0):
+    """open streaming video sink, returns none if video output is disabled"""
+    if video_type is None or video_type.lower() == 'none':
+        return None
+    return VideoWriter(p, filename=filename, video_type=video_type, duration=duration, loop=loop, interpolate=interpolate, scale=scale, pad=pad, change=change, frames=frames, fps=fps)
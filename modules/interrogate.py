@@ -1,7 +1,11 @@
 import os
 import sys
 import time
-from collections import namedtuple
+import json
+import hashlib
+import threading
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import re
 import torch
@@ -68,6 +72,7 @@ class InterrogateModels:
         self.skip_categories = []
         self.content_dir = content_dir
         self.running_on_cpu = False
+        self.text_features = {} # normalized clip text features per category phrase list
 
     def categories(self):
         if not os.path.exists(self.content_dir):
@@ -143,6 +148,7 @@ class InterrogateModels:
         if not shared.opts.interrogate_keep_models_in_memory:
             if self.clip_model is not None:
                 self.clip_model = self.clip_model.to(devices.cpu)
+            self.text_features.clear() # reloaded from disk on next use
 
     def send_blip_to_ram(self):
         if not shared.opts.interrogate_keep_models_in_memory:
@@ -154,19 +160,48 @@ class InterrogateModels:
         self.send_blip_to_ram()
         devices.torch_gc()
 
+    def get_text_features(self, text_array):
+        """
+        Normalized clip text features for phrase list
+        Features depend only on clip model and phrases so they are computed once and stored on disk as fp16 matrix which is memory-mapped on load
+        """
+        import numpy as np
+        key = hashlib.sha256('\n'.join([clip_model_name] + list(text_array)).encode()).hexdigest()[:16]
+        features = self.text_features.get(key, None)
+        if features is not None:
+            return features
+        fn = os.path.join(shared.opts.clip_models_path, 'features', f'{clip_model_name.replace("/", "-")}-{key}.npy')
+        t0 = time.time()
+        if os.path.isfile(fn):
+            data = np.load(fn, mmap_mode='r')
+            features = torch.from_numpy(np.ascontiguousarray(data)).to(device=devices.device, dtype=self.dtype)
+            shared.log.debug(f'Interrogate features: load file="{fn}" shape={list(features.shape)} time={time.time()-t0:.2f}')
+        else:
+            import clip
+            chunks = []
+            chunk_size = max(1, config['chunk_size'])
+            with devices.inference_context():
+                for i in range(0, len(text_array), chunk_size):
+                    text_tokens = clip.tokenize(list(text_array[i:i+chunk_size]), truncate=True).to(devices.device)
+                    chunk = self.clip_model.encode_text(text_tokens).type(self.dtype)
+                    chunks.append(chunk / chunk.norm(dim=-1, keepdim=True))
+            features = torch.cat(chunks, dim=0)
+            try:
+                os.makedirs(os.path.dirname(fn), exist_ok=True)
+                np.save(f'{fn}.tmp.npy', features.to(device=devices.cpu, dtype=torch.float16).numpy())
+                os.replace(f'{fn}.tmp.npy', fn)
+            except Exception as e:
+                shared.log.warning(f'Interrogate features: file="{fn}" {e}')
+            shared.log.debug(f'Interrogate features: encode phrases={len(text_array)} file="{fn}" time={time.time()-t0:.2f}')
+        self.text_features[key] = features
+        return features
+
     def rank(self, image_features, text_array, top_count=1):
-        import clip
-        devices.torch_gc()
         if shared.opts.interrogate_clip_dict_limit != 0:
             text_array = text_array[0:int(shared.opts.interrogate_clip_dict_limit)]
         top_count = min(top_count, len(text_array))
-        text_tokens = clip.tokenize(list(text_array), truncate=True).to(devices.device)
-        text_features = self.clip_model.encode_text(text_tokens).type(self.dtype)
-        text_features /= text_features.norm(dim=-1, keepdim=True)
-        similarity = torch.zeros((1, len(text_array))).to(devices.device)
-        for i in range(image_features.shape[0]):
-            similarity += (100.0 * image_features[i].unsqueeze(0) @ text_features.T).softmax(dim=-1)
-        similarity /= image_features.shape[0]
+        text_features = self.get_text_features(text_array)
+        similarity = (100.0 * image_features.to(text_features.dtype) @ text_features.T).float().softmax(dim=-1).mean(dim=0, keepdim=True) # average over all image features
         top_probs, top_labels = similarity.cpu().topk(top_count, dim=-1)
         return [(text_array[top_labels[0][i].numpy()], (top_probs[0][i].numpy()*100)) for i in range(top_count)]
 
@@ -220,16 +255,53 @@ class InterrogateModels:
 # --------- interrrogate ui
 
 class BatchWriter:
-    def __init__(self, folder):
+    """streams results to sidecar txt files and/or jsonl manifest on background thread so writes do not stall the model"""
+    def __init__(self, folder, output='Sidecar'):
         self.folder = folder
+        self.sidecar = output in ['Sidecar', 'Both']
+        self.manifest = os.path.join(folder, 'interrogate.jsonl') if output in ['Manifest', 'Both'] else None
         self.csv, self.file = None, None
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        if self.manifest is not None:
+            self.file = open(self.manifest, 'a', encoding='utf-8') # pylint: disable=consider-using-with
+
+    def sidecar_file(self, file):
+        return os.path.join(self.folder, os.path.splitext(file)[0] + ".txt")
+
+    def done(self):
+        """files that already have results from previous run"""
+        files = set()
+        if self.manifest is not None and os.path.isfile(self.manifest):
+            with open(self.manifest, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        files.add(json.loads(line)['file'])
+                    except Exception:
+                        pass # partial line from interrupted run
+        return files
+
+    def is_done(self, file, done):
+        if self.manifest is not None and file not in done:
+            return False
+        if self.sidecar and not os.path.isfile(self.sidecar_file(file)):
+            return False
+        return True
+
+    def write(self, file, prompt):
+        if self.sidecar:
+            with open(self.sidecar_file(file), 'w', encoding='utf-8') as f:
+                f.write(prompt)
+        if self.file is not None:
+            with self.lock:
+                self.file.write(json.dumps({ 'file': file, 'prompt': prompt }) + '\n')
+                self.file.flush()
 
     def add(self, file, prompt):
-        txt_file = os.path.splitext(file)[0] + ".txt"
-        with open(os.path.join(self.folder, txt_file), 'w', encoding='utf-8') as f:
-            f.write(prompt)
+        self.executor.submit(self.write, file, prompt)
 
     def close(self):
+        self.executor.shutdown(wait=True)
         if self.file is not None:
             self.file.close()
 
@@ -296,26 +368,87 @@ def unload_clip_model():
         devices.torch_gc()
 
 
-def interrogate(image, mode, caption=None):
+def interrogate(image, mode, caption=None, features=None):
     shared.log.info(f'Interrogate: mode={mode} image={image}')
     t0 = time.time()
-    if mode == 'best':
-        prompt = ci.interrogate(image, caption=caption, min_flavors=config["min_flavors"], max_flavors=config["max_flavors"])
-    elif mode == 'caption':
-        prompt = ci.generate_caption(image) if caption is None else caption
-    elif mode == 'classic':
-        prompt = ci.interrogate_classic(image, caption=caption, max_flavors=config["max_flavors"])
-    elif mode == 'fast':
-        prompt = ci.interrogate_fast(image, caption=caption, max_flavors=config["max_flavors"])
-    elif mode == 'negative':
-        prompt = ci.interrogate_negative(image, max_flavors=config["max_flavors"])
-    else:
-        raise RuntimeError(f"Unknown mode {mode}")
+    if features is not None: # precomputed image features from batch so modes that rank multiple tables do not re-encode image
+        ci.image_to_features = lambda _image: features
+    try:
+        if mode == 'best':
+            prompt = ci.interrogate(image, caption=caption, min_flavors=config["min_flavors"], max_flavors=config["max_flavors"])
+        elif mode == 'caption':
+            prompt = ci.generate_caption(image) if caption is None else caption
+        elif mode == 'classic':
+            prompt = ci.interrogate_classic(image, caption=caption, max_flavors=config["max_flavors"])
+        elif mode == 'fast':
+            prompt = ci.interrogate_fast(image, caption=caption, max_flavors=config["max_flavors"])
+        elif mode == 'negative':
+            prompt = ci.interrogate_negative(image, max_flavors=config["max_flavors"])
+        else:
+            raise RuntimeError(f"Unknown mode {mode}")
+    finally:
+        if features is not None:
+            del ci.image_to_features # restore class method
     t1 = time.time()
     shared.log.debug(f'Interrogate: prompt="{prompt}" time={t1-t0:.2f}')
     return prompt
 
 
+def caption_batch(images):
+    """generate captions for list of images in a single caption model call"""
+    ci._prepare_caption() # pylint: disable=protected-access
+    inputs = ci.caption_processor(images=images, return_tensors="pt").to(ci.device)
+    if not ci.config.caption_model_name.startswith('git-'):
+        inputs = inputs.to(ci.dtype)
+    with devices.inference_context():
+        tokens = ci.caption_model.generate(**inputs, max_new_tokens=ci.config.caption_max_length)
+    return [caption.strip() for caption in ci.caption_processor.batch_decode(tokens, skip_special_tokens=True)]
+
+
+def features_batch(tensors):
+    """encode list of preprocessed images in a single clip model call"""
+    ci._prepare_clip() # pylint: disable=protected-access
+    with devices.inference_context(), devices.autocast():
+        features = ci.clip_model.encode_image(torch.stack(tensors).to(ci.device))
+        features /= features.norm(dim=-1, keepdim=True)
+    return [f.unsqueeze(0) for f in features]
+
+
+def prepare_image(file, preprocess):
+    """decode and preprocess image, runs on worker thread"""
+    try:
+        image = Image.open(file).convert('RGB')
+        return image, preprocess(image) if preprocess is not None else None
+    except Exception as e:
+        shared.log.error(f'Interrogate batch: file="{file}" {e}')
+        return None, None
+
+
+def prefetch_images(files, batch_size, workers, preprocess):
+    """yield batches of decoded images while worker pool decodes next batches, number of images in flight is bounded"""
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        remaining = iter(files)
+        pending = deque()
+        for file in remaining:
+            pending.append((file, executor.submit(prepare_image, file, preprocess)))
+            if len(pending) >= 2 * batch_size:
+                break
+        batch = []
+        while len(pending) > 0:
+            file, future = pending.popleft()
+            nxt = next(remaining, None)
+            if nxt is not None:
+                pending.append((nxt, executor.submit(prepare_image, nxt, preprocess)))
+            image, tensor = future.result()
+            if image is not None:
+                batch.append((file, image, tensor))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if len(batch) > 0:
+            yield batch
+
+
 def interrogate_image(image, clip_model, blip_model, mode):
     shared.state.begin('Interrogate')
     try:
@@ -346,45 +479,52 @@ def interrogate_batch(batch_files, batch_folder, batch_str, clip_model, blip_mod
         return ''
     shared.state.begin('Batch interrogate')
     prompts = []
+    writer = None
     try:
         if not shared.native and (shared.cmd_opts.lowvram or shared.cmd_opts.medvram):
             lowvram.send_everything_to_cpu()
             devices.torch_gc()
         load_interrogator(clip_model, blip_model)
-        shared.log.info(f'Interrogate batch: images={len(files)} mode={mode} config={ci.config}')
-        captions = []
-        # first pass: generate captions
-        for file in files:
-            caption = ""
-            try:
-                if shared.state.interrupted:
-                    break
-                image = Image.open(file).convert('RGB')
-                caption = ci.generate_caption(image)
-            except Exception as e:
-                shared.log.error(f'Interrogate caption: {e}')
-            finally:
-                captions.append(caption)
-        # second pass: interrogate
         if write:
-            writer = BatchWriter(os.path.dirname(files[0]))
-        for idx, file in enumerate(files):
+            writer = BatchWriter(os.path.dirname(files[0]), output=shared.opts.interrogate_batch_output)
+            if shared.opts.interrogate_batch_resume:
+                done = writer.done()
+                skipped = len(files)
+                files = [f for f in files if not writer.is_done(f, done)]
+                skipped -= len(files)
+                if skipped > 0:
+                    shared.log.info(f'Interrogate batch: resume skipped={skipped}')
+        batch_size = max(1, shared.opts.interrogate_batch_size)
+        shared.log.info(f'Interrogate batch: images={len(files)} mode={mode} batch={batch_size} workers={shared.opts.interrogate_batch_workers} config={ci.config}')
+        shared.state.job_count = (len(files) + batch_size - 1) // batch_size
+        t0 = time.time()
+        preprocess = ci.clip_preprocess if mode != 'caption' else None # clip preprocessing runs on worker threads together with decode
+        for batch in prefetch_images(files, batch_size, shared.opts.interrogate_batch_workers, preprocess):
+            if shared.state.interrupted:
+                break
+            images = [image for _file, image, _tensor in batch]
             try:
-                if shared.state.interrupted:
-                    break
-                image = Image.open(file).convert('RGB')
-                prompt = interrogate(image, mode, caption=captions[idx])
-                prompts.append(prompt)
-                if write:
-                    writer.add(file, prompt)
-            except OSError as e:
-                shared.log.error(f'Interrogate batch: {e}')
-        if write:
-            writer.close()
+                captions = caption_batch(images) if mode != 'negative' else [None] * len(batch)
+            except Exception as e:
+                shared.log.warning(f'Interrogate batch: caption fallback {e}')
+                captions = [ci.generate_caption(image) for image in images]
+            features = features_batch([tensor for _file, _image, tensor in batch]) if preprocess is not None else [None] * len(batch)
+            for (file, image, _tensor), caption, feature in zip(batch, captions, features):
+                try:
+                    prompt = interrogate(image, mode, caption=caption, features=feature)
+                    prompts.append(prompt)
+                    if writer is not None:
+                        writer.add(file, prompt)
+                except Exception as e:
+                    shared.log.error(f'Interrogate batch: file="{file}" {e}')
+            shared.state.job_no += 1
+        shared.log.info(f'Interrogate batch: images={len(prompts)} time={time.time()-t0:.2f}')
         ci.config.quiet = False
         unload_clip_model()
     except Exception as e:
         shared.log.error(f'Interrogate batch: {e}')
+    if writer is not None:
+        writer.close()
     shared.state.end()
     return '\n\n'.join(prompts)
 
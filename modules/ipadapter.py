@@ -104,6 +104,9 @@ def unapply(pipe): # pylint: disable=arguments-differ
         if hasattr(pipe, 'set_ip_adapter_scale'):
             pipe.set_ip_adapter_scale(0)
         if hasattr(pipe, 'unet') and hasattr(pipe.unet, 'config') and pipe.unet.config.encoder_hid_dim_type == 'ip_image_proj':
+            from modules import ipadapter_resident
+            if ipadapter_resident.enabled() and ipadapter_resident.detach(pipe): # keep weights for next request
+                return
             pipe.unet.encoder_hid_proj = None
             pipe.config.encoder_hid_dim_type = None
             pipe.unet.set_default_attn_processor()
@@ -187,6 +190,7 @@ def apply(pipe, p: processing.StableDiffusionProcessing, adapter_names=[], adapt
         shared.log.error(f'IP adapter: pipeline not supported: {pipe.__class__.__name__}')
         return False
 
+    from modules import ipadapter_resident
     for adapter_name in adapter_names:
         # which clip to use
         if 'ViT' not in adapter_name:
@@ -210,9 +214,8 @@ def apply(pipe, p: processing.StableDiffusionProcessing, adapter_names=[], adapt
         # load image encoder used by ip adapter
         if pipe.image_encoder is None or clip_loaded != f'{clip_repo}/{clip_subfolder}':
             try:
-                from transformers import CLIPVisionModelWithProjection
-                shared.log.debug(f'IP adapter load: image encoder="{clip_repo}/{clip_subfolder}"')
-                pipe.image_encoder = CLIPVisionModelWithProjection.from_pretrained(clip_repo, subfolder=clip_subfolder, torch_dtype=devices.dtype, cache_dir=shared.opts.diffusers_dir, use_safetensors=True)
+                ipadapter_resident.offload_encoder(pipe.image_encoder)
+                pipe.image_encoder = ipadapter_resident.load_encoder(clip_repo, clip_subfolder)
                 clip_loaded = f'{clip_repo}/{clip_subfolder}'
             except Exception as e:
                 shared.log.error(f'IP adapter: failed to load image encoder: {e}')
@@ -223,7 +226,8 @@ def apply(pipe, p: processing.StableDiffusionProcessing, adapter_names=[], adapt
     t0 = time.time()
     ip_subfolder = 'models' if shared.sd_model_type == 'sd' else 'sdxl_models'
     try:
-        pipe.load_ip_adapter([base_repo], subfolder=[ip_subfolder], weight_name=adapters)
+        if not ipadapter_resident.attach(pipe, adapters, ip_subfolder): # resident adapters are only re-enabled
+            ipadapter_resident.load_adapter(pipe, base_repo, adapters, ip_subfolder)
         if hasattr(p, 'ip_adapter_layers'):
             pipe.set_ip_adapter_scale(p.ip_adapter_layers)
             ip_str = ';'.join(adapter_names) + ':' + json.dumps(p.ip_adapter_layers)
@@ -233,7 +237,12 @@ def apply(pipe, p: processing.StableDiffusionProcessing, adapter_names=[], adapt
                     adapter_scales[i] = 0.00
             pipe.set_ip_adapter_scale(adapter_scales)
             ip_str =  [f'{os.path.splitext(adapter)[0]}:{scale}:{start}:{end}' for adapter, scale, start, end in zip(adapter_names, adapter_scales, adapter_starts, adapter_ends)]
-        p.task_args['ip_adapter_image'] = crop_images(adapter_images, adapter_crops)
+        from modules import ipadapter_cache
+        embeds = ipadapter_cache.embeds(pipe, adapter_images, adapter_crops, encoder=clip_loaded, cfg=ipadapter_cache.guidance(pipe, p.cfg_scale), crop_fn=crop_images)
+        if embeds is not None: # precomputed image encoder outputs skip encoder and face crop
+            p.task_args['ip_adapter_image_embeds'] = embeds
+        else:
+            p.task_args['ip_adapter_image'] = crop_images(adapter_images, adapter_crops)
         if len(adapter_masks) > 0:
             p.cross_attention_kwargs = { 'ip_adapter_masks': adapter_masks }
         p.extra_generation_params["IP Adapter"] = ';'.join(ip_str)
@@ -0,0 +1,116 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import torch
+from modules import shared, devices, image_store
+
+
+debug = shared.log.trace if os.environ.get('SD_IP_DEBUG', None) is not None else lambda *args, **kwargs: None
+cache = OrderedDict() # image encoder outputs per key in ram
+registry = image_store.ImageStore('IP adapter', lambda: os.path.join(shared.opts.ipadapter_cache_dir, 'images') if shared.opts.ipadapter_cache_dir else None)
+lock = threading.Lock()
+
+
+def enabled():
+    return shared.opts.ipadapter_cache > 0 or shared.opts.ipadapter_cache_disk
+
+
+def guidance(pipe, guidance_scale: float):
+    """pipeline do_classifier_free_guidance which is only valid during pipeline call so evaluate it with requested scale"""
+    if not isinstance(getattr(type(pipe), 'do_classifier_free_guidance', None), property):
+        return guidance_scale > 1
+    previous = getattr(pipe, '_guidance_scale', None)
+    try:
+        pipe._guidance_scale = guidance_scale # pylint: disable=protected-access
+        return bool(pipe.do_classifier_free_guidance)
+    except Exception:
+        return guidance_scale > 1
+    finally:
+        pipe._guidance_scale = previous # pylint: disable=protected-access
+
+
+def get_key(images_hash: str, encoder: str, hidden: bool, crop: bool, cfg: bool):
+    """encoder output depends only on images, encoder and which encoder output adapter uses, not on loaded model"""
+    return hashlib.sha256(f'{images_hash}:{encoder}:{hidden}:{crop}:{cfg}'.encode()).hexdigest()[:32]
+
+
+def disk_path(key: str):
+    if not shared.opts.ipadapter_cache_disk or not shared.opts.ipadapter_cache_dir:
+        return None
+    return os.path.join(shared.opts.ipadapter_cache_dir, 'embeds', f'{key}.safetensors')
+
+
+def get(key: str):
+    with lock:
+        tensor = cache.get(key, None)
+        if tensor is not None:
+            cache.move_to_end(key)
+            return tensor
+    fn = disk_path(key)
+    if fn is not None and os.path.isfile(fn):
+        try:
+            from safetensors.torch import load_file
+            tensor = load_file(fn)['embeds']
+            put(key, tensor, persist=False)
+            debug(f'IP adapter cache: load file="{fn}"')
+            return tensor
+        except Exception as e:
+            shared.log.warning(f'IP adapter cache: file="{fn}" {e}')
+    return None
+
+
+def put(key: str, tensor: torch.Tensor, persist: bool = True):
+    tensor = tensor.detach().to(devices.cpu).contiguous()
+    size = shared.opts.ipadapter_cache
+    if size > 0:
+        with lock:
+            cache[key] = tensor
+            cache.move_to_end(key)
+            while len(cache) > size:
+                cache.popitem(last=False)
+    fn = disk_path(key) if persist else None
+    if fn is not None:
+        try:
+            from safetensors.torch import save_file
+            os.makedirs(os.path.dirname(fn), exist_ok=True)
+            save_file({ 'embeds': tensor }, fn)
+        except Exception as e:
+            shared.log.warning(f'IP adapter cache: file="{fn}" {e}')
+
+
+def embeds(pipe, images: list, crops: list, encoder: str, cfg: bool, crop_fn):
+    """
+    Image encoder outputs for all adapters in format expected by pipeline ip_adapter_image_embeds
+    Returns none when pipeline cannot use precomputed embeds so caller passes images instead
+    """
+    if not enabled() or not hasattr(pipe, 'prepare_ip_adapter_image_embeds'):
+        return None
+    try:
+        from diffusers.models.embeddings import ImageProjection
+        layers = pipe.unet.encoder_hid_proj.image_projection_layers
+    except Exception:
+        return None
+    if len(layers) != len(images):
+        return None
+    from modules import metrics
+    keys = [get_key(image_store.image_hash(image), encoder, not isinstance(layer, ImageProjection), crop, cfg) for image, layer, crop in zip(images, layers, crops)]
+    results = [get(key) for key in keys]
+    missing = [i for i, res in enumerate(results) if res is None]
+    metrics.cache_access('ipadapter', len(missing) == 0)
+    if len(missing) > 0: # pipeline encodes all adapters together so compute all and store missing
+        cropped = crop_fn([image.copy() if isinstance(image, list) else image for image in images], crops)
+        with devices.inference_context():
+            computed = pipe.prepare_ip_adapter_image_embeds(ip_adapter_image=cropped, ip_adapter_image_embeds=None, device=devices.device, num_images_per_prompt=1, do_classifier_free_guidance=cfg)
+        for i in missing:
+            put(keys[i], computed[i])
+            results[i] = computed[i]
+        debug(f'IP adapter cache: miss keys={[keys[i] for i in missing]}')
+    else:
+        debug(f'IP adapter cache: hit keys={keys}')
+    return [res.to(device=devices.device, dtype=devices.dtype) for res in results]
+
+
+def clear():
+    with lock:
+        cache.clear()
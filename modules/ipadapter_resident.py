@@ -0,0 +1,167 @@
+"""
+Keeps loaded IP adapters and their image encoders resident between requests
+- loaded adapter set is detached from unet when not requested and reattached without reloading weights
+- image encoders are kept per repo and offloaded when another encoder is active
+- least recently used entries are evicted once resident size exceeds memory budget
+"""
+
+import os
+import time
+import weakref
+import threading
+from collections import OrderedDict
+from modules import shared, devices, sd_models
+
+
+debug = shared.log.trace if os.environ.get('SD_IPADAPTER_DEBUG', None) is not None else lambda *args, **kwargs: None
+resident = OrderedDict() # adapter sets and image encoders per key
+lock = threading.Lock()
+
+
+def enabled():
+    return shared.opts.ipadapter_resident_mb > 0
+
+
+def module_size(module):
+    return sum(p.numel() * p.element_size() for p in module.parameters()) if hasattr(module, 'parameters') else 0
+
+
+def evict():
+    """drop least recently used entries until within budget, caller must hold lock"""
+    from modules import metrics
+    for key in [k for k, v in resident.items() if v['kind'] == 'adapter' and v['unet']() is None]: # model was unloaded
+        resident.pop(key)
+    max_bytes = shared.opts.ipadapter_resident_mb * 1024 * 1024
+    total = sum(v['size'] for v in resident.values())
+    while len(resident) > 1 and total > max_bytes:
+        key, entry = resident.popitem(last=False)
+        total -= entry['size']
+        shared.log.debug(f'IP adapter resident: evict {entry["kind"]}="{key}" size={entry["size"] / 1024 / 1024:.1f}MB')
+    metrics.adapter_resident.set(total)
+
+
+def is_adapter_processor(processor):
+    return 'IPAdapter' in processor.__class__.__name__
+
+
+def default_processor():
+    import torch
+    from diffusers.models.attention_processor import AttnProcessor, AttnProcessor2_0
+    return AttnProcessor2_0() if hasattr(torch.nn.functional, 'scaled_dot_product_attention') else AttnProcessor()
+
+
+def adapter_key(weights: list, subfolder: str):
+    return f'{subfolder}:' + ';'.join(weights)
+
+
+def find(unet, proj):
+    with lock:
+        for entry in resident.values():
+            if entry['kind'] == 'adapter' and entry['proj'] is proj and entry['unet']() is unet:
+                return entry
+    return None
+
+
+def attach(pipe, weights: list, subfolder: str):
+    """enable previously loaded adapter set, returns false if adapter set needs to be loaded"""
+    from modules import metrics
+    if not enabled():
+        return False
+    key = adapter_key(weights, subfolder)
+    with lock:
+        entry = resident.get(key, None)
+        if entry is not None and entry['unet']() is not pipe.unet:
+            resident.pop(key)
+            entry = None
+        if entry is not None:
+            resident.move_to_end(key)
+    metrics.cache_access('ipadapter_resident', entry is not None)
+    if entry is None:
+        return False
+    if pipe.unet.encoder_hid_proj is not entry['proj']:
+        current = pipe.unet.attn_processors # only adapter layers are replaced so processors set since load are kept
+        pipe.unet.set_attn_processor({ name: entry['processors'][name] if name in entry['processors'] else processor for name, processor in current.items() })
+        pipe.unet.encoder_hid_proj = entry['proj']
+        pipe.unet.config.encoder_hid_dim_type = 'ip_image_proj'
+        debug(f'IP adapter resident: attach adapter="{key}"')
+    return True
+
+
+def detach(pipe):
+    """disable adapter set keeping its weights resident, returns false if attached adapter is not managed here"""
+    unet = pipe.unet
+    proj = getattr(unet, 'encoder_hid_proj', None)
+    if proj is None:
+        return True
+    entry = find(unet, proj)
+    if entry is None:
+        return False
+    current = unet.attn_processors # restore current processors and replace only adapter layers
+    unet.set_attn_processor({ name: default_processor() if is_adapter_processor(processor) else processor for name, processor in current.items() })
+    unet.encoder_hid_proj = None
+    debug(f'IP adapter resident: detach adapter="{entry["name"]}"')
+    return True
+
+
+def load_adapter(pipe, repo: str, weights: list, subfolder: str):
+    """load adapter set into unet and keep it resident"""
+    from modules import metrics
+    if enabled() and not detach(pipe): # unmanaged adapter such as faceid is attached
+        pipe.unet.encoder_hid_proj = None
+        pipe.unet.set_default_attn_processor()
+    t0 = time.time()
+    pipe.load_ip_adapter([repo], subfolder=[subfolder], weight_name=weights)
+    t1 = time.time()
+    key = adapter_key(weights, subfolder)
+    metrics.adapter_loads.observe(t1 - t0, kind='ipadapter', adapter=key)
+    processors = { name: processor for name, processor in pipe.unet.attn_processors.items() if is_adapter_processor(processor) }
+    size = module_size(pipe.unet.encoder_hid_proj) + sum(module_size(processor) for processor in processors.values())
+    shared.log.debug(f'IP adapter load: adapter="{key}" size={size / 1024 / 1024:.1f}MB time={t1-t0:.2f}')
+    if not enabled():
+        return
+    with lock:
+        resident[key] = { 'kind': 'adapter', 'name': key, 'unet': weakref.ref(pipe.unet), 'proj': pipe.unet.encoder_hid_proj, 'processors': processors, 'size': size }
+        resident.move_to_end(key)
+        evict()
+
+
+def load_encoder(repo: str, subfolder: str):
+    """get image encoder from resident set or load it"""
+    from modules import metrics
+    key = f'{repo}/{subfolder}'
+    with lock:
+        entry = resident.get(key, None)
+        if entry is not None:
+            resident.move_to_end(key)
+    metrics.cache_access('ipadapter_resident', entry is not None)
+    if entry is not None:
+        debug(f'IP adapter resident: encoder="{key}"')
+        return entry['model']
+    from transformers import CLIPVisionModelWithProjection
+    t0 = time.time()
+    model = CLIPVisionModelWithProjection.from_pretrained(repo, subfolder=subfolder, torch_dtype=devices.dtype, cache_dir=shared.opts.diffusers_dir, use_safetensors=True)
+    t1 = time.time()
+    metrics.adapter_loads.observe(t1 - t0, kind='encoder', adapter=key)
+    shared.log.debug(f'IP adapter load: image encoder="{key}" time={t1-t0:.2f}')
+    if enabled():
+        with lock:
+            resident[key] = { 'kind': 'encoder', 'name': key, 'model': model, 'size': module_size(model) }
+            evict()
+    return model
+
+
+def offload_encoder(model):
+    """move inactive resident encoder out of vram"""
+    if model is None or not enabled():
+        return
+    with lock:
+        managed = any(entry['kind'] == 'encoder' and entry['model'] is model for entry in resident.values())
+    if managed:
+        sd_models.move_model(model, devices.cpu)
+
+
+def clear():
+    from modules import metrics
+    with lock:
+        resident.clear()
+    metrics.adapter_resident.set(0)
@@ -10,6 +10,8 @@ from modules import timer, errors
 
 
 initialized = False
+if os.environ.get('SD_IMPORT_PROFILE', None) is not None: # report per-module import times at end of startup
+    timer.imports.install()
 errors.install()
 logging.getLogger("DeepSpeed").disabled = True
 
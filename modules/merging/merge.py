@@ -1,5 +1,8 @@
 import os
-from concurrent.futures import ThreadPoolExecutor
+import json
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from contextlib import contextmanager
 from typing import Dict, Optional, Tuple, Set
 import safetensors.torch
@@ -8,7 +11,7 @@ from tensordict import TensorDict
 import modules.memstats
 import modules.devices as devices
 from modules.shared import log, console
-from modules.sd_models import read_state_dict
+from modules.sd_models import read_state_dict, transform_checkpoint_dict_key
 from modules.merging import merge_methods
 from modules.merging.merge_utils import WeightClass
 from modules.merging.merge_rebasin import (
@@ -402,3 +405,181 @@ def save_model(model, output_file, file_format) -> None:
         )
     else:
         torch.save({"state_dict": model}, f"{output_file}.ckpt")
+
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+for name, attr in (("F8_E4M3", "float8_e4m3fn"), ("F8_E5M2", "float8_e5m2")):
+    if hasattr(torch, attr):
+        SAFETENSORS_DTYPES[name] = getattr(torch, attr)
+SAFETENSORS_NAMES = {v: k for k, v in SAFETENSORS_DTYPES.items()}
+
+
+class StreamingModel:
+    """memory-mapped safetensors model with dict-like access so tensors are read one key at a time"""
+    def __init__(self, filename: os.PathLike):
+        self.filename = filename
+        self.handle = safetensors.safe_open(filename, framework="pt", device="cpu")
+        self.lock = threading.Lock()
+        self.names = {} # transformed key to key in file
+        for k in self.handle.keys():
+            new_key = transform_checkpoint_dict_key(k)
+            if new_key is not None:
+                self.names[new_key] = k
+
+    def keys(self):
+        return self.names.keys()
+
+    def __contains__(self, key):
+        return key in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, key):
+        with self.lock:
+            return self.handle.get_tensor(self.names[key])
+
+    def info(self, key):
+        """dtype and shape from header without reading tensor data"""
+        with self.lock:
+            tensor_slice = self.handle.get_slice(self.names[key])
+            return SAFETENSORS_DTYPES[tensor_slice.get_dtype()], list(tensor_slice.get_shape())
+
+
+def can_stream(models: Dict[str, os.PathLike], re_basin: bool = False) -> bool:
+    return not re_basin and all(str(m).lower().endswith(".safetensors") for m in models.values())
+
+
+def plan_streaming_merge(thetas: Dict[str, StreamingModel], precision: str, prune: bool, overrides: Dict):
+    """output layout computed from headers only: ordered list of key, source, dtype and shape"""
+    def out_dtype(dtype):
+        return torch.float16 if precision == "fp16" and dtype.is_floating_point else dtype
+
+    model_a, model_b = thetas["model_a"], thetas["model_b"]
+    keyset = set.intersection(*[set(m.keys()) for m in thetas.values() if len(m)]) if prune else None
+    plan = []
+    for key in model_a.keys():
+        dtype, shape = model_a.info(key)
+        if key in overrides:
+            plan.append((key, "override", out_dtype(overrides[key].dtype), list(overrides[key].shape)))
+        elif KEY_POSITION_IDS in key:
+            plan.append((key, "position_ids", torch.int64, [1, MAX_TOKENS]))
+        elif prune and (key not in keyset or not (key.startswith("model.diffusion_model.") or key.startswith("cond_stage_model."))):
+            if "model" in key: # pruned keys are restored from primary model
+                plan.append((key, "model_a", out_dtype(dtype), shape))
+        elif any(key not in theta for theta in thetas.values()):
+            plan.append((key, "model_a", out_dtype(dtype), shape))
+        else:
+            infos = [theta.info(key) for theta in thetas.values()]
+            b_dtype, b_shape = infos[1]
+            if shape != b_shape: # pix2pix and inpainting models keep tensor with more input channels
+                source = "model_a" if shape[1] > b_shape[1] else "model_b"
+                plan.append((key, source, out_dtype(dtype if source == "model_a" else b_dtype), shape if source == "model_a" else b_shape))
+                continue
+            merged_dtype = dtype
+            for d, _s in infos[1:]:
+                merged_dtype = torch.promote_types(merged_dtype, d)
+            plan.append((key, "merge", out_dtype(merged_dtype), shape))
+    for key in model_b.keys(): # keys only present in secondary model
+        if KEY_POSITION_IDS in key or "model" not in key or key in model_a:
+            continue
+        dtype, shape = model_b.info(key)
+        plan.append((key, "model_b", out_dtype(dtype), shape))
+    return plan
+
+
+def merge_models_streaming(
+    models: Dict[str, os.PathLike],
+    output_file: str,
+    merge_mode: str,
+    precision: str = "fp16",
+    weights_clip: bool = False,
+    device: torch.device = None,
+    work_device: torch.device = None,
+    prune: bool = False,
+    threads: int = 4,
+    metadata: Dict = None,
+    overrides: Dict = None,
+    **kwargs,
+) -> int:
+    """
+    Out-of-core merge: inputs are memory-mapped, keys are merged by bounded thread pool and written incrementally to output safetensors
+    Peak memory stays at a few tensors per worker regardless of model size, returns number of tensors written
+    """
+    overrides = overrides or {}
+    thetas = {k: StreamingModel(m) for k, m in models.items()}
+    weight_matcher = WeightClass(thetas["model_a"], **kwargs)
+    plan = plan_streaming_merge(thetas, precision, prune, overrides)
+
+    header = {"__metadata__": {k: str(v) for k, v in (metadata or {"format": "pt"}).items()}}
+    offsets = {}
+    offset = 0
+    for key, _source, dtype, shape in plan:
+        size = torch.Size(shape).numel() * torch.tensor([], dtype=dtype).element_size()
+        header[key] = {"dtype": SAFETENSORS_NAMES[dtype], "shape": shape, "data_offsets": [offset, offset + size]}
+        offsets[key] = (offset, size)
+        offset += size
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * ((8 - len(header_bytes) % 8) % 8) # header is padded to 8 byte alignment
+    base = 8 + len(header_bytes)
+
+    def compute(key, source, dtype):
+        if source == "override":
+            tensor = overrides[key]
+        elif source == "position_ids":
+            tensor = torch.tensor([list(range(MAX_TOKENS))], dtype=torch.int64)
+        elif source == "merge":
+            tensor = merge_key(key, thetas, weight_matcher, merge_mode, precision, weights_clip, device, work_device)
+        else:
+            tensor = thetas[source][key]
+        return tensor.detach().to(device="cpu", dtype=dtype).contiguous()
+
+    log.info(f"Merge streaming: models={list(models.values())} output='{output_file}' tensors={len(plan)} size={offset} threads={threads}")
+    tmp_file = f"{output_file}.tmp"
+    import rich.progress as p
+    try:
+        with open(tmp_file, "wb") as f, p.Progress(p.TextColumn('[cyan]{task.description}'), p.BarColumn(), p.TaskProgressColumn(), p.TimeRemainingColumn(), p.TimeElapsedColumn(), p.TextColumn('[cyan]keys={task.fields[keys]}'), console=console) as progress:
+            f.write(struct.pack("<Q", len(header_bytes)))
+            f.write(header_bytes)
+            f.truncate(base + offset)
+            task = progress.add_task(description="Merging", total=len(plan), keys=len(plan))
+
+            def write(future):
+                key, tensor = future.result()
+                start, size = offsets[key]
+                data = tensor.reshape(-1).view(torch.uint8).numpy().tobytes() if size > 0 else b""
+                if len(data) != size:
+                    raise ValueError(f"Merge streaming: key={key} size={len(data)} expected={size}")
+                f.seek(base + start)
+                f.write(data)
+                progress.update(task, advance=1)
+
+            pending = set()
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                for key, source, dtype, _shape in plan:
+                    pending.add(executor.submit(lambda k, s, d: (k, compute(k, s, d)), key, source, dtype))
+                    if len(pending) >= 2 * threads: # bounded prefetch keeps only few tensors in flight
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            write(future)
+                for future in pending:
+                    write(future)
+        os.replace(tmp_file, output_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        thetas.clear()
+        devices.torch_gc(force=False)
+    log_vram("streaming complete")
+    return len(plan)
@@ -0,0 +1,177 @@
+import time
+import threading
+
+
+lock = threading.Lock()
+registry = {} # metric per name
+latency_buckets = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def format_labels(labels: tuple):
+    if len(labels) == 0:
+        return ''
+    return '{' + ','.join(f'{k}="{str(v).replace(chr(92), chr(92)*2).replace(chr(34), chr(92)+chr(34))}"' for k, v in labels) + '}'
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.values = {} # value per sorted label tuple
+        with lock:
+            registry[name] = self
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        for labels, value in list(self.values.items()):
+            lines.append(f'{self.name}{format_labels(labels)} {value}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + value # dict update is atomic enough for monotonic counters under gil
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, description: str, fn=None):
+        super().__init__(name, description)
+        self.fn = fn # optional callback evaluated at scrape time returning value or dict of labels to value
+
+    def set(self, value: float, **labels):
+        self.values[tuple(sorted(labels.items()))] = value
+
+    def render(self):
+        if self.fn is not None:
+            try:
+                res = self.fn()
+                if isinstance(res, dict):
+                    for labels, value in res.items():
+                        self.values[labels if isinstance(labels, tuple) else (('type', labels),)] = value
+                elif res is not None:
+                    self.values[()] = res
+            except Exception:
+                pass
+        return super().render()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, buckets: tuple = latency_buckets):
+        super().__init__(name, description)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with lock:
+            data = self.values.get(key, None)
+            if data is None:
+                data = self.values[key] = { 'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0 }
+            for i, bucket in enumerate(self.buckets):
+                if value <= bucket:
+                    data['counts'][i] += 1
+                    break
+            data['sum'] += value
+            data['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        with lock:
+            items = [(labels, list(data['counts']), data['sum'], data['count']) for labels, data in self.values.items()]
+        for labels, counts, total, count in items:
+            cumulative = 0
+            for bucket, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{format_labels(labels + (("le", bucket),))} {cumulative}')
+            lines.append(f'{self.name}_bucket{format_labels(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {count}')
+        return lines
+
+
+class Timed:
+    """context manager observing elapsed time into histogram"""
+    def __init__(self, histogram: Histogram, **labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.t0 = 0
+
+    def __enter__(self):
+        self.t0 = time.time()
+        return self
+
+    def __exit__(self, *args):
+        self.histogram.observe(time.time() - self.t0, **self.labels)
+
+
+def cache_access(cache: str, hit: bool):
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def render() -> str:
+    with lock:
+        metrics = list(registry.values())
+    lines = []
+    for metric in metrics:
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
+
+
+def get_queue():
+    from modules import progress
+    return { 'pending': len(progress.pending_tasks), 'active': 1 if progress.current_task is not None else 0 }
+
+
+def get_memory():
+    import os
+    import psutil
+    res = {}
+    process = psutil.Process(os.getpid())
+    res[(('type', 'ram'), ('kind', 'used'))] = process.memory_info().rss
+    try:
+        import torch
+        if torch.cuda.is_available():
+            free, total = torch.cuda.mem_get_info()
+            stats = torch.cuda.memory_stats()
+            res[(('type', 'gpu'), ('kind', 'used'))] = total - free
+            res[(('type', 'gpu'), ('kind', 'total'))] = total
+            res[(('type', 'gpu'), ('kind', 'allocated'))] = stats.get('allocated_bytes.all.current', 0)
+            res[(('type', 'gpu'), ('kind', 'reserved'))] = stats.get('reserved_bytes.all.current', 0)
+    except Exception:
+        pass
+    return res
+
+
+def get_oom():
+    try:
+        import torch
+        if torch.cuda.is_available():
+            stats = torch.cuda.memory_stats()
+            return { 'oom': stats.get('num_ooms', 0), 'retries': stats.get('num_alloc_retries', 0) }
+    except Exception:
+        pass
+    return None
+
+
+http_requests = Histogram('sdnext_http_request_duration_seconds', 'HTTP request latency per endpoint')
+jobs = Histogram('sdnext_job_duration_seconds', 'Processing job duration')
+images = Counter('sdnext_images_total', 'Generated images')
+steps = Counter('sdnext_steps_total', 'Sampling steps executed')
+throughput = Gauge('sdnext_throughput', 'Last job throughput as images and steps per second')
+model_loads = Histogram('sdnext_model_load_duration_seconds', 'Model load duration', buckets=(1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600))
+adapter_loads = Histogram('sdnext_adapter_load_duration_seconds', 'Adapter and image encoder load duration', buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120))
+adapter_resident = Gauge('sdnext_adapter_resident_bytes', 'Memory used by resident adapters and image encoders')
+preprocess_reuse = Counter('sdnext_preprocess_reuse_total', 'Preprocessing steps reused across batch iterations')
+preprocess_saved = Counter('sdnext_preprocess_saved_seconds_total', 'Estimated preprocessing time saved by reuse across batch iterations')
+cache_requests = Counter('sdnext_cache_requests_total', 'Cache requests by cache and result')
+queue = Gauge('sdnext_queue_depth', 'Queued and active tasks', fn=get_queue)
+memory = Gauge('sdnext_memory_bytes', 'Process memory usage', fn=get_memory)
+oom = Gauge('sdnext_gpu_oom_events', 'GPU out-of-memory events and allocation retries since allocator stats reset', fn=get_oom)
@@ -185,7 +185,7 @@ def set_clip(pipe):
 
 def refresh_te_list():
     te_dict.clear()
-    for file in files_cache.list_files(shared.opts.te_dir, ext_filter=['.safetensors', '.gguf']):
+    for file in files_cache.indexed_files(shared.opts.te_dir, ext_filter=['.safetensors', '.gguf']):
         basename = os.path.basename(file)
         name = os.path.splitext(basename)[0] if '.safetensors' in basename else basename
         te_dict[name] = file
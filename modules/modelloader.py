@@ -466,7 +466,7 @@ def load_models(model_path: str, model_url: str = None, command_path: str = None
     places = [x for x in list(set([model_path, command_path])) if x is not None] # noqa:C405
     output = []
     try:
-        output:list = [*files_cache.list_files(*places, ext_filter=ext_filter, ext_blacklist=ext_blacklist)]
+        output:list = [*files_cache.indexed_files(*places, ext_filter=ext_filter, ext_blacklist=ext_blacklist)]
         if model_url is not None and len(output) == 0:
             if download_name is not None:
                 dl = load_file_from_url(model_url, model_dir=places[0], progress=True, file_name=download_name)
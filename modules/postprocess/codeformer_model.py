@@ -71,43 +71,54 @@ def setup_model(dirname):
                 self.face_helper.face_det.to(device) # pylint: disable=no-member
                 self.face_helper.face_parse.to(device)
 
-            def restore(self, np_image, p=None, w=None): # pylint: disable=unused-argument
+            def restore_crops(self, cropped_faces, w=None): # run all face crops through the network in batches
                 from torchvision.transforms.functional import normalize
                 from basicsr.utils import img2tensor, tensor2img
-                np_image = np_image[:, :, ::-1]
-                original_resolution = np_image.shape[0:2]
-                self.create_models()
-                if self.net is None or self.face_helper is None:
-                    return np_image
-                self.send_model_to(devices.device)
-                self.face_helper.clean_all()
-                self.face_helper.read_image(np_image)
-                self.face_helper.get_face_landmarks_5(only_center_face=False, resize=640, eye_dist_threshold=5)
-                self.face_helper.align_warp_face()
-                for cropped_face in self.face_helper.cropped_faces:
-                    cropped_face_t = img2tensor(cropped_face / 255., bgr2rgb=True, float32=True)
-                    normalize(cropped_face_t, (0.5, 0.5, 0.5), (0.5, 0.5, 0.5), inplace=True)
-                    cropped_face_t = cropped_face_t.unsqueeze(0).to(devices.device)
+                restored_faces = []
+                batch_size = max(1, shared.opts.face_restoration_batch)
+                for i in range(0, len(cropped_faces), batch_size):
+                    cropped_faces_t = []
+                    for cropped_face in cropped_faces[i:i + batch_size]:
+                        cropped_face_t = img2tensor(cropped_face / 255., bgr2rgb=True, float32=True)
+                        normalize(cropped_face_t, (0.5, 0.5, 0.5), (0.5, 0.5, 0.5), inplace=True)
+                        cropped_faces_t.append(cropped_face_t)
+                    cropped_faces_t = torch.stack(cropped_faces_t).to(devices.device)
                     try:
                         with devices.inference_context():
-                            output = self.net(cropped_face_t, w=w if w is not None else shared.opts.code_former_weight, adain=True)[0] # pylint: disable=not-callable
-                            restored_face = tensor2img(output, rgb2bgr=True, min_max=(-1, 1))
+                            output = self.net(cropped_faces_t, w=w if w is not None else shared.opts.code_former_weight, adain=True)[0] # pylint: disable=not-callable
+                            restored_faces += [tensor2img(output[j], rgb2bgr=True, min_max=(-1, 1)).astype('uint8') for j in range(output.shape[0])]
                         del output
                         devices.torch_gc()
                     except Exception as e:
                         shared.log.error(f'CodeFormer error: {e}')
-                        restored_face = tensor2img(cropped_face_t, rgb2bgr=True, min_max=(-1, 1))
-                    restored_face = restored_face.astype('uint8')
-                    self.face_helper.add_restored_face(restored_face)
-                self.face_helper.get_inverse_affine(None)
-                restored_img = self.face_helper.paste_faces_to_input_image()
-                restored_img = restored_img[:, :, ::-1]
-                if original_resolution != restored_img.shape[0:2]:
-                    restored_img = cv2.resize(restored_img, (0, 0), fx=original_resolution[1]/restored_img.shape[1], fy=original_resolution[0]/restored_img.shape[0], interpolation=cv2.INTER_LINEAR)
-                self.face_helper.clean_all()
+                        restored_faces += [tensor2img(cropped_faces_t[j], rgb2bgr=True, min_max=(-1, 1)).astype('uint8') for j in range(cropped_faces_t.shape[0])]
+                return restored_faces
+
+            def restore_batch(self, np_images, p=None, w=None): # pylint: disable=unused-argument
+                from modules import face_restoration
+                self.create_models()
+                if self.net is None or self.face_helper is None:
+                    return np_images
+                self.send_model_to(devices.device)
+                np_images_bgr = [np_image[:, :, ::-1] for np_image in np_images]
+                states = face_restoration.detect_faces_batch(self.face_helper, np_images_bgr, resize=640)
+                cropped_faces = [face for state in states for face in state.get('cropped_faces', [])]
+                restored_faces = self.restore_crops(cropped_faces, w=w)
+                restored_imgs = face_restoration.paste_faces_batch(self.face_helper, states, restored_faces)
+                results = []
+                for np_image, restored_img in zip(np_images, restored_imgs):
+                    restored_img = restored_img[:, :, ::-1]
+                    original_resolution = np_image.shape[0:2]
+                    if original_resolution != restored_img.shape[0:2]:
+                        restored_img = cv2.resize(restored_img, (0, 0), fx=original_resolution[1]/restored_img.shape[1], fy=original_resolution[0]/restored_img.shape[0], interpolation=cv2.INTER_LINEAR)
+                    results.append(restored_img)
+                shared.log.debug(f'CodeFormer: images={len(np_images)} faces={len(cropped_faces)}')
                 if shared.opts.detailer_unload:
                     self.send_model_to(devices.cpu)
-                return restored_img
+                return results
+
+            def restore(self, np_image, p=None, w=None):
+                return self.restore_batch([np_image], p=p, w=w)[0]
 
         global have_codeformer # pylint: disable=global-statement
         have_codeformer = True
@@ -12,14 +12,15 @@ loaded_gfpgan_model = None
 
 
 def gfpgann():
-    import facexlib
-    import gfpgan # pylint: disable=unused-import
     global loaded_gfpgan_model # pylint: disable=global-statement
     if loaded_gfpgan_model is not None:
         loaded_gfpgan_model.gfpgan.to(devices.device)
         return loaded_gfpgan_model
+    if gfpgan_constructor is None: # install and setup are deferred until first use
+        setup_model(shared.opts.gfpgan_models_path)
     if gfpgan_constructor is None:
         return None
+    import facexlib
     models = modelloader.load_models(model_path, model_url, user_path, ext_filter="GFPGAN")
     if len(models) == 1 and "http" in models[0]:
         model_file = models[0]
@@ -43,29 +44,66 @@ def send_model_to(model, device):
     model.face_helper.face_parse.to(device)
 
 
-def gfpgan_fix_faces(np_image):
+def gfpgan_restore_crops(model, cropped_faces, weight=0.5): # run all face crops through the network in batches
+    import torch
+    from torchvision.transforms.functional import normalize
+    from basicsr.utils import img2tensor, tensor2img
+    restored_faces = []
+    batch_size = max(1, shared.opts.face_restoration_batch)
+    for i in range(0, len(cropped_faces), batch_size):
+        cropped_faces_t = []
+        for cropped_face in cropped_faces[i:i + batch_size]:
+            cropped_face_t = img2tensor(cropped_face / 255., bgr2rgb=True, float32=True)
+            normalize(cropped_face_t, (0.5, 0.5, 0.5), (0.5, 0.5, 0.5), inplace=True)
+            cropped_faces_t.append(cropped_face_t)
+        cropped_faces_t = torch.stack(cropped_faces_t).to(devices.device)
+        try:
+            with devices.inference_context():
+                output = model.gfpgan(cropped_faces_t, return_rgb=False, weight=weight)[0]
+                restored_faces += [tensor2img(output[j], rgb2bgr=True, min_max=(-1, 1)).astype('uint8') for j in range(output.shape[0])]
+            del output
+        except Exception as e:
+            shared.log.error(f'GFPGAN error: {e}')
+            restored_faces += [cropped_face.astype('uint8') for cropped_face in cropped_faces[i:i + batch_size]]
+    return restored_faces
+
+
+def gfpgan_fix_faces_batch(np_images):
+    from modules import face_restoration
     model = gfpgann()
     if model is None:
-        return np_image
+        return np_images
 
     send_model_to(model, devices.device)
 
-    np_image_bgr = np_image[:, :, ::-1]
-    _cropped_faces, _restored_faces, gfpgan_output_bgr = model.enhance(np_image_bgr, has_aligned=False, only_center_face=False, paste_back=True)
-    np_image = gfpgan_output_bgr[:, :, ::-1]
-
-    model.face_helper.clean_all()
+    np_images_bgr = [np_image[:, :, ::-1] for np_image in np_images]
+    states = face_restoration.detect_faces_batch(model.face_helper, np_images_bgr, resize=None)
+    cropped_faces = [face for state in states for face in state.get('cropped_faces', [])]
+    restored_faces = gfpgan_restore_crops(model, cropped_faces)
+    restored_imgs = face_restoration.paste_faces_batch(model.face_helper, states, restored_faces)
+    np_images = [restored_img[:, :, ::-1] for restored_img in restored_imgs]
+    shared.log.debug(f'GFPGAN: images={len(np_images)} faces={len(cropped_faces)}')
+    devices.torch_gc()
 
     if shared.opts.detailer_unload:
         send_model_to(model, devices.cpu)
 
-    return np_image
+    return np_images
+
+
+def gfpgan_fix_faces(np_image):
+    return gfpgan_fix_faces_batch([np_image])[0]
 
 
 gfpgan_constructor = None
 
 
 def setup_model(dirname):
+    global user_path # pylint: disable=global-statement
+    global have_gfpgan # pylint: disable=global-statement
+    global gfpgan_constructor # pylint: disable=global-statement
+    if gfpgan_constructor is not None: # already initialized
+        return
     try:
         if not os.path.exists(model_path):
             os.makedirs(model_path)
@@ -73,14 +111,12 @@ def setup_model(dirname):
         pass
     try:
         install('basicsr', quiet=True)
+        install('facexlib', quiet=True)
         install('gfpgan', quiet=True)
         import gfpgan
         import facexlib
         import modules.detailer
 
-        global user_path # pylint: disable=global-statement
-        global have_gfpgan # pylint: disable=global-statement
-        global gfpgan_constructor # pylint: disable=global-statement
         load_file_from_url_orig = gfpgan.utils.load_file_from_url
         facex_load_file_from_url_orig = facexlib.detection.load_file_from_url
         facex_load_file_from_url_orig2 = facexlib.parsing.load_file_from_url
@@ -108,6 +144,9 @@ def setup_model(dirname):
             def restore(self, np_image, p=None): # pylint: disable=unused-argument
                 return gfpgan_fix_faces(np_image)
 
+            def restore_batch(self, np_images, p=None): # pylint: disable=unused-argument
+                return gfpgan_fix_faces_batch(np_images)
+
         shared.face_restorers.append(FaceRestorerGFPGAN())
     except Exception as e:
         errors.log.error(f'GFPGan failed to initialize: {e}')
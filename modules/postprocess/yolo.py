@@ -76,10 +76,26 @@ class YoloRestorer(Detailer):
             mask: bool = True,
             offload: bool = shared.opts.detailer_unload,
         ) -> list[YoloResult]:
+        results = self.predict_batch(model, [image], imgsz=imgsz, half=half, device=device, augment=augment, agnostic=agnostic, retina=retina, mask=mask, offload=offload)
+        return results[0] if len(results) > 0 else []
 
-        result = []
-        if model is None:
-            return result
+    def predict_batch(
+            self,
+            model,
+            images: list[Image.Image],
+            imgsz: int = 640,
+            half: bool = True,
+            device = devices.device,
+            augment: bool = True,
+            agnostic: bool = False,
+            retina: bool = False,
+            mask: bool = True,
+            offload: bool = shared.opts.detailer_unload,
+        ) -> list[list[YoloResult]]:
+
+        results = [[] for _ in images]
+        if model is None or len(images) == 0:
+            return results
         args = {
             'conf': shared.opts.detailer_conf,
             'iou': shared.opts.detailer_iou,
@@ -90,7 +106,7 @@ class YoloRestorer(Detailer):
                 from ultralytics import YOLO # pylint: disable=import-outside-toplevel, unused-import
             model: YOLO = model.to(device)
             predictions = model.predict(
-                source=[image],
+                source=images,
                 stream=False,
                 verbose=False,
                 imgsz=imgsz,
@@ -105,13 +121,13 @@ class YoloRestorer(Detailer):
                 model.to('cpu')
         except Exception as e:
             shared.log.error(f'Detailer predict: {e}')
-            return result
+            return results
 
         desired = shared.opts.detailer_classes.split(',')
         desired = [d.lower().strip() for d in desired]
         desired = [d for d in desired if len(d) > 0]
 
-        for prediction in predictions:
+        for image, prediction, result in zip(images, predictions, results): # ultralytics returns one prediction per source image
             boxes = prediction.boxes.xyxy.detach().int().cpu().numpy() if prediction.boxes is not None else []
             scores = prediction.boxes.conf.detach().float().cpu().numpy() if prediction.boxes is not None else []
             classes = prediction.boxes.cls.detach().float().cpu().numpy() if prediction.boxes is not None else []
@@ -134,7 +150,7 @@ class YoloRestorer(Detailer):
                         result.append(YoloResult(cls=cls, label=label, score=round(score, 2), box=box, mask=mask_image, item=cropped, size=size, width=w, height=h, args=args))
                 if len(result) >= shared.opts.detailer_max:
                     break
-        return result
+        return results
 
     def load(self, model_name: str = None):
         from modules import modelloader
@@ -160,7 +176,25 @@ class YoloRestorer(Detailer):
                 shared.log.error(f'Load: type=Detailer name="{model_name}" error="{e}"')
         return None
 
-    def restore(self, np_image, p: processing.StableDiffusionProcessing = None):
+    def restore_batch(self, np_images, p: processing.StableDiffusionProcessing = None):
+        if hasattr(p, 'recursion') or len(np_images) == 0:
+            return np_images
+        if len(np_images) == 1 or len(shared.opts.detailer_models) == 0 or shared.opts.detailer_strength == 0:
+            return [self.restore(np_image, p) for np_image in np_images]
+        # run detection for all images in the batch in a single pass for first model only
+        # later models must detect on image already modified by previous model so they run per image inside restore
+        # inpaint runs remain per detected item as img2img processing supports a single mask and crop region per run
+        batch_images = [Image.fromarray(np_image) for np_image in np_images]
+        detections = [{} for _ in np_images]
+        loaded = self.load(shared.opts.detailer_models[0])
+        if loaded is not None:
+            name, model = loaded
+            for i, items in enumerate(self.predict_batch(model, batch_images)):
+                detections[i][name] = items
+        shared.log.debug(f'Detailer batch: images={len(np_images)} items={[sum(len(items) for items in d.values()) for d in detections]}')
+        return [self.restore(np_image, p, detections=detections[i]) for i, np_image in enumerate(np_images)]
+
+    def restore(self, np_image, p: processing.StableDiffusionProcessing = None, detections: dict = None):
         if hasattr(p, 'recursion'):
             return np_image
         if not hasattr(p, 'detailer_active'):
@@ -183,7 +217,10 @@ class YoloRestorer(Detailer):
                 continue
 
             image = Image.fromarray(np_image)
-            items = self.predict(model, image)
+            if detections is not None and name in detections:
+                items = detections[name] # precomputed by batch detection
+            else:
+                items = self.predict(model, image)
             if len(items) == 0:
                 shared.log.info(f'Detailer: model="{name}" no items detected')
                 continue
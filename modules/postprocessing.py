@@ -1,6 +1,9 @@
 import os
+import time
 import tempfile
 from typing import List
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from PIL import Image
 
@@ -8,6 +11,127 @@ from modules import shared, images, devices, scripts, scripts_postprocessing, in
 from modules.shared import opts
 
 
+def read_image(fn):
+    """open and fully decode image, runs on read-ahead worker thread"""
+    try:
+        image = Image.open(fn)
+        image.load()
+        return image
+    except Exception as e:
+        shared.log.error(f'Failed to open image: file="{fn}" {e}')
+        return None
+
+
+def read_ahead(files, workers: int, depth: int):
+    """yield decoded images in order while worker pool decodes next ones, at most depth images are in flight"""
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        remaining = iter(files)
+        pending = deque()
+        for fn in remaining:
+            pending.append((fn, executor.submit(read_image, fn)))
+            if len(pending) >= depth:
+                break
+        while len(pending) > 0:
+            fn, future = pending.popleft()
+            nxt = next(remaining, None)
+            if nxt is not None:
+                pending.append((nxt, executor.submit(read_image, nxt)))
+            yield fn, future.result()
+
+
+def existing_output(fn, outpath):
+    """output file of previous run for input file, only known when outputs use original names"""
+    if not opts.use_original_name_batch or opts.save_to_dirs:
+        return None
+    output = os.path.join(outpath, f'{os.path.splitext(os.path.basename(fn))[0]}.{opts.samples_format}')
+    return output if os.path.isfile(output) else None
+
+
+def process_info(pp, image):
+    info = ''
+    geninfo, items = images.read_info_from_image(image)
+    params = infotext.parse(geninfo)
+    for k, v in items.items():
+        pp.image.info[k] = v
+    if 'parameters' in items:
+        info = items['parameters'] + ', '
+    info = info + ", ".join([k if k == v else f'{k}: {infotext.quote(v)}' for k, v in pp.info.items() if v is not None])
+    pp.image.info["postprocessing"] = info
+    return info, params
+
+
+def save_processed(image, name, ext, info, outpath):
+    if opts.use_original_name_batch and name is not None:
+        forced_filename = os.path.splitext(os.path.basename(name))[0]
+        images.save_image(image, path=outpath, extension=ext or opts.samples_format, info=info, short_filename=True, no_prompt=True, grid=False, pnginfo_section_name="extras", existing_info=image.info, forced_filename=forced_filename)
+    else:
+        images.save_image(image, path=outpath, extension=ext or opts.samples_format, info=info, short_filename=True, no_prompt=True, grid=False, pnginfo_section_name="extras", existing_info=image.info)
+
+
+def run_postprocessing_folder(input_dir, outpath, show_extras_results, args, save_output: bool = True):
+    """
+    Streaming folder mode: images are read ahead on worker pool, processed in batches and saved as soon as batch is done
+    Processed images are only kept when results are shown or a postprocess script needs them so memory use is bounded
+    """
+    files = sorted([os.path.join(input_dir, f) for f in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, f))])
+    total = len(files)
+    if opts.postprocessing_batch_skip_existing and save_output:
+        files = [fn for fn in files if existing_output(fn, outpath) is None]
+    batch_size = max(1, opts.postprocessing_batch_size)
+    keep = show_extras_results or scripts.scripts_postproc.postprocess_enabled(args)
+    shared.log.info(f'Process: mode=folder input="{input_dir}" output="{outpath}" files={total} skip={total - len(files)} batch={batch_size} workers={opts.postprocessing_batch_workers}')
+    shared.state.job_count = len(files)
+    outputs, processed_images = [], []
+    info, params = '', {}
+    t0 = time.time()
+    done = 0
+    batch = []
+    pending = deque() # save futures, each holds full processed image until written
+    max_pending = max(2, batch_size)
+
+    def process_batch(batch, writer):
+        nonlocal info, params, done
+        pps = [scripts_postprocessing.PostprocessedImage(image.convert("RGB")) for _fn, image in batch]
+        scripts.scripts_postproc.run_batch(pps, args)
+        for (fn, image), pp in zip(batch, pps):
+            info, params = process_info(pp, image)
+            image.close()
+            if save_output:
+                future = writer.submit(save_processed, pp.image, fn, None, info, outpath)
+                future.add_done_callback(lambda f, fn=fn: shared.log.error(f'Process: file="{fn}" save {f.exception()}') if f.exception() is not None else None)
+                pending.append(future)
+                while len(pending) > max_pending: # wait for writer when saving is slower than processing so memory stays bounded
+                    pending.popleft().exception() # waits without raising, error is logged by callback
+            if keep:
+                processed_images.append(pp.image)
+            if show_extras_results:
+                outputs.append(pp.image)
+            done += 1
+            shared.state.job_no = done
+        elapsed = time.time() - t0
+        shared.log.debug(f'Process: mode=folder images={done}/{len(files)} its={done / elapsed if elapsed > 0 else 0:.2f}')
+
+    with ThreadPoolExecutor(max_workers=1) as writer: # single writer keeps output sequence numbering consistent
+        for fn, image in read_ahead(files, opts.postprocessing_batch_workers, depth=2 * batch_size):
+            if shared.state.interrupted:
+                shared.log.debug('Postprocess interrupted')
+                break
+            if image is None:
+                continue
+            shared.state.textinfo = fn
+            batch.append((fn, image))
+            if len(batch) >= batch_size:
+                process_batch(batch, writer)
+                batch = []
+        if len(batch) > 0 and not shared.state.interrupted:
+            process_batch(batch, writer)
+    if keep:
+        scripts.scripts_postproc.postprocess(processed_images, args)
+    elapsed = time.time() - t0
+    shared.log.info(f'Process: mode=folder images={done} time={elapsed:.2f} its={done / elapsed if elapsed > 0 else 0:.2f}')
+    return outputs, info, params
+
+
 def run_postprocessing(extras_mode, image, image_folder: List[tempfile.NamedTemporaryFile], input_dir, output_dir, show_extras_results, *args, save_output: bool = True):
     devices.torch_gc()
     shared.state.begin('Extras')
@@ -39,27 +163,15 @@ def run_postprocessing(extras_mode, image, image_folder: List[tempfile.NamedTemp
     elif extras_mode == 2:
         assert not shared.cmd_opts.hide_ui_dir_config, '--hide-ui-dir-config option must be disabled'
         assert input_dir, 'input directory not selected'
-        image_list = os.listdir(input_dir)
-        for filename in image_list:
-            fn = os.path.join(input_dir, filename)
-            try:
-                image = Image.open(fn)
-            except Exception as e:
-                shared.log.error(f'Failed to open image: file="{fn}" {e}')
-                continue
-            image_fullnames.append(fn)
-            image_data.append(image)
-            image_names.append(fn)
-            image_ext.append(None)
-        shared.log.debug(f'Process: mode=folder inputs={input_dir} files={len(image_list)} images={len(image_data)}')
+        outpath = output_dir if output_dir != '' else (opts.outdir_samples or opts.outdir_extras_samples)
+        outputs, info, params = run_postprocessing_folder(input_dir, outpath, show_extras_results, args, save_output=save_output)
+        devices.torch_gc()
+        return outputs, info, params
     else:
         image_data.append(image)
         image_names.append(None)
         image_ext.append(None)
-    if extras_mode == 2 and output_dir != '':
-        outpath = output_dir
-    else:
-        outpath = opts.outdir_samples or opts.outdir_extras_samples
+    outpath = opts.outdir_samples or opts.outdir_extras_samples
     processed_images = []
     for image, name, ext in zip(image_data, image_names, image_ext): # pylint: disable=redefined-argument-from-local
         shared.log.debug(f'Process: image={image} {args}')
@@ -72,23 +184,11 @@ def run_postprocessing(extras_mode, image, image_folder: List[tempfile.NamedTemp
         shared.state.textinfo = name
         pp = scripts_postprocessing.PostprocessedImage(image.convert("RGB"))
         scripts.scripts_postproc.run(pp, args)
-        geninfo, items = images.read_info_from_image(image)
-        params = infotext.parse(geninfo)
-        for k, v in items.items():
-            pp.image.info[k] = v
-        if 'parameters' in items:
-            info = items['parameters'] + ', '
-        info = info + ", ".join([k if k == v else f'{k}: {infotext.quote(v)}' for k, v in pp.info.items() if v is not None])
-        pp.image.info["postprocessing"] = info
+        info, params = process_info(pp, image)
         processed_images.append(pp.image)
         if save_output:
-            if opts.use_original_name_batch and name is not None:
-                forced_filename = os.path.splitext(os.path.basename(name))[0]
-                images.save_image(pp.image, path=outpath, extension=ext or opts.samples_format, info=info, short_filename=True, no_prompt=True, grid=False, pnginfo_section_name="extras", existing_info=pp.image.info, forced_filename=forced_filename)
-            else:
-                images.save_image(pp.image, path=outpath, extension=ext or opts.samples_format, info=info, short_filename=True, no_prompt=True, grid=False, pnginfo_section_name="extras", existing_info=pp.image.info)
-        if extras_mode != 2 or show_extras_results:
-            outputs.append(pp.image)
+            save_processed(pp.image, name, ext, info, outpath)
+        outputs.append(pp.image)
         image.close()
     scripts.scripts_postproc.postprocess(processed_images, args)
 
@@ -4,7 +4,7 @@ import time
 from contextlib import nullcontext
 import numpy as np
 from PIL import Image, ImageOps
-from modules import shared, devices, errors, images, scripts, memstats, lowvram, script_callbacks, extra_networks, detailer, sd_hijack_freeu, sd_models, sd_vae, processing_helpers, timer, face_restoration
+from modules import shared, devices, errors, images, scripts, memstats, lowvram, script_callbacks, extra_networks, detailer, sd_hijack_freeu, sd_models, sd_vae, processing_helpers, timer, face_restoration, metrics
 from modules.sd_hijack_hypertile import context_hypertile_vae, context_hypertile_unet
 from modules.processing_class import StableDiffusionProcessing, StableDiffusionProcessingTxt2Img, StableDiffusionProcessingImg2Img, StableDiffusionProcessingControl # pylint: disable=unused-import
 from modules.processing_info import create_infotext
@@ -134,6 +134,7 @@ def process_images(p: StableDiffusionProcessing) -> Processed:
     for k in p.override_settings.keys():
         stored_opts[k] = shared.opts.data.get(k, None) or shared.opts.data_labels[k].default
     processed = None
+    trace_id = timer.trace.begin(shared.state.job or 'process', size=shared.opts.trace_jobs, type=p.__class__.__name__, width=p.width, height=p.height, steps=p.steps, batch=p.batch_size, n_iter=p.n_iter)
     try:
         # if no checkpoint override or the override checkpoint can't be found, remove override entry and load opts checkpoint
         if p.override_settings.get('sd_model_checkpoint', None) is not None and sd_models.checkpoint_aliases.get(p.override_settings.get('sd_model_checkpoint')) is None:
@@ -203,22 +204,25 @@ def process_images(p: StableDiffusionProcessing) -> Processed:
                 processed = process_images_inner(p)
 
     finally:
-        pag.unapply()
-        if shared.opts.cuda_compile_backend == 'none':
-            sd_models.remove_token_merging(p.sd_model)
-
-        script_callbacks.after_process_callback(p)
-
-        if p.override_settings_restore_afterwards: # restore opts to original state
-            for k, v in stored_opts.items():
-                setattr(shared.opts, k, v)
-                if k == 'sd_model_checkpoint':
-                    sd_models.reload_model_weights()
-                if k == 'sd_model_refiner':
-                    sd_models.reload_model_weights()
-                if k == 'sd_vae':
-                    sd_vae.reload_vae_weights()
-        timer.process.record('post')
+        try:
+            pag.unapply()
+            if shared.opts.cuda_compile_backend == 'none':
+                sd_models.remove_token_merging(p.sd_model)
+
+            script_callbacks.after_process_callback(p)
+
+            if p.override_settings_restore_afterwards: # restore opts to original state
+                for k, v in stored_opts.items():
+                    setattr(shared.opts, k, v)
+                    if k == 'sd_model_checkpoint':
+                        sd_models.reload_model_weights()
+                    if k == 'sd_model_refiner':
+                        sd_models.reload_model_weights()
+                    if k == 'sd_vae':
+                        sd_vae.reload_vae_weights()
+            timer.process.record('post')
+        finally: # close trace even if cleanup fails so job is not left open
+            timer.trace.end(trace_id, images=len(processed.images) if processed is not None else 0)
     return processed
 
 
@@ -348,31 +352,37 @@ def process_images_inner(p: StableDiffusionProcessing) -> Processed:
                 p.scripts.postprocess_batch_list(p, batch_params, batch_number=n)
                 samples = batch_params.images
 
-            for i, sample in enumerate(samples):
-                debug(f'Processing result: index={i+1}/{len(samples)} iteration={n+1}/{p.n_iter}')
-                p.batch_index = i
-                if type(sample) == Image.Image:
-                    image = sample
-                    sample = np.array(sample)
-                else:
-                    sample = validate_sample(sample)
-                    image = Image.fromarray(sample)
-                if p.restore_faces:
-                    p.ops.append('restore')
-                    if not p.do_not_save_samples and shared.opts.save_images_before_detailer:
+            np_samples = [np.array(sample) if type(sample) == Image.Image else validate_sample(sample) for sample in samples]
+            if p.restore_faces and len(np_samples) > 0:
+                p.ops.append('restore')
+                if not p.do_not_save_samples and shared.opts.save_images_before_detailer:
+                    for i, sample in enumerate(np_samples):
+                        p.batch_index = i
                         info = create_infotext(p, p.prompts, p.seeds, p.subseeds, index=i)
                         images.save_image(Image.fromarray(sample), path=p.outpath_samples, basename="", seed=p.seeds[i], prompt=p.prompts[i], extension=shared.opts.samples_format, info=info, p=p, suffix="-before-restore")
-                    sample = face_restoration.restore_faces(sample, p)
-                    if sample is not None:
-                        image = Image.fromarray(sample)
-                if p.detailer:
-                    p.ops.append('detailer')
-                    if not p.do_not_save_samples and shared.opts.save_images_before_detailer:
+                with timer.trace.span('restore_faces', images=len(np_samples)):
+                    restored = face_restoration.restore_faces_batch(np_samples, p) # detect and restore faces for whole batch at once
+                np_samples = [r if r is not None else s for r, s in zip(restored, np_samples)]
+                timer.process.record('restore')
+            if p.detailer and len(np_samples) > 0:
+                p.ops.append('detailer')
+                if not p.do_not_save_samples and shared.opts.save_images_before_detailer:
+                    for i, sample in enumerate(np_samples):
+                        p.batch_index = i
                         info = create_infotext(p, p.prompts, p.seeds, p.subseeds, index=i)
                         images.save_image(Image.fromarray(sample), path=p.outpath_samples, basename="", seed=p.seeds[i], prompt=p.prompts[i], extension=shared.opts.samples_format, info=info, p=p, suffix="-before-detailer")
-                    sample = detailer.detail(sample, p)
-                    if sample is not None:
-                        image = Image.fromarray(sample)
+                with timer.trace.span('detailer', images=len(np_samples)):
+                    detailed = detailer.detail_batch(np_samples, p) # run detection for whole batch at once
+                np_samples = [d if d is not None else s for d, s in zip(detailed, np_samples)]
+                timer.process.record('detailer')
+
+            for i, sample in enumerate(np_samples):
+                debug(f'Processing result: index={i+1}/{len(np_samples)} iteration={n+1}/{p.n_iter}')
+                p.batch_index = i
+                if type(samples[i]) == Image.Image and not p.restore_faces and not p.detailer:
+                    image = samples[i]
+                else:
+                    image = Image.fromarray(sample)
                 if p.color_corrections is not None and i < len(p.color_corrections):
                     p.ops.append('color')
                     if not p.do_not_save_samples and shared.opts.save_images_before_color_correction:
@@ -398,6 +408,8 @@ def process_images_inner(p: StableDiffusionProcessing) -> Processed:
                     infotexts.append(info)
                 image.info["parameters"] = info
                 output_images.append(image)
+                if getattr(p, 'video', None) is not None:
+                    p.video.append(image)
                 if shared.opts.samples_save and not p.do_not_save_samples and p.outpath_samples is not None:
                     info = create_infotext(p, p.prompts, p.seeds, p.subseeds, index=i)
                     images.save_image(image, p.outpath_samples, "", p.seeds[i], p.prompts[i], shared.opts.samples_format, info=info, p=p) # main save image
@@ -473,5 +485,10 @@ def process_images_inner(p: StableDiffusionProcessing) -> Processed:
     if p.scripts is not None and isinstance(p.scripts, scripts.ScriptRunner) and not (shared.state.interrupted or shared.state.skipped):
         p.scripts.postprocess(p, processed)
     timer.process.record('post')
+    metrics.jobs.observe(t1 - t0, type=p.__class__.__name__)
+    metrics.images.inc(len(output_images))
+    metrics.steps.inc(p.steps * len(output_images))
+    metrics.throughput.set(len(output_images) / (t1 - t0), type='images')
+    metrics.throughput.set(p.steps * len(output_images) / (t1 - t0), type='steps')
     shared.log.info(f'Processed: images={len(output_images)} its={(p.steps * len(output_images)) / (t1 - t0):.2f} time={t1-t0:.2f} timers={timer.process.dct(min_time=0.02)} memory={memstats.memory_stats()}')
     return processed
@@ -6,19 +6,57 @@ import time
 import inspect
 import torch
 import numpy as np
-from modules import shared, errors, sd_models, processing, processing_vae, processing_helpers, sd_hijack_hypertile, prompt_parser_diffusers, timer
+import torchvision.transforms.functional as TF
+from modules import shared, devices, errors, sd_models, processing, processing_vae, processing_helpers, sd_hijack_hypertile, prompt_parser_diffusers, timer, sd_vae_cache
 from modules.processing_callbacks import diffusers_callback_legacy, diffusers_callback, set_callbacks_p
 from modules.processing_helpers import resize_hires, fix_prompts, calculate_base_steps, calculate_hires_steps, calculate_refiner_steps, get_generator, set_latents, apply_circular # pylint: disable=unused-import
 
 
 debug = shared.log.trace if os.environ.get('SD_DIFFUSERS_DEBUG', None) is not None else lambda *args, **kwargs: None
+shared_init_pipelines = ['StableDiffusionImg2ImgPipeline', 'StableDiffusionXLImg2ImgPipeline'] # accept pre-encoded latents as image
 
 
-def task_specific_kwargs(p, model):
+def shared_init_latents(p, model, generator=None):
+    """
+    Encode init images once per request and reuse latent distributions for all iterations so only noise is resampled
+    Latents are sampled from cached distributions with per-seed generators same as pipeline would so results remain reproducible
+    Returns scaled latents or none if pipeline should encode init images itself
+    """
+    from modules import metrics
+    if not shared.opts.img2img_shared_init or p.n_iter <= 1 or not p.full_quality or getattr(p, 'detailer', False) or model.__class__.__name__ not in shared_init_pipelines:
+        return None
+    if any(image.width % 8 != 0 or image.height % 8 != 0 for image in p.init_images): # pipeline would resize
+        return None
+    if isinstance(generator, list) and len(generator) != len(p.init_images):
+        return None
+    prepared = getattr(p, 'init_shared', None)
+    if prepared is not None and prepared['vae'] is model.vae and len(prepared['images']) == len(p.init_images) and all(a is b for a, b in zip(prepared['images'], p.init_images)):
+        metrics.preprocess_reuse.inc(op='encode')
+        metrics.preprocess_saved.inc(prepared['time'], op='encode')
+        debug(f'Init latents: reuse images={len(p.init_images)} saved={prepared["time"]:.2f}')
+    else:
+        t0 = time.time()
+        unique = {} # padded batches repeat same image so each one is encoded once
+        for image in p.init_images:
+            if id(image) not in unique:
+                tensor = TF.to_tensor(image).unsqueeze(0).to(devices.device, devices.dtype_vae) * 2 - 1
+                unique[id(image)] = processing_vae.full_vae_encode(image=tensor, model=model, sample=False)
+        t1 = time.time()
+        prepared = { 'images': list(p.init_images), 'vae': model.vae, 'dists': [unique[id(image)] for image in p.init_images], 'time': t1 - t0 }
+        p.init_shared = prepared
+        shared.log.debug(f'Init latents: images={len(p.init_images)} unique={len(unique)} time={t1-t0:.2f}')
+    if isinstance(generator, list):
+        latents = [dist.sample(generator=g) for dist, g in zip(prepared['dists'], generator)]
+    else:
+        latents = [dist.sample(generator=generator) for dist in prepared['dists']]
+    return torch.cat(latents, dim=0) * model.vae.config.scaling_factor
+
+
+def task_specific_kwargs(p, model, generator=None):
     task_args = {}
     is_img2img_model = bool('Zero123' in shared.sd_model.__class__.__name__)
     if len(getattr(p, 'init_images', [])) > 0:
-        p.init_images = [p.convert('RGB') for p in p.init_images]
+        p.init_images = [image if image.mode == 'RGB' else image.convert('RGB') for image in p.init_images] # keep identity so preprocessing can be reused between iterations
     if sd_models.get_diffusers_task(model) == sd_models.DiffusersTaskType.TEXT_2_IMAGE or len(getattr(p, 'init_images', [])) == 0 and not is_img2img_model:
         p.ops.append('txt2img')
         if hasattr(p, 'width') and hasattr(p, 'height'):
@@ -34,6 +72,9 @@ def task_specific_kwargs(p, model):
             'image': p.init_images,
             'strength': p.denoising_strength,
         }
+        init_latents = shared_init_latents(p, model, generator)
+        if init_latents is not None:
+            task_args['image'] = init_latents
         if model.__class__.__name__ == 'FluxImg2ImgPipeline': # needs explicit width/height
             p.width = 8 * math.ceil(p.init_images[0].width / 8)
             p.height = 8 * math.ceil(p.init_images[0].height / 8)
@@ -106,6 +147,9 @@ def set_pipeline_args(p, model, prompts: list, negative_prompts: list, prompts_2
     possible = list(signature.parameters)
     debug(f'Diffusers pipeline possible: {possible}')
     prompts, negative_prompts, prompts_2, negative_prompts_2 = fix_prompts(prompts, negative_prompts, prompts_2, negative_prompts_2)
+    sd_vae_cache.hook(model) # cache vae encodes of init images done inside pipeline
+    if getattr(shared.sd_model, 'embedding_db', None) is not None: # insert on-demand embeddings used by prompts
+        shared.sd_model.embedding_db.activate(prompts + negative_prompts + (prompts_2 or []) + (negative_prompts_2 or []))
     parser = 'Fixed attention'
     steps = kwargs.get("num_inference_steps", None) or len(getattr(p, 'timesteps', ['1']))
     clip_skip = kwargs.pop("clip_skip", 1)
@@ -235,7 +279,7 @@ def set_pipeline_args(p, model, prompts: list, negative_prompts: list, prompts_2
         else:
             pass
 
-    task_kwargs = task_specific_kwargs(p, model)
+    task_kwargs = task_specific_kwargs(p, model, args.get('generator', None))
     for arg in task_kwargs:
         # if arg in possible and arg not in args: # task specific args should not override args
         if arg in possible:
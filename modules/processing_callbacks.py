@@ -7,12 +7,14 @@ from modules import shared, processing_correction, extra_networks, timer
 
 
 p = None
+t_step = None
 debug_callback = shared.log.trace if os.environ.get('SD_CALLBACK_DEBUG', None) is not None else lambda *args, **kwargs: None
 
 
 def set_callbacks_p(processing):
-    global p # pylint: disable=global-statement
+    global p, t_step # pylint: disable=global-statement
     p = processing
+    t_step = time.time()
 
 
 def diffusers_callback_legacy(step: int, timestep: int, latents: typing.Union[torch.FloatTensor, np.ndarray]):
@@ -34,6 +36,7 @@ def diffusers_callback_legacy(step: int, timestep: int, latents: typing.Union[to
 
 
 def diffusers_callback(pipe, step: int, timestep: int, kwargs: dict):
+    global t_step # pylint: disable=global-statement
     t0 = time.time()
     if p is None:
         return kwargs
@@ -100,6 +103,9 @@ def diffusers_callback(pipe, step: int, timestep: int, kwargs: dict):
     if shared.cmd_opts.profile and shared.profiler is not None:
         shared.profiler.step()
     t1 = time.time()
+    if t_step is not None:
+        timer.trace.add('step', t_step, t1, step=step, timestep=int(timestep) if timestep is not None else None) # denoise step including callback
+    t_step = t1
     if 'callback' not in timer.process.records:
         timer.process.records['callback'] = 0
     timer.process.records['callback'] += t1 - t0
@@ -159,6 +159,7 @@ class StableDiffusionProcessing:
         self.refiner_prompt = ''
         self.refiner_negative = ''
         self.ops = []
+        self.video = None # optional streaming video sink which receives each output image as soon as it is produced
         self.resize_mode: int = resize_mode
         self.resize_name: str = resize_name
         self.resize_context: str = resize_context
@@ -371,6 +372,7 @@ class StableDiffusionProcessingImg2Img(StableDiffusionProcessing):
         self.hr_denoising_strength: float = denoising_strength
         self.image_cfg_scale: float = image_cfg_scale
         self.init_latent = None
+        self.init_shared = None # init latents encoded once and reused by all iterations
         self.image_mask = mask
         self.latent_mask = None
         self.mask_for_overlay = None
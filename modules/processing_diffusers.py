@@ -4,7 +4,7 @@ import time
 import numpy as np
 import torch
 import torchvision.transforms.functional as TF
-from modules import shared, devices, processing, sd_models, errors, sd_hijack_hypertile, processing_vae, sd_models_compile, hidiffusion, timer, modelstats
+from modules import shared, devices, processing, sd_models, errors, sd_hijack_hypertile, processing_vae, sd_models_compile, sd_models_compile_cache, hidiffusion, timer, modelstats
 from modules.processing_helpers import resize_hires, calculate_base_steps, calculate_hires_steps, calculate_refiner_steps, save_intermediate, update_sampler, is_txt2img, is_refiner_enabled
 from modules.processing_args import set_pipeline_args
 from modules.onnx_impl import preprocess_pipeline as preprocess_onnx_pipeline, check_parameters_changed as olive_check_parameters_changed
@@ -50,6 +50,7 @@ def restore_state(p: processing.StableDiffusionProcessing):
     return p
 
 
+@timer.trace.traced()
 def process_base(p: processing.StableDiffusionProcessing):
     use_refiner_start = is_txt2img() and is_refiner_enabled(p) and not p.is_hr_pass and p.refiner_start > 0 and p.refiner_start < 1
     use_denoise_start = not is_txt2img() and p.refiner_start > 0 and p.refiner_start < 1
@@ -145,6 +146,7 @@ def process_base(p: processing.StableDiffusionProcessing):
     return output
 
 
+@timer.trace.traced()
 def process_hires(p: processing.StableDiffusionProcessing, output):
     # optional second pass
     if p.enable_hr:
@@ -247,6 +249,7 @@ def process_hires(p: processing.StableDiffusionProcessing, output):
     return output
 
 
+@timer.trace.traced()
 def process_refine(p: processing.StableDiffusionProcessing, output):
     # optional refiner pass or decode
     if is_refiner_enabled(p):
@@ -340,6 +343,7 @@ def process_refine(p: processing.StableDiffusionProcessing, output):
     return output
 
 
+@timer.trace.traced()
 def process_decode(p: processing.StableDiffusionProcessing, output):
     if output is not None:
         if not hasattr(output, 'images') and hasattr(output, 'frames'):
@@ -386,6 +390,7 @@ def update_pipeline(sd_model, p: processing.StableDiffusionProcessing):
     return sd_model
 
 
+@timer.trace.traced()
 def process_diffusers(p: processing.StableDiffusionProcessing):
     debug(f'Process diffusers args: {vars(p)}')
     results = []
@@ -444,6 +449,7 @@ def process_diffusers(p: processing.StableDiffusionProcessing):
             shared.sd_model = orig_pipeline
             return results
 
+    sd_models_compile_cache.save(p.width, p.height, p.batch_size) # persist graphs compiled by base, hires and refine passes of new shape
     results = process_decode(p, output)
 
     timer.process.record('decode')
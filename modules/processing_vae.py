@@ -3,7 +3,7 @@ import time
 import numpy as np
 import torch
 import torchvision.transforms.functional as TF
-from modules import shared, devices, sd_models, sd_vae, sd_vae_taesd, errors
+from modules import shared, devices, sd_models, sd_vae, sd_vae_taesd, sd_vae_cache, sd_vae_plan, errors, timer
 
 
 debug = os.environ.get('SD_VAE_DEBUG', None) is not None
@@ -84,7 +84,7 @@ def full_vae_decode(latents, model):
 
     log_debug(f'VAE config: {model.vae.config}')
     try:
-        decoded = model.vae.decode(latents, return_dict=False)[0]
+        decoded = sd_vae_plan.decode(model.vae, latents) # batch split and tiling planned against free memory with oom retry
     except Exception as e:
         shared.log.error(f'VAE decode: {stats} {e}')
         errors.display(e, 'VAE decode')
@@ -112,18 +112,25 @@ def full_vae_decode(latents, model):
     return decoded
 
 
-def full_vae_encode(image, model):
+def full_vae_encode(image, model, sample=True): # returns latent distribution instead of sample if sample is false
     log_debug(f'VAE encode: name={sd_vae.loaded_vae_file if sd_vae.loaded_vae_file is not None else "baked"} dtype={model.vae.dtype} upcast={model.vae.config.get("force_upcast", None)}')
+    sd_vae_cache.hook(model)
+    cached = sd_vae_cache.lookup(model.vae, image, sd_vae_cache.vae_identity(model))
+    if cached is not None: # skip encode and unet/vae device moves
+        return cached.sample() if sample else cached
     if shared.opts.diffusers_move_unet and not getattr(model, 'has_accelerate', False) and hasattr(model, 'unet'):
         log_debug('Moving to CPU: model=UNet')
         unet_device = model.unet.device
         sd_models.move_model(model.unet, devices.cpu)
     if not shared.opts.diffusers_offload_mode == "sequential" and hasattr(model, 'vae'):
         sd_models.move_model(model.vae, devices.device)
-    encoded = model.vae.encode(image.to(model.vae.device, model.vae.dtype)).latent_dist.sample()
+    try:
+        encoded = sd_vae_plan.encode(model.vae, image.to(model.vae.device, model.vae.dtype))
+    finally:
+        sd_vae_cache.local.key = None # key from lookup is only valid for this input
     if shared.opts.diffusers_move_unet and not getattr(model, 'has_accelerate', False) and hasattr(model, 'unet'):
         sd_models.move_model(model.unet, unet_device)
-    return encoded
+    return encoded.sample() if sample else encoded
 
 
 def taesd_vae_decode(latents):
@@ -145,6 +152,7 @@ def taesd_vae_encode(image):
     return encoded
 
 
+@timer.trace.traced()
 def vae_decode(latents, model, output_type='np', full_quality=True, width=None, height=None):
     t0 = time.time()
     if latents is None or not torch.is_tensor(latents): # already decoded
@@ -1,6 +1,7 @@
 import base64
 import io
 import time
+import threading
 from pydantic import BaseModel, Field # pylint: disable=no-name-in-module
 import modules.shared as shared
 
@@ -78,14 +79,112 @@ def progressapi(req: ProgressRequest):
     live_preview = None
     shared.state.set_current_image()
     if shared.opts.live_previews_enable and (shared.state.id_live_preview != req.id_live_preview) and (shared.state.current_image is not None):
-        buffered = io.BytesIO()
-        shared.state.current_image.save(buffered, format='jpeg')
-        live_preview = f'data:image/jpeg;base64,{base64.b64encode(buffered.getvalue()).decode("ascii")}'
+        encoded = preview.encoded('jpeg')
+        live_preview = f'data:image/jpeg;base64,{encoded}' if encoded is not None else None
         id_live_preview = shared.state.id_live_preview
 
     res = InternalProgressResponse(job=shared.state.job, active=active, queued=queued, paused=paused, completed=completed, progress=progress, eta=eta, live_preview=live_preview, id_live_preview=id_live_preview, textinfo=shared.state.textinfo)
     return res
 
 
+def get_progress():
+    """
+    Progress snapshot shared by polling and streaming endpoints
+    """
+    if shared.state.job_count == 0:
+        return { 'job': shared.state.job, 'progress': 0, 'eta': 0, 'paused': shared.state.paused, 'queued': len(pending_tasks), 'task': current_task, 'state': shared.state.dict(), 'textinfo': shared.state.textinfo }
+    batch_x = max(shared.state.job_no, 0)
+    batch_y = max(shared.state.job_count, 1)
+    step_x = max(shared.state.sampling_step, 0)
+    step_y = max(shared.state.sampling_steps, 1)
+    current = step_y * batch_x + step_x
+    total = step_y * batch_y
+    progress = min(1, current / total) if current > 0 and total > 0 else 0
+    elapsed = time.time() - shared.state.time_start if shared.state.time_start is not None else 0
+    eta = (elapsed / progress) - elapsed if progress > 0 else 0
+    return { 'job': shared.state.job, 'progress': progress, 'eta': eta, 'paused': shared.state.paused, 'queued': len(pending_tasks), 'task': current_task, 'state': shared.state.dict(), 'textinfo': shared.state.textinfo }
+
+
+class PreviewWorker:
+    """
+    Single live preview decoder shared by all progress consumers
+    Decodes current latent at most once per n steps, caches encoded preview per format and pushes snapshots to subscribers from a background thread
+    """
+    def __init__(self):
+        self.lock = threading.Lock() # guards decode and encode cache
+        self.subscribers = {} # callback per subscriber id, called from worker thread
+        self.thread = None
+        self.cache = {} # encoded preview per format for current id_live_preview
+        self.cache_id = -1
+        self.snapshot = None
+
+    def refresh(self, steps: int = None):
+        """decode current latent if enough sampling steps have passed since last decode"""
+        steps = steps if steps is not None else shared.opts.show_progress_every_n_steps
+        if steps <= 0 or shared.state.current_latent is None or shared.state.job_count == 0:
+            return
+        with self.lock:
+            if shared.state.current_image is None or abs(shared.state.sampling_step - shared.state.current_image_sampling_step) >= steps:
+                shared.state.do_set_current_image()
+
+    def encoded(self, fmt: str = 'jpeg'):
+        """base64 encoded current preview, encoded once per preview regardless of number of consumers"""
+        image = shared.state.current_image
+        if image is None:
+            return None
+        with self.lock:
+            if self.cache_id != shared.state.id_live_preview:
+                self.cache.clear()
+                self.cache_id = shared.state.id_live_preview
+            if fmt not in self.cache:
+                buffered = io.BytesIO()
+                image = image.convert('RGB') if fmt == 'jpeg' and image.mode != 'RGB' else image
+                image.save(buffered, format=fmt)
+                self.cache[fmt] = base64.b64encode(buffered.getvalue()).decode('ascii')
+            return self.cache[fmt]
+
+    def subscribe(self, fn):
+        """register callback receiving progress snapshots, returns subscriber id used to unsubscribe"""
+        with self.lock:
+            sid = id(fn)
+            self.subscribers[sid] = fn
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='preview-worker', daemon=True)
+                self.thread.start()
+        if self.snapshot is not None:
+            fn(self.snapshot)
+        return sid
+
+    def unsubscribe(self, sid):
+        with self.lock:
+            self.subscribers.pop(sid, None)
+
+    def run(self):
+        while True:
+            with self.lock:
+                if len(self.subscribers) == 0:
+                    self.thread = None
+                    return
+                subscribers = list(self.subscribers.values())
+            try:
+                if shared.opts.live_previews_enable:
+                    self.refresh()
+                snapshot = get_progress()
+                snapshot['id_live_preview'] = shared.state.id_live_preview
+                snapshot['preview'] = self.encoded('jpeg') if shared.opts.live_previews_enable and shared.state.job_count != 0 else None
+                if snapshot != self.snapshot:
+                    changed = self.snapshot is None or snapshot['id_live_preview'] != self.snapshot['id_live_preview']
+                    self.snapshot = snapshot # full snapshot is sent to new subscribers
+                    update = snapshot if changed else { **snapshot, 'preview': None } # unchanged preview is not resent
+                    for fn in subscribers:
+                        fn(update)
+            except Exception as e:
+                shared.log.error(f'Preview worker: {e}')
+            time.sleep(max(shared.opts.live_preview_refresh_period, 100) / 1000)
+
+
+preview = PreviewWorker()
+
+
 def setup_progress_api(app):
     return app.add_api_route("/internal/progress", progressapi, methods=["POST"], response_model=InternalProgressResponse)
@@ -5,15 +5,13 @@ import typing
 import torch
 from compel.embeddings_provider import BaseTextualInversionManager, EmbeddingsProvider
 from transformers import PreTrainedTokenizer
-from modules import shared, prompt_parser, devices, sd_models
+from modules import shared, prompt_parser, devices, sd_models, timer, metrics
 from modules.prompt_parser_xhinker import get_weighted_text_embeddings_sd15, get_weighted_text_embeddings_sdxl_2p, get_weighted_text_embeddings_sd3, get_weighted_text_embeddings_flux1
 
 debug_enabled = os.environ.get('SD_PROMPT_DEBUG', None)
 debug = shared.log.trace if os.environ.get('SD_PROMPT_DEBUG', None) is not None else lambda *args, **kwargs: None
 debug('Trace: PROMPT')
 orig_encode_token_ids_to_embeddings = EmbeddingsProvider._encode_token_ids_to_embeddings # pylint: disable=protected-access
-token_dict = None # used by helper get_tokens
-token_type = None # used by helper get_tokens
 cache = {}
 
 
@@ -127,36 +125,14 @@ def get_prompt_schedule(prompt, steps):
 
 
 def get_tokens(msg, prompt):
-    global token_dict, token_type # pylint: disable=global-statement
     if not shared.native:
         return
-    if shared.sd_loaded and hasattr(shared.sd_model, 'tokenizer') and shared.sd_model.tokenizer is not None:
-        if token_dict is None or token_type != shared.sd_model_type:
-            token_type = shared.sd_model_type
-            fn = shared.sd_model.tokenizer.name_or_path
-            if fn.endswith('tokenizer'):
-                fn = os.path.join(shared.sd_model.tokenizer.name_or_path, 'vocab.json')
-            else:
-                fn = os.path.join(shared.sd_model.tokenizer.name_or_path, 'tokenizer', 'vocab.json')
-            token_dict = shared.readfile(fn, silent=True)
-            for k, v in shared.sd_model.tokenizer.added_tokens_decoder.items():
-                token_dict[str(v)] = k
-            shared.log.debug(f'Tokenizer: words={len(token_dict)} file="{fn}"')
-        has_bos_token = shared.sd_model.tokenizer.bos_token_id is not None
-        has_eos_token = shared.sd_model.tokenizer.eos_token_id is not None
-        ids = shared.sd_model.tokenizer(prompt)
-        ids = getattr(ids, 'input_ids', [])
-        tokens = []
-        for i in ids:
-            try:
-                key = list(token_dict.keys())[list(token_dict.values()).index(i)]
-                tokens.append(key)
-            except Exception:
-                tokens.append(f'UNK_{i}')
-        token_count = len(ids) - int(has_bos_token) - int(has_eos_token)
-        debug(f'Prompt tokenizer: type={msg} tokens={token_count} {tokens}')
+    from modules import prompt_tokens
+    for name, res in prompt_tokens.get_tokens([prompt], tokens=True)[0].items():
+        debug(f'Prompt tokenizer: type={msg} tokenizer={name} tokens={res["count"]} {res["tokens"]}')
 
 
+@timer.trace.traced()
 def encode_prompts(pipe, p, prompts: list, negative_prompts: list, steps: int, clip_skip: typing.Optional[int] = None):
     params_match = prompts == cache.get('prompts', None) and negative_prompts == cache.get('negative_prompts', None) and clip_skip == cache.get('clip_skip', None) and steps == cache.get('steps', None)
     if (
@@ -167,7 +143,9 @@ def encode_prompts(pipe, p, prompts: list, negative_prompts: list, steps: int, c
     ):
         shared.log.warning(f"Prompt parser not supported: {pipe.__class__.__name__}")
         return
-    elif shared.opts.sd_textencoder_cache and cache.get('model_type', None) == shared.sd_model_type and params_match:
+    if shared.opts.sd_textencoder_cache:
+        metrics.cache_access('textencoder', cache.get('model_type', None) == shared.sd_model_type and params_match)
+    if shared.opts.sd_textencoder_cache and cache.get('model_type', None) == shared.sd_model_type and params_match:
         p.prompt_embeds = cache.get('prompt_embeds', None)
         p.positive_pooleds = cache.get('positive_pooleds', None)
         p.negative_embeds = cache.get('negative_embeds', None)
@@ -0,0 +1,103 @@
+import os
+import math
+import weakref
+import threading
+from collections import OrderedDict
+from modules import shared
+
+
+debug = shared.log.trace if os.environ.get('SD_PROMPT_DEBUG', None) is not None else lambda *args, **kwargs: None
+tokenizer_names = ['tokenizer', 'tokenizer_2', 'tokenizer_3']
+vocabs = weakref.WeakKeyDictionary() # inverse vocab per loaded tokenizer, released with tokenizer
+cache = OrderedDict() # tokenization results per prompt
+cache_size = 1024
+lock = threading.Lock()
+
+
+def tokenizer_key(tokenizer):
+    """cheap identity of tokenizer vocabulary, len(tokenizer) is avoided as slow tokenizers rebuild full vocab to compute it"""
+    added = getattr(tokenizer, '_added_tokens_encoder', None) # grows when embeddings are added
+    return (id(tokenizer), len(added) if added is not None else 0, getattr(tokenizer, 'vocab_version', 0)) # version changes when token ids are reused
+
+
+def get_tokenizers(model=None):
+    model = model or (shared.sd_model if shared.sd_loaded else None)
+    if model is None:
+        return {}
+    if hasattr(model, 'pipe'):
+        model = model.pipe
+    tokenizers = {}
+    for name in tokenizer_names:
+        tokenizer = getattr(model, name, None)
+        if tokenizer is not None and hasattr(tokenizer, 'get_vocab'):
+            tokenizers[name] = tokenizer
+    return tokenizers
+
+
+def get_vocab(tokenizer) -> list:
+    """
+    Inverse vocabulary as list indexed by token id so id to token lookup is O(1), built once per tokenizer
+    """
+    key = tokenizer_key(tokenizer)
+    with lock:
+        entry = vocabs.get(tokenizer, None)
+        vocab = entry[1] if entry is not None and entry[0] == key else None # stale entry from before embeddings were added is replaced
+        if vocab is None:
+            items = tokenizer.get_vocab() # includes added tokens
+            vocab = [None] * (max(items.values()) + 1 if len(items) > 0 else 0)
+            for token, i in items.items():
+                vocab[i] = token
+            vocabs[tokenizer] = (key, vocab)
+            debug(f'Tokenizer vocab: type={tokenizer.__class__.__name__} words={len(vocab)}')
+    return vocab
+
+
+def get_limits(tokenizer):
+    has_bos_token = tokenizer.bos_token_id is not None
+    has_eos_token = tokenizer.eos_token_id is not None
+    max_length = tokenizer.model_max_length - int(has_bos_token) - int(has_eos_token)
+    if max_length is None or max_length < 0 or max_length > 10000:
+        max_length = 0
+    return has_bos_token, has_eos_token, max_length
+
+
+def tokenize(prompt: str, tokenizer, tokens: bool = False) -> dict:
+    """
+    Tokenize single prompt and return token count, model limit and number of chunks prompt would be split into
+    """
+    key = (tokenizer_key(tokenizer), prompt, tokens)
+    with lock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+    has_bos_token, has_eos_token, max_length = get_limits(tokenizer)
+    ids = tokenizer(prompt)
+    ids = getattr(ids, 'input_ids', [])
+    count = len(ids) - int(has_bos_token) - int(has_eos_token)
+    res = {
+        'count': count,
+        'max_length': max_length,
+        'chunks': max(1, math.ceil(count / max_length)) if max_length > 0 else 1,
+    }
+    if tokens:
+        vocab = get_vocab(tokenizer)
+        res['tokens'] = [vocab[i] if i < len(vocab) and vocab[i] is not None else f'UNK_{i}' for i in ids]
+    with lock:
+        cache[key] = res
+        while len(cache) > cache_size:
+            cache.popitem(last=False)
+    return res
+
+
+def get_tokens(prompts: list, model=None, tokens: bool = False) -> list:
+    """
+    Tokenize list of prompts with all tokenizers of the model, returns one dict per prompt keyed by tokenizer name
+    """
+    tokenizers = get_tokenizers(model)
+    return [{name: tokenize(prompt, tokenizer, tokens=tokens) for name, tokenizer in tokenizers.items()} for prompt in prompts]
+
+
+def clear():
+    with lock:
+        vocabs.clear()
+        cache.clear()
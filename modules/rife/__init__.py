@@ -1,9 +1,7 @@
 #!/bin/env python
 
-import _thread
 import os
 import time
-from queue import Queue
 import cv2
 import numpy as np
 import torch
@@ -32,86 +30,114 @@ def load(model_path: str = 'rife/flownet-v46.pkl'):
         model.device()
 
 
-def interpolate(images: list, count: int = 2, scale: float = 1.0, pad: int = 1, change: float = 0.3):
-    if images is None or len(images) < 2:
-        return []
-    if model is None:
-        load()
-    interpolated = []
-    h = images[0].height
-    w = images[0].width
-    t0 = time.time()
+class Interpolator:
+    """
+    Sliding window interpolator: frames are pushed one at a time and interpolated frames are returned as soon as they are available
+    Only previous frame is kept on device so memory use does not depend on number of frames
+    """
+    def __init__(self, count: int = 2, scale: float = 1.0, pad: int = 1, change: float = 0.3):
+        if model is None:
+            load()
+        self.count = count
+        self.scale = scale
+        self.pad = pad
+        self.change = change
+        self.h, self.w = None, None
+        self.padding = None
+        self.I1 = None
+        self.frame = None
+        self.frames = 0
+        self.inputs = 0 # pushed frames
+        self.changes = 0 # transitions above change threshold which are filled instead of interpolated
+        self.duplicates = 0 # transitions skipped as duplicate frames
 
-    def write(buffer):
-        item = buffer.get()
-        while item is not None:
-            img = item[:, :, ::-1]
-            # image = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-            image = Image.fromarray(img)
-            item = buffer.get()
-            interpolated.append(image)
-
-    def execute(I0, I1, n):
+    def execute(self, I0, I1, n):
         if model.version >= 3.9:
             res = []
             for i in range(n):
-                res.append(model.inference(I0, I1, (i+1) * 1. / (n+1), scale))
+                res.append(model.inference(I0, I1, (i+1) * 1. / (n+1), self.scale))
             return res
         else:
-            middle = model.inference(I0, I1, scale)
+            middle = model.inference(I0, I1, self.scale)
             if n == 1:
                 return [middle]
-            first_half = execute(I0, middle, n=n//2)
-            second_half = execute(middle, I1, n=n//2)
+            first_half = self.execute(I0, middle, n=n//2)
+            second_half = self.execute(middle, I1, n=n//2)
             if n % 2:
                 return [*first_half, middle, *second_half]
             else:
                 return [*first_half, *second_half]
 
-    def f_pad(img):
-        return F.pad(img, padding).to(devices.dtype) # pylint: disable=not-callable
+    def to_tensor(self, frame):
+        tensor = torch.from_numpy(np.transpose(frame, (2,0,1))).to(devices.device, non_blocking=True).unsqueeze(0).float() / 255.
+        return F.pad(tensor, self.padding).to(devices.dtype) # pylint: disable=not-callable
 
-    tmp = max(128, int(128 / scale))
-    ph = ((h - 1) // tmp + 1) * tmp
-    pw = ((w - 1) // tmp + 1) * tmp
-    padding = (0, pw - w, 0, ph - h)
-    buffer = Queue(maxsize=8192)
-    _thread.start_new_thread(write, (buffer,))
+    def to_image(self, frame):
+        self.frames += 1
+        return Image.fromarray(np.ascontiguousarray(frame[:, :, ::-1]))
 
-    frame = cv2.cvtColor(np.array(images[0]), cv2.COLOR_RGB2BGR)
-    for _i in range(pad): # fill starting frames
-        buffer.put(frame)
+    def push(self, image: Image.Image):
+        frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+        output = []
+        self.inputs += 1
+        if self.I1 is None: # first frame sets size and fills starting frames
+            self.h, self.w = image.height, image.width
+            tmp = max(128, int(128 / self.scale))
+            ph = ((self.h - 1) // tmp + 1) * tmp
+            pw = ((self.w - 1) // tmp + 1) * tmp
+            self.padding = (0, pw - self.w, 0, ph - self.h)
+            output += [frame] * self.pad
+            self.I1 = self.to_tensor(frame)
+        self.frame = frame
+        with torch.no_grad():
+            I0 = self.I1
+            self.I1 = self.to_tensor(frame)
+            I0_small = F.interpolate(I0, (32, 32), mode='bilinear', align_corners=False).to(torch.float32)
+            I1_small = F.interpolate(self.I1, (32, 32), mode='bilinear', align_corners=False).to(torch.float32)
+            ssim = ssim_matlab(I0_small[:, :3], I1_small[:, :3])
+            if ssim > 0.99: # skip duplicate frames
+                if self.inputs > 1:
+                    self.duplicates += 1
+                return [self.to_image(f) for f in output]
+            if ssim < self.change:
+                self.changes += 1
+                mids = [I0] * self.pad + [self.I1] * self.pad # fill frames if change rate is above threshold
+            else:
+                mids = self.execute(I0, self.I1, self.count - 1)
+            for mid in mids:
+                mid = (((mid[0] * 255.).byte().cpu().numpy().transpose(1, 2, 0)))
+                output.append(mid[:self.h, :self.w])
+        output.append(frame)
+        return [self.to_image(f) for f in output]
 
-    I1 = f_pad(torch.from_numpy(np.transpose(frame, (2,0,1))).to(devices.device, non_blocking=True).unsqueeze(0).float() / 255.)
-    with torch.no_grad():
-        with tqdm(total=len(images), desc='Interpolate', unit='frame') as pbar:
-            for image in images:
-                frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-                I0 = I1
-                I1 = f_pad(torch.from_numpy(np.transpose(frame, (2,0,1))).to(devices.device, non_blocking=True).unsqueeze(0).float() / 255.)
-                I0_small = F.interpolate(I0, (32, 32), mode='bilinear', align_corners=False).to(torch.float32)
-                I1_small = F.interpolate(I1, (32, 32), mode='bilinear', align_corners=False).to(torch.float32)
-                ssim = ssim_matlab(I0_small[:, :3], I1_small[:, :3])
-                if ssim > 0.99: # skip duplicate frames
-                    continue
-                if ssim < change:
-                    output = []
-                    for _i in range(pad): # fill frames if change rate is above threshold
-                        output.append(I0)
-                    for _i in range(pad):
-                        output.append(I1)
-                else:
-                    output = execute(I0, I1, count-1)
-                for mid in output:
-                    mid = (((mid[0] * 255.).byte().cpu().numpy().transpose(1, 2, 0)))
-                    buffer.put(mid[:h, :w])
-                buffer.put(frame)
-                pbar.update(1)
+    def flush(self):
+        if self.frame is None:
+            return []
+        return [self.to_image(self.frame) for _i in range(self.pad)] # fill ending frames
 
-    for _i in range(pad): # fill ending frames
-        buffer.put(frame)
-    while not buffer.empty():
-        time.sleep(0.1)
+    def estimate(self, frames: int):
+        """
+        Expected number of output frames for total number of input frames
+        Transitions already pushed are counted exactly: interpolated ones produce count frames, filled scene changes 2*pad+1 and duplicates none
+        Remaining transitions are assumed to be interpolated
+        """
+        seen = max(0, self.inputs - 1)
+        remaining = max(0, frames - 1 - seen)
+        interpolated = seen - self.changes - self.duplicates
+        return 2 * self.pad + (interpolated + remaining) * self.count + self.changes * (2 * self.pad + 1)
+
+
+def interpolate(images: list, count: int = 2, scale: float = 1.0, pad: int = 1, change: float = 0.3):
+    if images is None or len(images) < 2:
+        return []
+    t0 = time.time()
+    interpolator = Interpolator(count=count, scale=scale, pad=pad, change=change)
+    interpolated = []
+    with tqdm(total=len(images), desc='Interpolate', unit='frame') as pbar:
+        for image in images:
+            interpolated += interpolator.push(image)
+            pbar.update(1)
+    interpolated += interpolator.flush()
     t1 = time.time()
-    shared.log.info(f'RIFE interpolate: input={len(images)} frames={len(interpolated)} width={w} height={h} interpolate={count} scale={scale} pad={pad} change={change} time={round(t1 - t0, 2)}')
+    shared.log.info(f'RIFE interpolate: input={len(images)} frames={len(interpolated)} width={interpolator.w} height={interpolator.h} interpolate={count} scale={scale} pad={pad} change={change} time={round(t1 - t0, 2)}')
     return interpolated
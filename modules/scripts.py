@@ -329,6 +329,7 @@ class ScriptRunner:
         self.script_load_ctr = 0
         self.is_img2img = False
         self.inputs = [None]
+        self.default_args = None # populated by setup_api in api-only mode
 
     def initialize_scripts(self, is_img2img=False, is_control=False):
         from modules import scripts_auto_postprocessing
@@ -374,8 +375,55 @@ class ScriptRunner:
     def prepare_ui(self):
         self.inputs = [None]
 
-    def setup_ui(self, parent='unknown', accordion=True):
+    def create_api_info(self, script: Script, controls):
         import modules.api.models as api_models
+        api_args = []
+        for control in controls:
+            debug(f'Script control: parent={script.parent} script="{script.name}" label="{control.label}" type={control} id={control.elem_id}')
+            if not isinstance(control, gr.components.IOComponent):
+                errors.log.error(f'Invalid script control: "{script.filename}" control={control}')
+                continue
+            control.custom_script_source = os.path.basename(script.filename)
+            arg_info = api_models.ScriptArg(label=control.label or "")
+            for field in ("value", "minimum", "maximum", "step", "choices"):
+                v = getattr(control, field, None)
+                if v is not None:
+                    setattr(arg_info, field, v)
+            api_args.append(arg_info)
+        return api_models.ItemScript(
+            name=script.name,
+            is_img2img=script.is_img2img,
+            is_alwayson=script.alwayson,
+            args=api_args,
+        )
+
+    def setup_api(self, parent='api'):
+        """
+        Headless alternative to setup_ui used in api-only mode
+        Assigns script argument ranges, names, api info and default argument values without building any ui layout
+        Script controls are still created since scripts describe their args through them, but inside a throwaway blocks context that is never rendered
+        """
+        t0 = time.time()
+        self.titles = [wrap_call(script.title, script.filename, "title") or f"{script.filename} [error]" for script in self.selectable_scripts]
+        self.default_args = [0] # position 0 is index of selected script
+        standalone = [script for script in self.alwayson_scripts if script.standalone]
+        grouped = [script for script in self.alwayson_scripts if not script.standalone]
+        with gr.Blocks():
+            for script in standalone + grouped + self.selectable_scripts: # same order as setup_ui so arg ranges match
+                script.parent = parent
+                script.args_from = len(self.default_args)
+                script.args_to = len(self.default_args)
+                controls = wrap_call(script.ui, script.filename, "ui", script.is_img2img)
+                if controls is None:
+                    continue
+                script.name = wrap_call(script.title, script.filename, "title", default=script.filename).lower()
+                script.api_info = self.create_api_info(script, controls)
+                self.default_args += [getattr(control, 'value', None) for control in controls]
+                script.args_to = len(self.default_args)
+        self.inputs = [None] * len(self.default_args)
+        debug(f'Script setup api: parent={parent} scripts={len(self.scripts)} args={len(self.default_args)} time={time.time()-t0:.2f}')
+
+    def setup_ui(self, parent='unknown', accordion=True):
         self.titles = [wrap_call(script.title, script.filename, "title") or f"{script.filename} [error]" for script in self.selectable_scripts]
         inputs = []
         inputs_alwayson = [True]
@@ -388,26 +436,7 @@ class ScriptRunner:
             if controls is None:
                 return
             script.name = wrap_call(script.title, script.filename, "title", default=script.filename).lower()
-            api_args = []
-            for control in controls:
-                debug(f'Script control: parent={script.parent} script="{script.name}" label="{control.label}" type={control} id={control.elem_id}')
-                if not isinstance(control, gr.components.IOComponent):
-                    errors.log.error(f'Invalid script control: "{script.filename}" control={control}')
-                    continue
-                control.custom_script_source = os.path.basename(script.filename)
-                arg_info = api_models.ScriptArg(label=control.label or "")
-                for field in ("value", "minimum", "maximum", "step", "choices"):
-                    v = getattr(control, field, None)
-                    if v is not None:
-                        setattr(arg_info, field, v)
-                api_args.append(arg_info)
-
-            script.api_info = api_models.ItemScript(
-                name=script.name,
-                is_img2img=script.is_img2img,
-                is_alwayson=script.alwayson,
-                args=api_args,
-            )
+            script.api_info = self.create_api_info(script, controls)
             if script.infotext_fields is not None:
                 self.infotext_fields += script.infotext_fields
             if script.paste_field_names is not None:
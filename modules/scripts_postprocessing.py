@@ -33,6 +33,20 @@ class ScriptPostprocessing:
         """
         pass # pylint: disable=unnecessary-pass
 
+    def process_batch(self, pps: list, **args):
+        """
+        This function is called to postprocess a batch of images in folder mode.
+        Default runs process() for each image, scripts whose models support batched inference can override it
+        """
+        for pp in pps:
+            self.process(pp, **args)
+
+    def postprocess_enabled(self, **args): # pylint: disable=unused-argument
+        """
+        Return false if postprocess() would do nothing for given args so folder mode does not need to keep processed images in memory
+        """
+        return hasattr(self, 'postprocess')
+
     def image_changed(self):
         pass
 
@@ -94,16 +108,40 @@ class ScriptPostprocessingRunner:
         self.ui_created = True
         return inputs
 
+    def script_args(self, script, args):
+        script_args = args[script.args_from:script.args_to]
+        process_args = {}
+        for (name, _component), value in zip(script.controls.items(), script_args):
+            process_args[name] = value
+        return process_args
+
     def run(self, pp: PostprocessedImage, args):
         for script in self.scripts_in_preferred_order():
             shared.state.job = script.name
-            script_args = args[script.args_from:script.args_to]
-            process_args = {}
-            for (name, _component), value in zip(script.controls.items(), script_args):
-                process_args[name] = value
+            process_args = self.script_args(script, args)
             shared.log.debug(f'Process: script={script.name} args={process_args}')
             script.process(pp, **process_args)
 
+    def run_batch(self, pps: list, args):
+        for script in self.scripts_in_preferred_order():
+            shared.state.job = script.name
+            process_args = self.script_args(script, args)
+            shared.log.debug(f'Process: script={script.name} batch={len(pps)} args={process_args}')
+            if hasattr(script, 'process_batch'):
+                script.process_batch(pps, **process_args)
+            else:
+                for pp in pps:
+                    script.process(pp, **process_args)
+
+    def postprocess_enabled(self, args):
+        for script in self.scripts_in_preferred_order():
+            if not hasattr(script, 'postprocess'):
+                continue
+            enabled = script.postprocess_enabled(**self.script_args(script, args)) if hasattr(script, 'postprocess_enabled') else True
+            if enabled:
+                return True
+        return False
+
     def create_args_for_run(self, scripts_args):
         if not self.ui_created:
             with gr.Blocks(analytics_enabled=False):
@@ -126,9 +164,6 @@ class ScriptPostprocessingRunner:
             if not hasattr(script, 'postprocess'):
                 continue
             shared.state.job = script.name
-            script_args = args[script.args_from:script.args_to]
-            process_args = {}
-            for (name, _component), value in zip(script.controls.items(), script_args):
-                process_args[name] = value
+            process_args = self.script_args(script, args)
             shared.log.debug(f'Postprocess: script={script.name} args={process_args}')
             script.postprocess(filenames, **process_args)
@@ -20,7 +20,7 @@ import safetensors.torch
 from omegaconf import OmegaConf
 from transformers import logging as transformers_logging
 from ldm.util import instantiate_from_config
-from modules import paths, shared, shared_items, shared_state, modelloader, devices, script_callbacks, sd_vae, sd_unet, errors, hashes, sd_models_config, sd_models_compile, sd_hijack_accelerate
+from modules import paths, shared, shared_items, shared_state, modelloader, devices, script_callbacks, sd_vae, sd_unet, errors, hashes, sd_models_config, sd_models_compile, sd_hijack_accelerate, metrics, prompt_tokens
 from modules.timer import Timer
 from modules.memstats import memory_stats
 from modules.modeldata import model_data
@@ -1393,12 +1393,14 @@ def load_diffuser(checkpoint_info=None, already_loaded_state_dict=None, timer=No
 
     devices.torch_gc(force=True)
     if sd_model is not None:
+        prompt_tokens.clear()
         script_callbacks.model_loaded_callback(sd_model)
 
     if debug_load:
         from modules import modelstats
         modelstats.analyze()
 
+    metrics.model_loads.observe(timer.total, op=op)
     shared.log.info(f"Load {op}: time={timer.summary()} native={get_native(sd_model)} memory={memory_stats()}")
 
 
@@ -1755,8 +1757,10 @@ def load_model(checkpoint_info=None, already_loaded_state_dict=None, timer=None,
         model_data.sd_model = sd_model
     sd_hijack.model_hijack.embedding_db.load_textual_inversion_embeddings(force_reload=True)  # Reload embeddings after model load as they may or may not fit the model
     timer.record("embeddings")
+    prompt_tokens.clear()
     script_callbacks.model_loaded_callback(sd_model)
     timer.record("callbacks")
+    metrics.model_loads.observe(timer.total, op=op)
     shared.log.info(f"Model loaded in {timer.summary()}")
     current_checkpoint_info = None
     devices.torch_gc(force=True)
@@ -1851,6 +1855,7 @@ def reload_model_weights(sd_model=None, info=None, reuse_dict=False, op='model',
     finally:
         sd_hijack.model_hijack.hijack(sd_model)
         timer.record("hijack")
+        prompt_tokens.clear()
         script_callbacks.model_loaded_callback(sd_model)
         timer.record("callbacks")
         if sd_model is not None and not shared.cmd_opts.lowvram and not shared.cmd_opts.medvram:
@@ -1884,6 +1889,7 @@ def disable_offload(sd_model):
 
 
 def unload_model_weights(op='model'):
+    prompt_tokens.clear()
     if shared.compiled_model_state is not None:
         shared.compiled_model_state.compiled_cache.clear()
         shared.compiled_model_state.req_cache.clear()
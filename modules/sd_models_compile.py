@@ -444,11 +444,14 @@ def compile_torch(sd_model):
         except Exception as e:
             shared.log.error(f"Model compile: torch inductor config error: {e}")
 
+        from modules import sd_models_compile_cache
+        sd_models_compile_cache.load(sd_model)
         sd_model = apply_compile_to_model(sd_model, function=torch_compile_model, options=shared.opts.cuda_compile, op="compile")
 
         setup_logging() # compile messes with logging so reset is needed
         if shared.opts.cuda_compile_precompile:
             sd_model("dummy prompt")
+            sd_models_compile_cache.save()
         t1 = time.time()
         shared.log.info(f"Model compile: task=torch time={t1-t0:.2f}")
     except Exception as e:
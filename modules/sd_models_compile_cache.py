@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import hashlib
+import torch
+from modules import shared, devices
+
+
+debug = shared.log.trace if os.environ.get('SD_COMPILE_DEBUG', None) is not None else lambda *args, **kwargs: None
+active = None # key, descriptor and compiled shapes of currently compiled model
+
+
+def enabled():
+    return shared.opts.cuda_compile_cache and shared.opts.compile_cache_dir and shared.opts.cuda_compile_backend not in ['none', 'openvino_fx', 'olive-ai', 'onediff', 'stable-fast', 'deep-cache']
+
+
+def setup():
+    """point inductor and triton kernel caches to persistent folder and enable fx graph and autotune caches"""
+    if not enabled():
+        return
+    root = shared.opts.compile_cache_dir
+    os.makedirs(root, exist_ok=True)
+    os.environ.setdefault('TORCHINDUCTOR_CACHE_DIR', os.path.abspath(os.path.join(root, 'inductor'))) # explicit env from user wins
+    os.environ.setdefault('TRITON_CACHE_DIR', os.path.abspath(os.path.join(root, 'triton')))
+    try:
+        import torch._inductor.config # pylint: disable=unused-import
+        torch._inductor.config.fx_graph_cache = True # pylint: disable=protected-access
+        if hasattr(torch._inductor.config, 'autotune_local_cache'): # pylint: disable=protected-access
+            torch._inductor.config.autotune_local_cache = True # pylint: disable=protected-access
+    except Exception as e:
+        shared.log.warning(f'Compile cache: inductor config error: {e}')
+
+
+def get_key(sd_model):
+    """compile artifact identity: model, backend and compile options, loaded lora set and runtime versions"""
+    info = getattr(sd_model, 'sd_checkpoint_info', None)
+    descriptor = {
+        'model': getattr(info, 'shorthash', None) or getattr(info, 'name', None) or sd_model.__class__.__name__,
+        'backend': shared.opts.cuda_compile_backend,
+        'mode': shared.opts.cuda_compile_mode,
+        'fullgraph': shared.opts.cuda_compile_fullgraph,
+        'compile': sorted(shared.opts.cuda_compile),
+        'lora': list(shared.compiled_model_state.lora_model) if shared.compiled_model_state is not None else [],
+        'torch': torch.__version__,
+        'device': torch.cuda.get_device_name(devices.device) if devices.device.type == 'cuda' else str(devices.device),
+        'dtype': str(devices.dtype),
+    }
+    return hashlib.sha256(json.dumps(descriptor, sort_keys=True).encode()).hexdigest()[:16], descriptor
+
+
+def compiled_graphs():
+    """number of graphs dynamo compiled in this process, none if counters are not available"""
+    try:
+        from torch._dynamo.utils import counters
+        return counters['stats']['unique_graphs']
+    except Exception:
+        return None
+
+
+def read_manifest(fn: str):
+    try:
+        with open(fn, 'r', encoding='utf8') as f:
+            return json.load(f).get('shapes', [])
+    except Exception:
+        return []
+
+
+def artifact_path(key: str):
+    return os.path.join(shared.opts.compile_cache_dir, 'artifacts', f'{key}.bin')
+
+
+def load(sd_model):
+    """restore compiled artifacts for model before it is compiled, returns true on cache hit"""
+    global active # pylint: disable=global-statement
+    active = None
+    if not enabled():
+        return False
+    from modules import metrics
+    setup()
+    key, descriptor = get_key(sd_model)
+    fn = artifact_path(key)
+    manifest = os.path.splitext(fn)[0] + '.json'
+    active = { 'key': key, 'descriptor': descriptor, 'shapes': [], 'graphs': None }
+    hit = os.path.isfile(fn)
+    if hit and hasattr(torch.compiler, 'load_cache_artifacts'):
+        try:
+            t0 = time.time()
+            with open(fn, 'rb') as f:
+                torch.compiler.load_cache_artifacts(f.read())
+            active['shapes'] = read_manifest(manifest)
+            shared.log.info(f'Compile cache: hit key={key} shapes={active["shapes"]} time={time.time()-t0:.2f}')
+        except Exception as e:
+            hit = False
+            shared.log.warning(f'Compile cache: load key={key} {e}')
+    else:
+        hit = False
+        shared.log.info(f'Compile cache: miss key={key} model={descriptor["model"]} lora={descriptor["lora"]}')
+    metrics.cache_access('compile', hit)
+    active['graphs'] = compiled_graphs()
+    return hit
+
+
+def save(width: int = 0, height: int = 0, batch_size: int = 1):
+    """persist compiled artifacts once a new shape was compiled, called after compiled model has run"""
+    if active is None or not enabled() or 'Model' not in shared.opts.cuda_compile or not hasattr(torch.compiler, 'save_cache_artifacts'):
+        return
+    shape = [width, height, batch_size]
+    graphs = compiled_graphs()
+    if graphs is not None and graphs == active['graphs']: # run was served by existing graphs so nothing new to persist
+        return
+    if graphs is None and shape in active['shapes']:
+        return
+    try:
+        t0 = time.time()
+        res = torch.compiler.save_cache_artifacts()
+        if res is None:
+            return
+        artifacts, _info = res
+        fn = artifact_path(active['key'])
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+        with open(fn, 'wb') as f:
+            f.write(artifacts)
+        active['graphs'] = graphs
+        manifest = os.path.splitext(fn)[0] + '.json'
+        shapes = read_manifest(manifest) # merge with shapes recorded by other processes since load
+        for item in active['shapes'] + [shape]:
+            if item not in shapes:
+                shapes.append(item)
+        active['shapes'] = shapes
+        with open(manifest, 'w', encoding='utf8') as f:
+            json.dump({ **active['descriptor'], 'shapes': shapes }, f, indent=2)
+        shared.log.debug(f'Compile cache: save key={active["key"]} shape={shape} size={len(artifacts)} time={time.time()-t0:.2f}')
+    except Exception as e:
+        shared.log.warning(f'Compile cache: save key={active["key"]} {e}')
@@ -2,8 +2,8 @@ import threading
 from collections import namedtuple
 import torch
 import torchvision.transforms as T
-from PIL import Image
-from modules import shared, devices, processing, images, sd_vae_approx, sd_vae_taesd, sd_vae_stablecascade, sd_samplers
+from PIL import Image, ImageColor
+from modules import shared, devices, processing, images, script_callbacks, sd_vae_approx, sd_vae_taesd, sd_vae_stablecascade, sd_samplers
 
 
 SamplerData = namedtuple('SamplerData', ['name', 'constructor', 'aliases', 'options'])
@@ -79,6 +79,7 @@ def single_sample_to_image(sample, approximation=None):
         try:
             if x_sample.dtype == torch.bfloat16:
                 x_sample.to(torch.float16)
+            x_sample = limit_preview_size(x_sample.unsqueeze(0))[0]
             transform = T.ToPILImage()
             image = transform(x_sample)
         except Exception as e:
@@ -91,8 +92,57 @@ def sample_to_image(samples, index=0, approximation=None):
     return single_sample_to_image(samples[index], approximation)
 
 
+def limit_preview_size(x_samples):
+    """downscale batch of decoded previews in tensor space so longest side of preview is within limit"""
+    limit = shared.opts.live_preview_max_size
+    h, w = x_samples.shape[-2], x_samples.shape[-1]
+    if limit <= 0 or max(h, w) <= limit:
+        return x_samples
+    scale = limit / max(h, w)
+    size = (max(1, int(h * scale)), max(1, int(w * scale)))
+    return torch.nn.functional.interpolate(x_samples.float(), size=size, mode='area')
+
+
 def samples_to_image_grid(samples, approximation=None):
-    return images.image_grid([single_sample_to_image(sample, approximation) for sample in samples])
+    """decode whole batch in single call, assemble grid and downscale in tensor space before converting to image"""
+    if approximation is None:
+        approximation = approximation_indexes.get(shared.opts.show_progress_type, 0)
+    if not torch.is_tensor(samples) or len(samples.shape) != 4 or samples.shape[1] == 16 or approximation not in [0, 1, 2]: # cascade, video and full vae use per-sample path
+        return images.image_grid([single_sample_to_image(sample, approximation) for sample in samples])
+    with queue_lock:
+        try:
+            if samples.dtype == torch.bfloat16 and approximation in [0, 1]:
+                samples = samples.to(torch.float16)
+            if shared.native: # [-x,x] to [-5,5] per sample
+                sample_max = samples.amax(dim=(1, 2, 3), keepdim=True)
+                samples = samples * torch.where(sample_max > 5, 5 / sample_max, torch.ones_like(sample_max))
+                sample_min = samples.amin(dim=(1, 2, 3), keepdim=True)
+                samples = samples * torch.where(sample_min < -5, 5 / sample_min.abs(), torch.ones_like(sample_min))
+            if approximation == 2: # TAESD
+                x_samples = (1.0 + sd_vae_taesd.decode(samples)) / 2.0
+            elif approximation == 0: # Simple
+                x_samples = sd_vae_approx.cheap_approximation(samples) * 0.5 + 0.5
+            else: # Approximate
+                x_samples = sd_vae_approx.nn_approximation(samples) * 0.5 + 0.5
+                if shared.sd_model_type == "sdxl":
+                    x_samples = x_samples[:, [2, 1, 0], :, :] # BGR to RGB
+            if not torch.is_tensor(x_samples) or len(x_samples.shape) != 4 or x_samples.shape[1] != 3:
+                raise ValueError(f'unexpected decode shape={getattr(x_samples, "shape", None)}')
+            if len(script_callbacks.callback_map['callbacks_image_grid']) > 0: # callbacks may change layout or cells so build grid from images
+                x_samples = (x_samples.float().clamp(0, 1) * 255).to(torch.uint8).permute(0, 2, 3, 1).cpu().numpy()
+                return images.image_grid([Image.fromarray(sample) for sample in x_samples])
+            n, c, h, w = x_samples.shape
+            rows, cols = images.get_grid_size(range(n))
+            if rows * cols > n: # pad grid with empty cells in grid background color
+                background = torch.tensor(ImageColor.getrgb(shared.opts.grid_background)[:3], device=x_samples.device, dtype=x_samples.dtype) / 255
+                x_samples = torch.cat([x_samples, background.view(1, c, 1, 1).expand(rows * cols - n, c, h, w)], dim=0)
+            grid = x_samples.view(rows, cols, c, h, w).permute(2, 0, 3, 1, 4).reshape(1, c, rows * h, cols * w)
+            grid = limit_preview_size(grid)[0]
+            grid = (grid.float().clamp(0, 1) * 255).to(torch.uint8).permute(1, 2, 0).cpu().numpy()
+            return Image.fromarray(grid)
+        except Exception as e:
+            warn_once(f'live preview: {e}')
+            return Image.new(mode="RGB", size=(512, 512))
 
 
 def images_tensor_to_samples(image, approximation=None, model=None):
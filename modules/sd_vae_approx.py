@@ -48,10 +48,11 @@ def nn_approximation(sample): # Approximate NN
         sd_vae_approx_model.to(device, dtype)
         shared.log.debug(f'VAE load: type=approximate model={model_path}')
     try:
-        in_sample = sample.to(device, dtype).unsqueeze(0)
+        batched = len(sample.shape) == 4
+        in_sample = sample.to(device, dtype) if batched else sample.to(device, dtype).unsqueeze(0)
         sd_vae_approx_model.to(device, dtype)
         x_sample = sd_vae_approx_model(in_sample)
-        x_sample = x_sample[0].to(torch.float32).detach().cpu()
+        x_sample = x_sample.to(torch.float32).detach().cpu() if batched else x_sample[0].to(torch.float32).detach().cpu()
         return x_sample
     except Exception as e:
         shared.log.error(f'VAE decode approximate: {e}')
@@ -0,0 +1,154 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import torch
+from modules import shared, devices, sd_vae
+
+
+debug = shared.log.trace if os.environ.get('SD_VAE_DEBUG', None) is not None else lambda *args, **kwargs: None
+cache = OrderedDict() # encoded tensors per key in ram
+lock = threading.Lock()
+local = threading.local() # key already computed by lookup for encode that follows on same thread
+
+
+def enabled():
+    return shared.opts.diffusers_vae_cache > 0 or shared.opts.diffusers_vae_cache_disk
+
+
+def file_identity(fn: str):
+    """full path with size and mtime so replaced or edited files with same name do not share cached latents"""
+    if fn is None or not os.path.exists(fn):
+        return fn
+    stat = os.stat(fn)
+    return f'{os.path.abspath(fn)}:{stat.st_size}:{stat.st_mtime}'
+
+
+def vae_identity(model, full_quality: bool = True):
+    """identifies which encoder produced the latents: loaded vae file or checkpoint with baked vae, or taesd for model type"""
+    if not full_quality:
+        return f'taesd-{shared.sd_model_type}'
+    if sd_vae.loaded_vae_file is not None:
+        return file_identity(sd_vae.loaded_vae_file)
+    info = getattr(model, 'sd_checkpoint_info', None)
+    if info is None: # pipeline without checkpoint info, find loaded model owning same vae
+        for m in [shared.sd_model, shared.sd_refiner]:
+            if m is not None and getattr(m, 'vae', None) is getattr(model, 'vae', False):
+                info = getattr(m, 'sd_checkpoint_info', None)
+    if info is None:
+        return f'baked-{model.__class__.__name__}'
+    return f'baked-{file_identity(getattr(info, "filename", None)) or getattr(info, "name", None)}'
+
+
+def get_key(tensor: torch.Tensor, identity: str):
+    """content address: encoder input pixels, shape and dtype plus vae identity"""
+    data = tensor.detach().to(devices.cpu).contiguous().view(-1).view(torch.uint8).numpy()
+    h = hashlib.sha256(data.tobytes())
+    h.update(f'{tuple(tensor.shape)}:{tensor.dtype}:{identity}'.encode())
+    return h.hexdigest()[:32]
+
+
+def disk_path(key: str):
+    if not shared.opts.diffusers_vae_cache_disk or not shared.opts.vae_cache_dir:
+        return None
+    return os.path.join(shared.opts.vae_cache_dir, key[:2], f'{key}.safetensors')
+
+
+def get(key: str):
+    """cached tensor from ram tier or disk tier which is promoted to ram on hit"""
+    with lock:
+        tensor = cache.get(key, None)
+        if tensor is not None:
+            cache.move_to_end(key)
+            return tensor
+    fn = disk_path(key)
+    if fn is not None and os.path.isfile(fn):
+        try:
+            from safetensors.torch import load_file
+            tensor = load_file(fn)['latents']
+            put(key, tensor, persist=False)
+            debug(f'VAE cache: load file="{fn}"')
+            return tensor
+        except Exception as e:
+            shared.log.warning(f'VAE cache: file="{fn}" {e}')
+    return None
+
+
+def put(key: str, tensor: torch.Tensor, persist: bool = True):
+    tensor = tensor.detach().to(devices.cpu).contiguous() # keep cache off gpu
+    size = shared.opts.diffusers_vae_cache
+    if size > 0:
+        with lock:
+            cache[key] = tensor
+            cache.move_to_end(key)
+            while len(cache) > size:
+                cache.popitem(last=False)
+    fn = disk_path(key) if persist else None
+    if fn is not None:
+        try:
+            from safetensors.torch import save_file
+            os.makedirs(os.path.dirname(fn), exist_ok=True)
+            save_file({ 'latents': tensor }, fn)
+        except Exception as e:
+            shared.log.warning(f'VAE cache: file="{fn}" {e}')
+
+
+def encode(vae, x: torch.Tensor, identity: str, key: str = None):
+    """
+    Encode through cache and return latent distribution
+    Distribution parameters are cached instead of a sample so each use still draws new latents same as uncached encode
+    """
+    from diffusers.models.autoencoders.vae import DiagonalGaussianDistribution
+    from modules import metrics
+    key = key or get_key(x, identity)
+    parameters = get(key)
+    metrics.cache_access('vae', parameters is not None)
+    if parameters is None:
+        dist = vae.orig_encode(x, return_dict=True).latent_dist
+        put(key, dist.parameters)
+        return dist
+    debug(f'VAE cache: hit key={key} shape={parameters.shape}')
+    return DiagonalGaussianDistribution(parameters.to(device=x.device, dtype=x.dtype))
+
+
+def lookup(vae, x: torch.Tensor, identity: str):
+    """
+    Check cache without encoding so callers can skip device moves on hit
+    On miss key is remembered so following encode of same input on this thread does not hash it again
+    """
+    local.key = None
+    if not enabled() or not hasattr(vae, 'orig_encode'):
+        return None
+    from diffusers.models.autoencoders.vae import DiagonalGaussianDistribution
+    key = get_key(x.to(vae.dtype), identity)
+    parameters = get(key)
+    if parameters is None:
+        local.key = key
+        return None
+    return DiagonalGaussianDistribution(parameters.to(device=x.device, dtype=vae.dtype))
+
+
+def hook(model):
+    """wrap vae.encode of loaded model so encodes done inside diffusers pipelines for img2img, inpaint and control inputs are cached"""
+    vae = getattr(model, 'vae', None)
+    if vae is None or hasattr(vae, 'orig_encode') or not hasattr(vae, 'encode'):
+        return
+    if 'AutoencoderKL' not in vae.__class__.__name__: # only gaussian latent distribution is cached
+        return
+    vae.orig_encode = vae.encode
+
+    def cached_encode(x, return_dict=True):
+        if not enabled() or not torch.is_tensor(x):
+            return vae.orig_encode(x, return_dict=return_dict)
+        from diffusers.models.modeling_outputs import AutoencoderKLOutput
+        key, local.key = getattr(local, 'key', None), None
+        dist = encode(vae, x, vae_identity(model), key=key)
+        return AutoencoderKLOutput(latent_dist=dist) if return_dict else (dist,)
+
+    vae.encode = cached_encode
+    debug(f'VAE cache: hook vae={vae.__class__.__name__}')
+
+
+def clear():
+    with lock:
+        cache.clear()
@@ -0,0 +1,192 @@
+import os
+from dataclasses import dataclass
+import torch
+from modules import shared, devices
+
+
+debug = shared.log.trace if os.environ.get('SD_VAE_DEBUG', None) is not None else lambda *args, **kwargs: None
+activation_factor = 10 # conservative number of live full-resolution activations at peak, groupnorm upcast and conv workspace included
+tile_sizes = [128, 96, 64, 48, 32, 16] # latent tile sizes tried from largest to smallest
+budget_ratio = 0.8 # fraction of available memory plan is allowed to use
+
+
+@dataclass
+class Plan:
+    batch: int # images per vae call
+    tile: int = 0 # latent tile size, 0 means no spatial tiling
+    overlap: int = 0 # latent overlap between tiles
+
+    def __str__(self):
+        return f'batch={self.batch} tile={self.tile} overlap={self.overlap}'
+
+
+def available_memory():
+    """free device memory including memory reserved by torch but not allocated, none if unknown for backend"""
+    try:
+        if torch.cuda.is_available() and devices.backend != 'directml':
+            free, _total = torch.cuda.mem_get_info()
+            return free + torch.cuda.memory_reserved() - torch.cuda.memory_allocated()
+    except Exception:
+        pass
+    return None
+
+
+def scale_factor(vae):
+    """spatial downsampling of vae: 8 for kl vaes and 32 for dc-ae and other deep compression vaes"""
+    ratio = getattr(vae, 'spatial_compression_ratio', None) or getattr(vae.config, 'spatial_compression_ratio', None)
+    if ratio:
+        return int(ratio)
+    model = shared.sd_model.pipe if hasattr(shared.sd_model, 'pipe') else shared.sd_model
+    if getattr(model, 'vae', None) is vae and getattr(model, 'vae_scale_factor', None):
+        return int(model.vae_scale_factor)
+    channels = getattr(vae.config, 'block_out_channels', None) or getattr(vae.config, 'encoder_block_out_channels', None)
+    return 2 ** (len(channels) - 1) if channels else 8
+
+
+def estimate(vae, latent_h: int, latent_w: int, batch: int, dtype):
+    """estimate peak activation memory of vae decode or encode, dominated by highest-resolution block"""
+    channels = (getattr(vae.config, 'block_out_channels', None) or getattr(vae.config, 'encoder_block_out_channels', None) or [128])[0]
+    factor = scale_factor(vae)
+    elem = torch.tensor([], dtype=dtype).element_size()
+    return batch * (latent_h * factor) * (latent_w * factor) * channels * elem * activation_factor
+
+
+def create(vae, latent_h: int, latent_w: int, batch: int, dtype) -> Plan:
+    """largest batch split and tile size that fits in available memory"""
+    free = available_memory()
+    if free is None or not shared.opts.diffusers_vae_plan:
+        return Plan(batch=batch)
+    budget = free * budget_ratio
+    single = estimate(vae, latent_h, latent_w, 1, dtype)
+    if single <= budget:
+        return Plan(batch=max(1, min(batch, int(budget // single))))
+    if getattr(vae, 'use_tiling', False): # vae tiles internally so only split batch
+        return Plan(batch=1)
+    for tile in tile_sizes:
+        if tile >= max(latent_h, latent_w):
+            continue
+        overlap = tile // 4
+        if estimate(vae, tile, tile, 1, dtype) <= budget:
+            return Plan(batch=1, tile=tile, overlap=overlap)
+    return Plan(batch=1, tile=tile_sizes[-1], overlap=tile_sizes[-1] // 4)
+
+
+def shrink(plan: Plan, latent_h: int, latent_w: int):
+    """smaller plan after oom, none if plan cannot be reduced further"""
+    if plan.batch > 1:
+        return Plan(batch=plan.batch // 2, tile=plan.tile, overlap=plan.overlap)
+    smaller = [t for t in tile_sizes if t < (plan.tile or max(latent_h, latent_w))]
+    if len(smaller) == 0:
+        return None
+    return Plan(batch=1, tile=smaller[0], overlap=smaller[0] // 4)
+
+
+def is_oom(e: Exception):
+    return isinstance(e, torch.cuda.OutOfMemoryError) or 'out of memory' in str(e).lower()
+
+
+def blend_mask(h: int, w: int, overlap_h: int, overlap_w: int, top: bool, bottom: bool, left: bool, right: bool, device, dtype):
+    """linear ramp weights over overlapping edges so tile seams are blended"""
+    mask = torch.ones((h, w), device=device, dtype=dtype)
+    if overlap_h > 0:
+        ramp = torch.linspace(1 / (overlap_h + 1), 1 - 1 / (overlap_h + 1), overlap_h, device=device, dtype=dtype)
+        if not top:
+            mask[:overlap_h, :] *= ramp[:, None]
+        if not bottom:
+            mask[-overlap_h:, :] *= ramp.flip(0)[:, None]
+    if overlap_w > 0:
+        ramp = torch.linspace(1 / (overlap_w + 1), 1 - 1 / (overlap_w + 1), overlap_w, device=device, dtype=dtype)
+        if not left:
+            mask[:, :overlap_w] *= ramp[None, :]
+        if not right:
+            mask[:, -overlap_w:] *= ramp.flip(0)[None, :]
+    return mask
+
+
+def tiles(size: int, tile: int, overlap: int):
+    """tile start positions covering size with given overlap, last tile is aligned to end"""
+    if tile >= size:
+        return [0]
+    stride = tile - overlap
+    starts = list(range(0, size - tile, stride))
+    starts.append(size - tile)
+    return starts
+
+
+def run_tiled(fn, x: torch.Tensor, tile: int, overlap: int, scale: float):
+    """
+    Run fn over overlapping spatial tiles of x and blend results
+    scale is ratio of output to input resolution: 8 for decode and 1/8 for encode
+    """
+    _b, _c, h, w = x.shape
+    output, weights = None, None
+    ys, xs = tiles(h, tile, overlap), tiles(w, tile, overlap)
+    for y in ys:
+        for x0 in xs:
+            res = fn(x[:, :, y:y+tile, x0:x0+tile])
+            if output is None:
+                output = torch.zeros((res.shape[0], res.shape[1], int(h * scale), int(w * scale)), device=res.device, dtype=res.dtype)
+                weights = torch.zeros((1, 1, int(h * scale), int(w * scale)), device=res.device, dtype=res.dtype)
+            oy, ox = int(y * scale), int(x0 * scale)
+            th, tw = res.shape[2], res.shape[3]
+            overlap_out = int(overlap * scale)
+            mask = blend_mask(th, tw, overlap_out if len(ys) > 1 else 0, overlap_out if len(xs) > 1 else 0, y == 0, y == ys[-1], x0 == 0, x0 == xs[-1], res.device, res.dtype)
+            output[:, :, oy:oy+th, ox:ox+tw] += res * mask
+            weights[:, :, oy:oy+th, ox:ox+tw] += mask
+    return output / weights.clamp(min=1e-6)
+
+
+def execute(vae, fn, x: torch.Tensor, scale: float, op: str, plan: Plan = None):
+    """run fn over x split according to plan, retry with smaller plan on oom"""
+    h, w = (x.shape[2], x.shape[3]) if scale > 1 else (int(x.shape[2] * scale), int(x.shape[3] * scale)) # plan in latent space
+    plan = plan or create(vae, h, w, x.shape[0], x.dtype)
+    while True:
+        try:
+            debug(f'VAE plan: op={op} input={list(x.shape)} {plan}')
+            tile = plan.tile if scale > 1 else int(plan.tile / scale) # tile in input space
+            overlap = plan.overlap if scale > 1 else int(plan.overlap / scale)
+            results = []
+            for i in range(0, x.shape[0], plan.batch):
+                chunk = x[i:i+plan.batch]
+                results.append(run_tiled(fn, chunk, tile, overlap, scale) if plan.tile > 0 else fn(chunk))
+            return torch.cat(results, dim=0) if len(results) > 1 else results[0]
+        except Exception as e:
+            if not is_oom(e):
+                raise
+            smaller = shrink(plan, h, w)
+            if smaller is None:
+                raise
+            shared.log.warning(f'VAE {op}: out of memory plan={plan} retry={smaller}')
+            plan = smaller
+            results = None
+        devices.torch_gc(force=True) # outside of except so traceback no longer holds failed activations
+
+
+def decode(vae, latents: torch.Tensor):
+    """memory-aware vae decode of latents with batch split, tiling and oom retry"""
+    if latents.ndim != 4: # video and other non-image vaes are passed through unchanged
+        return vae.decode(latents, return_dict=False)[0]
+    return execute(vae, lambda z: vae.decode(z, return_dict=False)[0], latents, scale=scale_factor(vae), op='decode')
+
+
+def encode(vae, image: torch.Tensor):
+    """memory-aware vae encode returning latent distribution, whole input is passed through vae.encode when it fits"""
+    from diffusers.models.autoencoders.vae import DiagonalGaussianDistribution
+    if image.ndim != 4:
+        return vae.encode(image).latent_dist
+    h, w = image.shape[2] // scale_factor(vae), image.shape[3] // scale_factor(vae)
+    plan = create(vae, h, w, image.shape[0], image.dtype)
+    if plan.batch >= image.shape[0] and plan.tile == 0: # common case: single call which also goes through encode cache
+        try:
+            return vae.encode(image).latent_dist
+        except Exception as e:
+            if not is_oom(e):
+                raise
+            plan = shrink(plan, h, w)
+            if plan is None:
+                raise
+            shared.log.warning(f'VAE encode: out of memory input={list(image.shape)} retry={plan}')
+        devices.torch_gc(force=True) # outside of except so traceback no longer holds failed activations
+    encode_fn = getattr(vae, 'orig_encode', vae.encode) # split encodes bypass encode cache
+    parameters = execute(vae, lambda x: encode_fn(x).latent_dist.parameters, image, scale=1 / scale_factor(vae), op='encode', plan=plan)
+    return DiagonalGaussianDistribution(parameters)
@@ -488,6 +488,7 @@ options_templates.update(options_section(('cuda', "Compute Settings"), {
     "cuda_compile_precompile": OptionInfo(False, "Model compile precompile"),
     "cuda_compile_verbose": OptionInfo(False, "Model compile verbose mode"),
     "cuda_compile_errors": OptionInfo(True, "Model compile suppress errors"),
+    "cuda_compile_cache": OptionInfo(False, "Model compile persistent cache"),
     "deep_cache_interval": OptionInfo(3, "DeepCache cache interval", gr.Slider, {"minimum": 1, "maximum": 10, "step": 1}),
 
     "ipex_sep": OptionInfo("<h2>IPEX</h2>", "", gr.HTML, {"visible": devices.backend == "ipex"}),
@@ -524,8 +525,17 @@ options_templates.update(options_section(('diffusers', "Diffusers Settings"), {
     "diffusers_vae_upcast": OptionInfo("default", "VAE upcasting", gr.Radio, {"choices": ['default', 'true', 'false']}),
     "diffusers_vae_slicing": OptionInfo(True, "VAE slicing"),
     "diffusers_vae_tiling": OptionInfo(cmd_opts.lowvram or cmd_opts.medvram, "VAE tiling"),
+    "diffusers_vae_plan": OptionInfo(False, "VAE memory-aware batch split and tiling"),
     "diffusers_model_load_variant": OptionInfo("default", "Preferred Model variant", gr.Radio, {"choices": ['default', 'fp32', 'fp16']}),
     "diffusers_vae_load_variant": OptionInfo("default", "Preferred VAE variant", gr.Radio, {"choices": ['default', 'fp32', 'fp16']}),
+    "diffusers_vae_cache": OptionInfo(0, "VAE encode cache size in memory", gr.Slider, {"minimum": 0, "maximum": 512, "step": 1}),
+    "diffusers_vae_cache_disk": OptionInfo(False, "VAE encode cache on disk"),
+    "ipadapter_cache": OptionInfo(32, "IP adapter image embeds cache size in memory", gr.Slider, {"minimum": 0, "maximum": 512, "step": 1}),
+    "ipadapter_cache_disk": OptionInfo(False, "IP adapter image embeds cache on disk"),
+    "ipadapter_resident_mb": OptionInfo(0, "IP adapter resident models max memory in MB", gr.Slider, {"minimum": 0, "maximum": 32768, "step": 256}),
+    "face_cache": OptionInfo(64, "Face analysis cache size in memory", gr.Slider, {"minimum": 0, "maximum": 1024, "step": 1}),
+    "face_cache_mb": OptionInfo(256, "Face analysis cache max memory in MB", gr.Slider, {"minimum": 0, "maximum": 4096, "step": 16}),
+    "face_cache_disk": OptionInfo(False, "Face analysis cache on disk"),
     "custom_diffusers_pipeline": OptionInfo('', 'Load custom Diffusers pipeline'),
     "diffusers_eval": OptionInfo(True, "Force model eval"),
     "diffusers_to_gpu": OptionInfo(False, "Load model directly to GPU"),
@@ -597,8 +607,12 @@ options_templates.update(options_section(('advanced', "Inference Settings"), {
     "inference_batch_sep": OptionInfo("<h2>Batch</h2>", "", gr.HTML),
     "sequential_seed": OptionInfo(True, "Batch mode uses sequential seeds"),
     "batch_frame_mode": OptionInfo(False, "Parallel process images in batch"),
+    "img2img_shared_init": OptionInfo(True, "Img2img encode init images once for all batches"),
     "inference_other_sep": OptionInfo("<h2>Other</h2>", "", gr.HTML),
     "inference_mode": OptionInfo("no-grad", "Torch inference mode", gr.Radio, {"choices": ["no-grad", "inference-mode", "none"]}),
+    "api_result_cache": OptionInfo(False, "API cache results of identical requests"),
+    "api_result_cache_mb": OptionInfo(1024, "API result cache max size in MB", gr.Slider, {"minimum": 0, "maximum": 16384, "step": 64}),
+    "trace_jobs": OptionInfo(16, "Trace timings of recent jobs", gr.Slider, {"minimum": 0, "maximum": 128, "step": 1}),
     "sd_vae_sliced_encode": OptionInfo(False, "VAE sliced encode", gr.Checkbox, {"visible": not native}),
 }))
 
@@ -631,11 +645,18 @@ options_templates.update(options_section(('system-paths', "System Paths"), {
     "clip_models_path": OptionInfo(os.path.join(paths.models_path, 'CLIP'), "Folder with CLIP models", folder=True),
     "other_paths_sep_options": OptionInfo("<h2>Other paths</h2>", "", gr.HTML),
     "openvino_cache_path": OptionInfo('cache', "Directory for OpenVINO cache", folder=True),
+    "vae_cache_dir": OptionInfo(os.path.join('cache', 'latents'), "Directory for cached VAE encodes", folder=True),
+    "compile_cache_dir": OptionInfo(os.path.join('cache', 'compile'), "Directory for model compile cache", folder=True),
+    "ipadapter_cache_dir": OptionInfo(os.path.join('cache', 'ipadapter'), "Directory for IP adapter reference images and embeds", folder=True),
+    "api_result_cache_dir": OptionInfo(os.path.join('cache', 'results'), "Directory for cached API results", folder=True),
+    "face_cache_dir": OptionInfo(os.path.join('cache', 'face'), "Directory for face identities and analysis", folder=True),
     "accelerate_offload_path": OptionInfo('cache/accelerate', "Directory for disk offload with Accelerate", folder=True),
     "onnx_cached_models_path": OptionInfo(os.path.join(paths.models_path, 'ONNX', 'cache'), "Folder with ONNX cached models", folder=True),
     "onnx_temp_dir": OptionInfo(os.path.join(paths.models_path, 'ONNX', 'temp'), "Directory for ONNX conversion and Olive optimization process", folder=True),
     "temp_dir": OptionInfo("", "Directory for temporary images; leave empty for default", folder=True),
     "clean_temp_dir_at_start": OptionInfo(True, "Cleanup non-default temporary directory when starting webui"),
+    "files_index_watch": OptionInfo(False, "Watch model folders for changes instead of rescanning"),
+    "files_index_poll": OptionInfo(30, "Model folders polling interval if change notifications are unavailable", gr.Slider, {"minimum": 5, "maximum": 600, "step": 5}),
 }))
 
 options_templates.update(options_section(('saving-images', "Image Options"), {
@@ -749,6 +770,7 @@ options_templates.update(options_section(('live-preview', "Live Previews"), {
     "live_preview_content": OptionInfo("Combined", "Live preview subject", gr.Radio, {"choices": ["Combined", "Prompt", "Negative prompt"], "visible": False}),
     "live_preview_refresh_period": OptionInfo(500, "Progress update period", gr.Slider, {"minimum": 0, "maximum": 5000, "step": 25}),
     "live_preview_taesd_layers": OptionInfo(3, "TAESD decode layers", gr.Slider, {"minimum": 1, "maximum": 3, "step": 1}),
+    "live_preview_max_size": OptionInfo(1024, "Live preview max resolution", gr.Slider, {"minimum": 0, "maximum": 4096, "step": 64}),
     "logmonitor_show": OptionInfo(True, "Show log view"),
     "logmonitor_refresh_period": OptionInfo(5000, "Log view update period", gr.Slider, {"minimum": 0, "maximum": 30000, "step": 25}),
 }))
@@ -800,6 +822,9 @@ options_templates.update(options_section(('sampler-params', "Sampler Settings"),
 options_templates.update(options_section(('postprocessing', "Postprocessing"), {
     'postprocessing_enable_in_main_ui': OptionInfo([], "Additional postprocessing operations", gr.Dropdown, lambda: {"multiselect":True, "choices": [x.name for x in shared_items.postprocessing_scripts()]}),
     'postprocessing_operation_order': OptionInfo([], "Postprocessing operation order", gr.Dropdown, lambda: {"multiselect":True, "choices": [x.name for x in shared_items.postprocessing_scripts()]}),
+    "postprocessing_batch_size": OptionInfo(4, "Folder processing batch size", gr.Slider, {"minimum": 1, "maximum": 32, "step": 1}),
+    "postprocessing_batch_workers": OptionInfo(4, "Folder processing read-ahead workers", gr.Slider, {"minimum": 1, "maximum": 16, "step": 1}),
+    "postprocessing_batch_skip_existing": OptionInfo(False, "Folder processing skip images with existing output"),
 
     "postprocessing_sep_img2img": OptionInfo("<h2>Img2Img & Inpainting</h2>", "", gr.HTML),
     "img2img_color_correction": OptionInfo(False, "Apply color correction"),
@@ -828,6 +853,7 @@ options_templates.update(options_section(('postprocessing', "Postprocessing"), {
 
     "postprocessing_sep_face_restore": OptionInfo("<h2>Face restore</h2>", "", gr.HTML),
     "face_restoration_model": OptionInfo("Face restorer", "Face restoration", gr.Radio, lambda: {"choices": ['None'] + [x.name() for x in face_restorers]}),
+    "face_restoration_batch": OptionInfo(8, "Face restoration batch size", gr.Slider, {"minimum": 1, "maximum": 32, "step": 1}),
 
     "postprocessing_sep_upscalers": OptionInfo("<h2>Upscaling</h2>", "", gr.HTML),
     "upscaler_unload": OptionInfo(False, "Unload upscaler after processing"),
@@ -864,6 +890,10 @@ options_templates.update(options_section(('interrogate', "Interrogate"), {
     "interrogate_clip_min_length": OptionInfo(32, "Interrogate: minimum description length", gr.Slider, {"minimum": 1, "maximum": 128, "step": 1}),
     "interrogate_clip_max_length": OptionInfo(192, "Interrogate: maximum description length", gr.Slider, {"minimum": 1, "maximum": 256, "step": 1}),
     "interrogate_clip_dict_limit": OptionInfo(2048, "CLIP: maximum number of lines in text file", gr.Slider, { "visible": False }),
+    "interrogate_batch_size": OptionInfo(8, "Interrogate batch: images per model call", gr.Slider, {"minimum": 1, "maximum": 64, "step": 1}),
+    "interrogate_batch_workers": OptionInfo(4, "Interrogate batch: image decode workers", gr.Slider, {"minimum": 1, "maximum": 16, "step": 1}),
+    "interrogate_batch_output": OptionInfo("Sidecar", "Interrogate batch: output", gr.Radio, {"choices": ["Sidecar", "Manifest", "Both"]}),
+    "interrogate_batch_resume": OptionInfo(False, "Interrogate batch: skip already interrogated images"),
     "interrogate_clip_skip_categories": OptionInfo(["artists", "movements", "flavors"], "Interrogate: skip categories", gr.CheckboxGroup, lambda: {"choices": modules.interrogate.category_types()}, refresh=modules.interrogate.category_types),
     "interrogate_deepbooru_score_threshold": OptionInfo(0.65, "Interrogate: deepbooru score threshold", gr.Slider, {"minimum": 0, "maximum": 1, "step": 0.01}),
     "deepbooru_sort_alpha": OptionInfo(False, "Interrogate: deepbooru sort alphabetically"),
@@ -889,6 +919,8 @@ options_templates.update(options_section(('extra_networks', "Networks"), {
     "extra_network_skip_indexing": OptionInfo(False, "Build info on first access", gr.Checkbox),
     "extra_networks_default_multiplier": OptionInfo(1.0, "Default strength", gr.Slider, {"minimum": 0.0, "maximum": 2.0, "step": 0.01}),
     "diffusers_convert_embed": OptionInfo(False, "Auto-convert SD 1.5 embeddings to SDXL ", gr.Checkbox, {"visible": native}),
+    "diffusers_embeddings_lazy": OptionInfo(False, "Load embeddings on-demand when used in prompt", gr.Checkbox, {"visible": native}),
+    "diffusers_embeddings_limit": OptionInfo(64, "Maximum on-demand embeddings kept loaded", gr.Slider, {"minimum": 1, "maximum": 1024, "step": 1, "visible": native}),
     "extra_networks_sep3": OptionInfo("<h2>Extra networks settings</h2>", "", gr.HTML),
     "extra_networks_styles": OptionInfo(True, "Show built-in styles"),
     "lora_preferred_name": OptionInfo("filename", "LoRA preferred name", gr.Radio, {"choices": ["filename", "alias"]}),
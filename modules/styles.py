@@ -67,7 +67,7 @@ def apply_file_wildcards(prompt, replaced = [], not_found = [], recursion=0, see
     matches = [m.replace('/', os.path.sep) for m in matches if m not in replaced]
     if len(matches) == 0:
         return prompt, replaced, not_found
-    files = list(files_cache.list_files(shared.opts.wildcards_dir, ext_filter=[".txt"], recursive=True))
+    files = list(files_cache.indexed_files(shared.opts.wildcards_dir, ext_filter=[".txt"]))
     for m in matches:
         prompt, found = check_files(prompt, m, files)
         if found and m in not_found:
@@ -227,7 +227,7 @@ class StyleDatabase:
         def list_folder(folder):
             import concurrent
             future_items = {}
-            candidates = list(files_cache.list_files(folder, ext_filter=['.json'], recursive=files_cache.not_hidden))
+            candidates = list(files_cache.indexed_files(folder, ext_filter=['.json'], recursive=files_cache.not_hidden))
             with concurrent.futures.ThreadPoolExecutor(max_workers=shared.max_workers) as executor:
                 for fn in candidates:
                     if os.path.isfile(fn) and fn.lower().endswith(".json"):
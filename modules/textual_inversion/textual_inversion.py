@@ -1,22 +1,25 @@
 from typing import List, Union
+from collections import OrderedDict
 import os
+import re
 import time
 import torch
 import safetensors.torch
 from PIL import Image
 from modules import shared, devices, sd_models, errors
 from modules.textual_inversion.image_embedding import embedding_from_b64, extract_image_data_embed
-from modules.files_cache import directory_files, directory_mtime, extension_filter
+from modules.files_cache import indexed_files, directory_mtime, extension_filter
 
 
 debug = shared.log.trace if os.environ.get('SD_TI_DEBUG', None) is not None else lambda *args, **kwargs: None
 debug('Trace: TEXTUAL INVERSION')
+re_prompt_word = re.compile(r'[^\s,()\[\]{}<>|:]+')
 
 
 def list_embeddings(*dirs):
     is_ext = extension_filter(['.SAFETENSORS', '.PT' ] + ( ['.PNG', '.WEBP', '.JXL', '.AVIF', '.BIN' ] if not shared.native else [] ))
     is_not_preview = lambda fp: not next(iter(os.path.splitext(fp))).upper().endswith('.PREVIEW') # pylint: disable=unnecessary-lambda-assignment
-    return list(filter(lambda fp: is_ext(fp) and is_not_preview(fp) and os.stat(fp).st_size > 0, directory_files(*dirs)))
+    return list(filter(lambda fp: is_ext(fp) and is_not_preview(fp) and os.stat(fp).st_size > 0, indexed_files(*dirs)))
 
 
 def open_embeddings(filename):
@@ -58,6 +61,48 @@ def open_embeddings(filename):
     return embeddings, skipped
 
 
+def index_embedding(filename):
+    """
+    Read embedding metadata without loading tensors. Only safetensors headers are read, legacy pt files are indexed by name and their shape is resolved when first inserted.
+    """
+    from modules import hashes
+    _fn, ext = os.path.splitext(filename)
+    ext = ext.upper()
+    stat = os.stat(filename)
+    name = os.path.basename(_fn)
+    entry = {
+        'name': name,
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'vectors': 0,
+        'shapes': [],
+        'hash': (hashes.sha256_from_cache(filename, f'embeddings/{name}') or '')[:10] or None, # only use already calculated hash
+    }
+    if ext == '.SAFETENSORS':
+        with safetensors.torch.safe_open(filename, framework="pt") as f:  # type: ignore
+            for k in f.keys():
+                entry['shapes'].append(list(f.get_slice(k).get_shape()))
+        if len(entry['shapes']) == 0:
+            return None
+        entry['vectors'] = entry['shapes'][0][0] if len(entry['shapes'][0]) > 1 else 1
+    elif ext not in ['.PT', '.BIN']:
+        return None
+    return entry
+
+
+def is_compatible(vector_sizes, hiddensizes):
+    """
+    Check if embedding with given vector sizes can be used with text encoders of given hidden sizes.
+    """
+    if shared.opts.diffusers_convert_embed and 768 in hiddensizes and 1280 in hiddensizes and 1280 not in vector_sizes and 768 in vector_sizes:
+        vector_sizes = vector_sizes + [1280]
+    if (not all(vs in hiddensizes for vs in vector_sizes) or  # Skip SD2.1 in SD1.5/SDXL/SD3 vis versa
+            len(vector_sizes) > len(hiddensizes) or  # Skip SDXL/SD3 in SD1.5
+            (len(vector_sizes) < len(hiddensizes) and len(vector_sizes) != 2)):  # SD3 no T5
+        return False
+    return True
+
+
 def convert_bundled(data):
     """
     Bundled embeddings are passed as a dict from lora loading, convert to Embedding objects and pass back as list.
@@ -118,13 +163,30 @@ def deref_tokenizers(tokens, tokenizers):
 def insert_tokens(embeddings: list, tokenizers: list):
     """
     Add all tokens to each tokenizer in the list, with one call to each.
+    Token ids freed by evicted embeddings are reused first so on-demand loading does not grow the vocabulary.
     """
     tokens = []
     for embedding in embeddings:
         if embedding is not None:
             tokens += embedding.tokens
     for tokenizer in tokenizers:
-        tokenizer.add_tokens(tokens)
+        free = getattr(tokenizer, 'free_token_ids', [])
+        added = []
+        reused = 0
+        for token in tokens:
+            if len(free) > 0 and hasattr(tokenizer, '_added_tokens_encoder') and token not in tokenizer._added_tokens_encoder: # pylint: disable=protected-access
+                idx = free.pop()
+                tokenizer._added_tokens_decoder[idx].content = token # pylint: disable=protected-access
+                tokenizer._added_tokens_encoder[token] = idx # pylint: disable=protected-access
+                reused += 1
+            else:
+                added.append(token)
+        if reused > 0:
+            tokenizer.vocab_version = getattr(tokenizer, 'vocab_version', 0) + 1 # same length but different tokens
+            if hasattr(tokenizer, '_update_trie'):
+                tokenizer._update_trie() # pylint: disable=protected-access
+        if len(added) > 0:
+            tokenizer.add_tokens(added)
 
 
 def insert_vectors(embedding, tokenizers, text_encoders, hiddensizes):
@@ -140,8 +202,9 @@ def insert_vectors(embedding, tokenizers, text_encoders, hiddensizes):
                 continue
             idx = hiddensizes.index(size)
             unk_token_id = tokenizers[idx].convert_tokens_to_ids(tokenizers[idx].unk_token)
-            if text_encoders[idx].get_input_embeddings().weight.data.shape[0] != len(tokenizers[idx]):
-                text_encoders[idx].resize_token_embeddings(len(tokenizers[idx]))
+            required = max([len(tokenizers[idx])] + [tokenizers[idx].convert_tokens_to_ids(token) + 1 for token in embedding.tokens]) # evicted ids are not counted by len
+            if text_encoders[idx].get_input_embeddings().weight.data.shape[0] < required:
+                text_encoders[idx].resize_token_embeddings(required)
             for token, v in zip(embedding.tokens, vector.unbind()):
                 token_id = tokenizers[idx].convert_tokens_to_ids(token)
                 if token_id > unk_token_id:
@@ -237,6 +300,8 @@ class EmbeddingDatabase:
         self.embedding_dirs = {}
         self.previously_displayed_embeddings = ()
         self.embeddings_used = []
+        self.index = {} # name -> metadata of all available embeddings, used for on-demand loading
+        self.inserted = OrderedDict() # lru of embeddings inserted into tokenizers and text encoders
 
     def add_embedding_dir(self, path):
         self.embedding_dirs[path] = DirWithTextualInversionEmbeddings(path)
@@ -288,9 +353,7 @@ class EmbeddingDatabase:
                 if shared.opts.diffusers_convert_embed and 768 in hiddensizes and 1280 in hiddensizes and 1280 not in embedding.vector_sizes and 768 in embedding.vector_sizes:
                     embedding.vec.append(convert_embedding(embedding.vec[embedding.vector_sizes.index(768)], text_encoders[hiddensizes.index(768)], text_encoders[hiddensizes.index(1280)]))
                     embedding.vector_sizes.append(1280)
-                if (not all(vs in hiddensizes for vs in embedding.vector_sizes) or  # Skip SD2.1 in SD1.5/SDXL/SD3 vis versa
-                        len(embedding.vector_sizes) > len(hiddensizes) or  # Skip SDXL/SD3 in SD1.5
-                        (len(embedding.vector_sizes) < len(hiddensizes) and len(embedding.vector_sizes) != 2)):  # SD3 no T5
+                if not is_compatible(embedding.vector_sizes, hiddensizes):
                     embedding.tokens = []
                     self.skipped_embeddings[embedding.name] = embedding
             except Exception as e:
@@ -312,6 +375,95 @@ class EmbeddingDatabase:
                     errors.display(e, f'Load embedding: name="{embedding.name}" file="{embedding.filename}"')
         return
 
+    def build_index(self):
+        """
+        Build index of available embeddings without loading them, metadata is persisted in cache and only refreshed for changed files.
+        """
+        from modules import hashes
+        cache = hashes.cache('embeddings')
+        updated = 0
+        self.index.clear()
+        _text_encoders, _tokenizers, hiddensizes = get_text_encoders()
+        for embdir in self.embedding_dirs.values():
+            if not os.path.isdir(embdir.path):
+                continue
+            for filename in list_embeddings(embdir.path):
+                entry = cache.get(filename, None)
+                try:
+                    stat = os.stat(filename)
+                    if entry is None or entry.get('mtime', 0) != stat.st_mtime or entry.get('size', 0) != stat.st_size:
+                        entry = index_embedding(filename)
+                        if entry is None:
+                            continue
+                        cache[filename] = entry
+                        updated += 1
+                except Exception as e:
+                    debug(f'Embedding index: file="{filename}" {e}')
+                    continue
+                embedding = Embedding(vec=[], name=entry['name'], filename=filename)
+                embedding.vectors = entry['vectors']
+                embedding.shape = entry['shapes'][0][-1] if len(entry['shapes']) > 0 else None
+                embedding.cached_checksum = entry['hash']
+                vector_sizes = [shape[-1] for shape in entry['shapes']]
+                if len(vector_sizes) == 0 or is_compatible(vector_sizes, hiddensizes): # unknown shapes are checked on insert
+                    self.index[embedding.name] = filename
+                    self.word_embeddings[embedding.name] = embedding
+                else:
+                    self.skipped_embeddings[embedding.name] = embedding
+        if updated > 0:
+            hashes.dump_cache()
+        debug(f'Embedding index: available={len(self.index)} updated={updated}')
+
+    def activate(self, prompts: List[str]):
+        """
+        Insert embeddings referenced by prompts into tokenizers and text encoders on-demand and evict least recently used ones above the limit.
+        """
+        if not shared.native or not shared.opts.diffusers_embeddings_lazy or len(self.index) == 0:
+            return
+        words = set()
+        for prompt in prompts:
+            if isinstance(prompt, str):
+                words.update(re_prompt_word.findall(prompt))
+        used = [name for name in words if name in self.index]
+        missing = [name for name in used if name not in self.inserted]
+        if len(missing) > 0:
+            t0 = time.time()
+            self.load_diffusers_embedding([self.index[name] for name in missing])
+            for name in missing:
+                if name not in self.skipped_embeddings:
+                    self.inserted[name] = True
+            shared.log.debug(f'Load embeddings: on-demand={missing} inserted={len(self.inserted)} time={time.time()-t0:.2f}')
+        for name in used:
+            if name in self.inserted:
+                self.inserted.move_to_end(name)
+        while len(self.inserted) > max(shared.opts.diffusers_embeddings_limit, len(used)):
+            name, _ = self.inserted.popitem(last=False)
+            self.evict(name)
+
+    def evict(self, name: str):
+        """
+        Remove embedding tokens from tokenizers so they are no longer matched; freed token ids and their embedding rows are reused by next inserted embedding.
+        """
+        embedding = self.word_embeddings.get(name, None)
+        if embedding is None or not embedding.tokens:
+            return
+        _text_encoders, tokenizers, _hiddensizes = get_text_encoders()
+        for tokenizer in tokenizers:
+            if not hasattr(tokenizer, '_added_tokens_encoder'):
+                continue
+            if not hasattr(tokenizer, 'free_token_ids'):
+                tokenizer.free_token_ids = []
+            for token in embedding.tokens:
+                if token in tokenizer._added_tokens_encoder: # pylint: disable=protected-access
+                    idx = tokenizer._added_tokens_encoder.pop(token) # pylint: disable=protected-access
+                    tokenizer._added_tokens_decoder[idx].content = str(time.time()) # pylint: disable=protected-access
+                    tokenizer.free_token_ids.append(idx)
+                    tokenizer.vocab_version = getattr(tokenizer, 'vocab_version', 0) + 1
+        placeholder = Embedding(vec=[], name=name, filename=embedding.filename)
+        placeholder.vectors, placeholder.shape, placeholder.cached_checksum = embedding.vectors, embedding.shape, embedding.cached_checksum
+        self.word_embeddings[name] = placeholder
+        debug(f'Embedding evict: name="{name}"')
+
     def load_from_file(self, path, filename):
         name, ext = os.path.splitext(filename)
         ext = ext.upper()
@@ -401,10 +553,16 @@ class EmbeddingDatabase:
         self.word_embeddings.clear()
         self.skipped_embeddings.clear()
         self.embeddings_used.clear()
+        self.inserted.clear()
         self.expected_shape = self.get_expected_shape()
-        for embdir in self.embedding_dirs.values():
-            self.load_from_dir(embdir)
-            embdir.update()
+        if shared.native and shared.opts.diffusers_embeddings_lazy:
+            self.build_index()
+            for embdir in self.embedding_dirs.values():
+                embdir.update()
+        else:
+            for embdir in self.embedding_dirs.values():
+                self.load_from_dir(embdir)
+                embdir.update()
 
         # re-sort word_embeddings because load_from_dir may not load in alphabetic order.
         # using a temporary copy so we don't reinitialize self.word_embeddings in case other objects have a reference to it.
@@ -1,5 +1,11 @@
-import time
+import os
 import sys
+import time
+import uuid
+import threading
+import functools
+import contextlib
+from collections import deque
 
 
 class Timer:
@@ -39,5 +45,152 @@ class Timer:
     def reset(self):
         self.__init__()
 
+class Tracer:
+    """
+    Per-job nested span timings kept in a ring buffer of recent jobs with chrome trace export
+    Spans are only recorded while a job is active so instrumented functions are cheap otherwise
+    """
+    def __init__(self, jobs: int = 16, spans: int = 10000):
+        self.jobs = deque(maxlen=jobs)
+        self.max_spans = spans
+        self.job = None
+        self.local = threading.local() # span stack per thread
+
+    def begin(self, name: str, size: int = None, **attrs):
+        """start job unless one is already active in which case caller is traced as part of it, returns job id or None"""
+        if size is not None and size != self.jobs.maxlen:
+            self.jobs = deque(self.jobs, maxlen=max(size, 0))
+        if self.job is not None or self.jobs.maxlen == 0:
+            return None
+        self.job = { 'id': uuid.uuid4().hex[:8], 'name': name, 'start': time.time(), 'end': None, 'pid': os.getpid(), 'tid': threading.get_ident(), 'attrs': attrs, 'spans': [] }
+        self.jobs.append(self.job)
+        return self.job['id']
+
+    def end(self, job_id: str, **attrs):
+        if job_id is None or self.job is None or self.job['id'] != job_id:
+            return
+        self.job['end'] = time.time()
+        self.job['attrs'].update(attrs)
+        self.job = None
+
+    def add(self, name: str, t0: float, t1: float, **attrs):
+        """record already measured span"""
+        job = self.job
+        if job is None or len(job['spans']) >= self.max_spans:
+            return
+        stack = getattr(self.local, 'stack', [])
+        job['spans'].append({ 'name': name, 'start': t0, 'end': t1, 'depth': len(stack), 'parent': stack[-1] if len(stack) > 0 else None, 'tid': threading.get_ident(), 'attrs': attrs })
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attrs):
+        if self.job is None:
+            yield
+            return
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        t0 = time.time()
+        self.local.stack.append(name)
+        try:
+            yield
+        finally:
+            self.local.stack.pop()
+            self.add(name, t0, time.time(), **attrs)
+
+    def traced(self, name: str = None):
+        """decorator recording each call as span"""
+        def decorator(fn):
+            label = name or fn.__name__
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if self.job is None:
+                    return fn(*args, **kwargs)
+                with self.span(label):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def get(self, job_id: str = None):
+        """job by id, last job if id is not specified"""
+        jobs = list(self.jobs)
+        if job_id is None:
+            return jobs[-1] if len(jobs) > 0 else None
+        return next((job for job in jobs if job['id'] == job_id), None)
+
+    def summary(self):
+        return [{ 'id': job['id'], 'name': job['name'], 'start': job['start'], 'duration': round((job['end'] or time.time()) - job['start'], 3), 'spans': len(job['spans']), 'attrs': job['attrs'] } for job in list(self.jobs)]
+
+    def chrome(self, job_id: str = None):
+        """export job in chrome trace event format which can be loaded in chrome://tracing or perfetto"""
+        job = self.get(job_id)
+        if job is None:
+            return { 'traceEvents': [] }
+        events = [{ 'name': job['name'], 'cat': 'job', 'ph': 'X', 'ts': int(job['start'] * 1e6), 'dur': int(((job['end'] or time.time()) - job['start']) * 1e6), 'pid': job['pid'], 'tid': job['tid'], 'args': { 'id': job['id'], **job['attrs'] } }]
+        for span in job['spans']:
+            events.append({ 'name': span['name'], 'cat': span['parent'] or 'span', 'ph': 'X', 'ts': int(span['start'] * 1e6), 'dur': int((span['end'] - span['start']) * 1e6), 'pid': job['pid'], 'tid': span['tid'], 'args': { k: str(v) for k, v in span['attrs'].items() } })
+        return { 'traceEvents': events, 'displayTimeUnit': 'ms' }
+
+
+class ImportProfiler:
+    """
+    Per-module import time measured by wrapping builtin import
+    Cumulative time includes nested imports triggered by module while self time excludes them
+    """
+    def __init__(self):
+        self.records = {} # cumulative and self time per module
+        self.enabled = False
+        self.orig_import = None
+        self.local = threading.local() # child time accumulators per thread
+
+    def install(self):
+        if self.enabled:
+            return
+        import builtins
+        self.orig_import = builtins.__import__
+        builtins.__import__ = self.profiled_import
+        self.enabled = True
+
+    def uninstall(self):
+        if not self.enabled:
+            return
+        import builtins
+        builtins.__import__ = self.orig_import
+        self.enabled = False
+
+    def profiled_import(self, name, globals=None, locals=None, fromlist=(), level=0): # pylint: disable=redefined-builtin
+        module = name
+        if level > 0:
+            try:
+                import importlib.util
+                module = importlib.util.resolve_name('.' * level + name, (globals or {}).get('__package__', None))
+            except Exception:
+                module = None
+        if module is None or module in sys.modules: # already loaded imports are not interesting
+            return self.orig_import(name, globals, locals, fromlist, level)
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        self.local.stack.append(0.0)
+        t0 = time.perf_counter()
+        try:
+            return self.orig_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - t0
+            children = self.local.stack.pop()
+            if len(self.local.stack) > 0:
+                self.local.stack[-1] += elapsed
+            record = self.records.setdefault(module, [0.0, 0.0])
+            record[0] += elapsed
+            record[1] += elapsed - children
+
+    def report(self, count: int = 20, min_time: float = 0.05):
+        """slowest imports sorted by cumulative time"""
+        items = sorted(self.records.items(), key=lambda item: item[1][0], reverse=True)
+        return [{ 'module': k, 'cumulative': round(v[0], 3), 'self': round(v[1], 3) } for k, v in items[:count] if v[0] >= min_time]
+
+    def summary(self, count: int = 20, min_time: float = 0.05):
+        return ' '.join([f"{r['module']}={r['cumulative']:.2f}/{r['self']:.2f}" for r in self.report(count, min_time)])
+
+
 startup = Timer()
 process = Timer()
+trace = Tracer()
+imports = ImportProfiler()
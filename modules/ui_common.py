@@ -405,12 +405,7 @@ def update_token_counter(text, steps):
         token_count, max_length = max([sd_hijack.model_hijack.get_prompt_lengths(prompt) for prompt in prompts], key=lambda args: args[0])
     elif shared.native:
         if shared.sd_loaded and hasattr(shared.sd_model, 'tokenizer') and shared.sd_model.tokenizer is not None:
-            has_bos_token = shared.sd_model.tokenizer.bos_token_id is not None
-            has_eos_token = shared.sd_model.tokenizer.eos_token_id is not None
-            ids = shared.sd_model.tokenizer(prompt)
-            ids = getattr(ids, 'input_ids', [])
-            token_count = len(ids) - int(has_bos_token) - int(has_eos_token)
-            max_length = shared.sd_model.tokenizer.model_max_length - int(has_bos_token) - int(has_eos_token)
-            if max_length is None or max_length < 0 or max_length > 10000:
-                max_length = 0
+            from modules import prompt_tokens
+            res = prompt_tokens.tokenize(prompt, shared.sd_model.tokenizer)
+            token_count, max_length = res['count'], res['max_length']
     return gr.update(value=f"<span class='gr-box gr-text-input'>{token_count}/{max_length}</span>", visible=token_count > 0)
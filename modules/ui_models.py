@@ -155,6 +155,7 @@ def create_ui():
                         with gr.Row():
                             weights_clip = gr.Checkbox(label="Weights clip")
                             prune = gr.Checkbox(label="Prune", value=True, visible=False)
+                            streaming = gr.Checkbox(label="Streaming merge", value=False)
                         with gr.Row():
                             re_basin = gr.Checkbox(label="ReBasin")
                             re_basin_iterations = gr.Slider(minimum=0, maximum=25, step=1, label='Number of ReBasin Iterations', value=None, visible=False)
@@ -203,7 +204,8 @@ def create_ui():
                                 re_basin_iterations, # pylint: disable=unused-argument
                                 device, # pylint: disable=unused-argument
                                 unload, # pylint: disable=unused-argument
-                                bake_in_vae): # pylint: disable=unused-argument
+                                bake_in_vae, # pylint: disable=unused-argument
+                                streaming): # pylint: disable=unused-argument
                     kwargs = {}
                     for x in inspect.getfullargspec(modelmerger)[0]:
                         kwargs[x] = locals()[x]
@@ -324,6 +326,7 @@ def create_ui():
                         device,
                         unload,
                         bake_in_vae,
+                        streaming,
                     ],
                     outputs=[
                         primary_model_name,
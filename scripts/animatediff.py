@@ -2,7 +2,7 @@ import os
 import gradio as gr
 import diffusers
 from safetensors.torch import load_file
-from modules import scripts, processing, shared, devices, sd_models
+from modules import scripts, processing, shared, devices, sd_models, images
 
 
 # config
@@ -259,14 +259,22 @@ class Script(scripts.Script):
         set_prompt(p)
         orig_prompt_attention = shared.opts.prompt_attention
         shared.opts.data['prompt_attention'] = 'Fixed attention'
-        processed: processing.Processed = processing.process_images(p) # runs processing using main loop
-        shared.opts.data['prompt_attention'] = orig_prompt_attention
+        p.video = images.open_video(p, video_type=video_type, duration=duration, loop=gif_loop, pad=mp4_pad, interpolate=mp4_interpolate, frames=frames * p.n_iter * p.batch_size) # frames are encoded as they are produced
+        try:
+            processed: processing.Processed = processing.process_images(p) # runs processing using main loop
+        except Exception:
+            video, p.video = p.video, None # after() is not called on failure so release encoder here
+            if video is not None:
+                video.close()
+            raise
+        finally:
+            shared.opts.data['prompt_attention'] = orig_prompt_attention
         devices.torch_gc()
         return processed
 
 
     def after(self, p: processing.StableDiffusionProcessing, processed: processing.Processed, adapter_index, frames, lora_index, strength, latent_mode, video_type, duration, gif_loop, mp4_pad, mp4_interpolate, override_scheduler, fi_method, fi_iters, fi_order, fi_spatial, fi_temporal): # pylint: disable=arguments-differ, unused-argument
-        from modules.images import save_video
-        if video_type != 'None':
+        if getattr(p, 'video', None) is not None:
             shared.log.debug(f'AnimateDiff video: type={video_type} duration={duration} loop={gif_loop} pad={mp4_pad} interpolate={mp4_interpolate}')
-            save_video(p, filename=None, images=processed.images, video_type=video_type, duration=duration, loop=gif_loop, pad=mp4_pad, interpolate=mp4_interpolate)
+            video, p.video = p.video, None
+            video.close()
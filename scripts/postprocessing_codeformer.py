@@ -25,3 +25,15 @@ class ScriptPostprocessingCodeFormer(scripts_postprocessing.ScriptPostprocessing
         pp.image = res
         pp.info["CodeFormer visibility"] = round(codeformer_visibility, 3)
         pp.info["CodeFormer weight"] = round(codeformer_weight, 3)
+
+    def process_batch(self, pps: list, codeformer_visibility, codeformer_weight): # pylint: disable=arguments-differ
+        if codeformer_visibility == 0 or len(pps) == 0:
+            return
+        restored = codeformer_model.codeformer.restore_batch([np.array(pp.image, dtype=np.uint8) for pp in pps], w=codeformer_weight)
+        for pp, restored_img in zip(pps, restored):
+            res = Image.fromarray(restored_img)
+            if codeformer_visibility < 1.0:
+                res = Image.blend(pp.image, res, codeformer_visibility)
+            pp.image = res
+            pp.info["CodeFormer visibility"] = round(codeformer_visibility, 3)
+            pp.info["CodeFormer weight"] = round(codeformer_weight, 3)
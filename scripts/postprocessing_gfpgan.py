@@ -14,9 +14,6 @@ class ScriptPostprocessingGfpGan(scripts_postprocessing.ScriptPostprocessing):
         return { "gfpgan_visibility": gfpgan_visibility }
 
     def process(self, pp: scripts_postprocessing.PostprocessedImage, gfpgan_visibility): # pylint: disable=arguments-differ
-        from installer import install
-        install("facexlib")
-        install("gfpgan")
         if gfpgan_visibility == 0:
             return
         from modules.postprocess import gfpgan_model
@@ -26,3 +23,15 @@ class ScriptPostprocessingGfpGan(scripts_postprocessing.ScriptPostprocessing):
             res = Image.blend(pp.image, res, gfpgan_visibility)
         pp.image = res
         pp.info["GFPGAN visibility"] = round(gfpgan_visibility, 3)
+
+    def process_batch(self, pps: list, gfpgan_visibility): # pylint: disable=arguments-differ
+        if gfpgan_visibility == 0 or len(pps) == 0:
+            return
+        from modules.postprocess import gfpgan_model
+        restored = gfpgan_model.gfpgan_fix_faces_batch([np.array(pp.image, dtype=np.uint8) for pp in pps])
+        for pp, restored_img in zip(pps, restored):
+            res = Image.fromarray(restored_img)
+            if gfpgan_visibility < 1.0:
+                res = Image.blend(pp.image, res, gfpgan_visibility)
+            pp.image = res
+            pp.info["GFPGAN visibility"] = round(gfpgan_visibility, 3)
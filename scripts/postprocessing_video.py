@@ -42,6 +42,9 @@ class ScriptPostprocessingUpscale(scripts_postprocessing.ScriptPostprocessing):
             "change": change,
         }
 
+    def postprocess_enabled(self, filename, video_type, **kwargs): # pylint: disable=arguments-differ
+        return video_type != 'None' and filename is not None and len(filename.strip()) > 0
+
     def postprocess(self, images, filename, video_type, duration, loop, pad, interpolate, scale, change): # pylint: disable=arguments-differ
         filename = filename.strip() if filename is not None else ''
         if video_type == 'None' or len(filename) == 0 or images is None or len(images) < 2:
@@ -99,8 +99,12 @@ class Script(scripts.Script):
         p.task_args['max_guidance_scale'] = max_guidance_scale
         shared.log.debug(f'SVD: args={p.task_args}')
 
-        # run processing
-        processed = processing.process_images(p)
-        if video_type != 'None':
-            images.save_video(p, filename=None, images=processed.images, video_type=video_type, duration=duration, loop=gif_loop, pad=mp4_pad, interpolate=mp4_interpolate)
+        # run processing while frames are streamed to video
+        p.video = images.open_video(p, video_type=video_type, duration=duration, loop=gif_loop, pad=mp4_pad, interpolate=mp4_interpolate, frames=num_frames * p.n_iter * p.batch_size)
+        try:
+            processed = processing.process_images(p)
+        finally: # always release encoder and worker even if processing fails
+            video, p.video = p.video, None
+            if video is not None:
+                video.close()
         return processed
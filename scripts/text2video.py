@@ -101,8 +101,11 @@ class Script(scripts.Script):
 
         shared.sd_model = sd_models.set_diffuser_pipe(shared.sd_model, sd_models.DiffusersTaskType.TEXT_2_IMAGE)
         shared.log.debug(f'Text2Video: args={p.task_args}')
-        processed = processing.process_images(p)
-
-        if video_type != 'None':
-            images.save_video(p, filename=None, images=processed.images, video_type=video_type, duration=duration, loop=gif_loop, pad=mp4_pad, interpolate=mp4_interpolate)
+        p.video = images.open_video(p, video_type=video_type, duration=duration, loop=gif_loop, pad=mp4_pad, interpolate=mp4_interpolate, frames=p.task_args.get('num_frames', 0) * p.n_iter * p.batch_size)
+        try:
+            processed = processing.process_images(p)
+        finally: # always release encoder and worker even if processing fails
+            video, p.video = p.video, None
+            if video is not None:
+                video.close()
         return processed
@@ -26,13 +26,13 @@ import modules.sd_vae
 import modules.sd_unet
 import modules.model_te
 import modules.progress
-import modules.ui
 import modules.txt2img
 import modules.img2img
 import modules.upscaler
 import modules.textual_inversion.textual_inversion
 import modules.hypernetworks.hypernetwork
 import modules.script_callbacks
+import modules.face_restoration
 from modules.api.middleware import setup_middleware
 from modules.shared import cmd_opts, opts # pylint: disable=unused-import
 
@@ -82,6 +82,11 @@ def initialize():
     log.debug('Initializing')
     check_rollback_vae()
 
+    if shared.opts.files_index_watch:
+        from modules import files_cache
+        files_cache.file_index.watch(shared.opts.ckpt_dir, shared.opts.diffusers_dir, shared.opts.vae_dir, shared.opts.unet_dir, shared.opts.te_dir, shared.opts.lora_dir, shared.opts.embeddings_dir, shared.opts.hypernetwork_dir, shared.opts.wildcards_dir, shared.opts.styles_dir, poll_interval=shared.opts.files_index_poll)
+        timer.startup.record("files")
+
     modules.sd_samplers.list_samplers()
     timer.startup.record("samplers")
 
@@ -104,8 +109,10 @@ def initialize():
     import modules.postprocess.codeformer_model as codeformer
     codeformer.setup_model(shared.opts.codeformer_models_path)
     sys.modules["modules.codeformer_model"] = codeformer
-    import modules.postprocess.gfpgan_model as gfpgan
-    gfpgan.setup_model(shared.opts.gfpgan_models_path)
+    def setup_gfpgan():
+        import modules.postprocess.gfpgan_model as gfpgan
+        gfpgan.setup_model(shared.opts.gfpgan_models_path)
+    shared.face_restorers.append(modules.face_restoration.LazyFaceRestorer('GFPGAN', setup_gfpgan)) # gfpgan install and import deferred to first use
     import modules.postprocess.yolo as yolo
     yolo.initialize()
     timer.startup.record("detailer")
@@ -234,6 +241,7 @@ def start_ui():
     log.debug('Creating UI')
     modules.script_callbacks.before_ui_callback()
     timer.startup.record("before-ui")
+    import modules.ui
     shared.demo = modules.ui.create_ui(timer.startup)
     timer.startup.record("ui")
     if cmd_opts.disable_queue:
@@ -318,6 +326,15 @@ def start_ui():
         shared.log.debug(f'Scripts components: {time_component}')
 
 
+def log_startup(mode: str):
+    from modules.memstats import memory_stats
+    log.info(f"Startup time: {timer.startup.summary()}")
+    log.info(f'Startup memory: mode={mode} {memory_stats()}')
+    if timer.imports.enabled:
+        timer.imports.uninstall() # stop profiling once server is up, later imports are lazy loads during requests
+        log.info(f'Startup imports: count={len(timer.imports.records)} slowest={timer.imports.summary()}')
+
+
 def webui(restart=False):
     if restart:
         modules.script_callbacks.app_reload_callback()
@@ -340,7 +357,7 @@ def webui(restart=False):
     for m in modules.scripts.postprocessing_scripts_data:
         debug(f'  {m}')
     modules.script_callbacks.print_timers()
-    log.info(f"Startup time: {timer.startup.summary()}")
+    log_startup('ui')
     timer.startup.reset()
 
     if not restart:
@@ -362,6 +379,16 @@ def webui(restart=False):
     return shared.demo.server
 
 
+def start_scripts_headless():
+    # initialize script runners and their default args without building gradio ui so first api request does not need to
+    for runner, is_img2img, parent in [(modules.scripts.scripts_txt2img, False, 'txt2img'), (modules.scripts.scripts_img2img, True, 'img2img')]:
+        runner.initialize_scripts(is_img2img)
+        runner.setup_api(parent)
+    modules.scripts.scripts_control.initialize_scripts(is_img2img=False, is_control=True)
+    modules.scripts.scripts_control.setup_api('control')
+    timer.startup.record("scripts")
+
+
 def api_only():
     start_common()
     from fastapi import FastAPI
@@ -369,9 +396,12 @@ def api_only():
     setup_middleware(app, cmd_opts)
     shared.api = create_api(app)
     shared.api.wants_restart = False
+    timer.startup.record("api")
+    start_scripts_headless()
     modules.script_callbacks.app_started_callback(None, app)
+    timer.startup.record("app-started")
     modules.sd_models.write_metadata()
-    log.info(f"Startup time: {timer.startup.summary()}")
+    log_startup('api')
     server = shared.api.launch()
     return server
 